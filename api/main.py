@@ -2,11 +2,14 @@
 渠道视频批量处理 - FastAPI 后端
 供 Tauri + Vue 前端调用：视频规范、水印、合并及主题设置
 """
+import asyncio
 import json
+import os
+import shutil
 import sys
-import threading
+import time
 from pathlib import Path
-from queue import Empty, Queue
+from typing import Optional
 
 _root = Path(__file__).resolve().parent.parent
 if str(_root) not in sys.path:
@@ -16,9 +19,9 @@ if str(_root / "src") not in sys.path:
 
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
 
 # 后端端口，与前端 / Tauri 约定一致
@@ -29,10 +32,95 @@ def get_config_dir() -> Path:
     return _root / "config"
 
 
+# ffmpeg 可执行文件（ffprobe 优先取同目录下的版本），不设置时依次查找 tools/ffmpeg 下的版本与 PATH；
+# 指向 benchmarks/fake_ffmpeg.py 安装的替身即可在没有真实编码负载时测试调度与流式推送
+FFMPEG_PATH = os.environ.get("CHANNEL_VIDEO_FFMPEG_PATH") or None
+# ffmpeg 能力指纹（版本、编码器、滤镜）缓存，按二进制哈希区分
+FFMPEG_CAPS_PATH = os.environ.get(
+    "CHANNEL_VIDEO_FFMPEG_CAPS_PATH", str(_root / "cache" / "ffmpeg_capabilities.json")
+)
+
+# 结果缓存：目录与容量上限可通过环境变量配置，请求中 use_cache 为 True 时启用
+RESULT_CACHE_DIR = os.environ.get("CHANNEL_VIDEO_RESULT_CACHE_DIR", str(_root / "cache" / "results"))
+RESULT_CACHE_MAX_GB = float(os.environ.get("CHANNEL_VIDEO_RESULT_CACHE_GB", "50"))
+_result_cache = None
+
+
+def get_result_cache():
+    global _result_cache
+    if _result_cache is None:
+        from utils.result_cache import ResultCache
+        _result_cache = ResultCache(RESULT_CACHE_DIR, max_bytes=int(RESULT_CACHE_MAX_GB * 1024 ** 3))
+    return _result_cache
+
+
+# 进程内共享的处理器：(操作, 是否启用结果缓存) -> 实例，处理器本身无状态，
+# 避免每个请求重新定位 ffprobe、重复打印警告
+_processors: dict = {}
+# 启动预热状态，/api/ready 在预热完成前返回 503
+_startup = {"ready": False, "started": time.time(), "warm_ms": None, "error": None, "ffmpeg": None}
+
+
+def get_processor(op: str, use_cache: bool = False):
+    key = (op, bool(use_cache))
+    proc = _processors.get(key)
+    if proc is None:
+        from utils.ffmpeg_locator import find_ffmpeg
+        from utils.video_merger import VideoMerger
+        from utils.video_normalizer import VideoNormalizer
+        from utils.video_watermark import VideoWatermark
+        cls = {"normalize": VideoNormalizer, "watermark": VideoWatermark, "merge": VideoMerger}[op]
+        proc = cls(ffmpeg_path=find_ffmpeg(FFMPEG_PATH), result_cache=get_result_cache() if use_cache else None)
+        _processors[key] = proc
+    return proc
+
+
+def get_ffprobe_path() -> str:
+    return get_processor("normalize").ffprobe_path
+
+
+def warm_up_sync() -> dict:
+    """定位 ffmpeg 并读取能力指纹（同一个二进制只在首次启动时运行 ffmpeg），创建共享处理器与缩略图生成器"""
+    from utils.ffmpeg_locator import find_ffmpeg, find_ffprobe, missing_requirements, probe_capabilities
+    ffmpeg = find_ffmpeg(FFMPEG_PATH)
+    caps = probe_capabilities(ffmpeg, FFMPEG_CAPS_PATH)
+    for op in ("normalize", "watermark", "merge"):
+        get_processor(op)
+    get_thumbnailer()
+    return {
+        "path": ffmpeg,
+        "ffprobe": find_ffprobe(ffmpeg),
+        "version": caps.get("version"),
+        "sha256": caps.get("sha256"),
+        "cached": caps.get("cached", False),
+        "missing": missing_requirements(caps),
+        "error": caps.get("error"),
+    }
+
+
+async def warm_up() -> None:
+    """启动预热：在后台完成，不阻塞监听端口；出错时同样标记就绪，错误信息由 /api/ready 返回"""
+    start = time.perf_counter()
+    try:
+        get_ffmpeg_engine()
+        _startup["ffmpeg"] = await asyncio.to_thread(warm_up_sync)
+    except Exception as e:
+        _startup["error"] = str(e)
+    finally:
+        _startup["warm_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        _startup["ready"] = True
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    install_scheduling_policy()
+    jobs = get_job_queue()
+    jobs.start()
+    warm = asyncio.create_task(warm_up())
     yield
-    # 关闭时无需特别清理
+    warm.cancel()
+    await asyncio.gather(warm, return_exceptions=True)
+    await jobs.stop()
 
 
 app = FastAPI(title="渠道视频批量处理 API", lifespan=lifespan)
@@ -45,6 +133,27 @@ app.add_middleware(
 )
 
 
+# ---------- 健康检查 ----------
+@app.get("/api/health")
+def health():
+    """存活检查：进程已开始处理请求即返回"""
+    return {"ok": True, "uptime_sec": round(time.time() - _startup["started"], 1)}
+
+
+@app.get("/api/ready")
+def ready():
+    """就绪检查：启动预热完成后返回 200（附 ffmpeg 路径、版本与缺少的编码器/滤镜），之前返回 503；Tauri 轮询该接口后再显示窗口"""
+    body = {k: _startup[k] for k in ("ready", "warm_ms", "error", "ffmpeg")}
+    return JSONResponse(status_code=200 if _startup["ready"] else 503, content=body)
+
+
+@app.get("/api/ffmpeg/capabilities")
+async def ffmpeg_capabilities():
+    """当前 ffmpeg 的完整能力指纹（版本、编码器、滤镜、硬件加速方式），来自按二进制哈希的缓存"""
+    from utils.ffmpeg_locator import find_ffmpeg, probe_capabilities
+    return await asyncio.to_thread(probe_capabilities, find_ffmpeg(FFMPEG_PATH), FFMPEG_CAPS_PATH)
+
+
 # ---------- 主题 ----------
 class ThemeResponse(BaseModel):
     mode: str
@@ -77,195 +186,576 @@ def set_theme(body: ThemeSetBody):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ---------- 缩略图 ----------
+class ThumbnailsBody(BaseModel):
+    paths: list[str]
+
+
+# 进程内共享一个缩略图生成器，线程池上限对所有请求生效
+_thumbnailer = None
+
+
+def get_thumbnailer():
+    global _thumbnailer
+    if _thumbnailer is None:
+        from utils.ffmpeg_locator import find_ffmpeg
+        from utils.video_thumbnail import VideoThumbnailer
+        _thumbnailer = VideoThumbnailer(ffmpeg_path=find_ffmpeg(FFMPEG_PATH))
+    return _thumbnailer
+
+
+@app.post("/api/thumbnails/stream")
+def thumbnails_stream(body: ThumbnailsBody):
+    """流式返回缩略图：每生成一张推送一个 thumb 事件（含缓存键），全部完成后返回 done 事件"""
+    thumbnailer = get_thumbnailer()
+
+    def gen():
+        ok_count = 0
+        for path, ok, key, err in thumbnailer.iter_thumbnails(body.paths):
+            ok_count += 1 if ok else 0
+            yield f"data: {json.dumps({'type': 'thumb', 'path': path, 'ok': ok, 'key': key, 'error': err})}\n\n"
+        yield f"data: {json.dumps({'type': 'done', 'ok_count': ok_count, 'fail_count': len(body.paths) - ok_count})}\n\n"
+
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
+
+@app.get("/api/thumbnails/{key}")
+def get_thumbnail(key: str):
+    if len(key) != 40 or any(c not in "0123456789abcdef" for c in key):
+        raise HTTPException(status_code=400, detail="无效的缩略图键")
+    path = get_thumbnailer().cache_path(key)
+    if not path.exists():
+        raise HTTPException(status_code=404, detail="缩略图不存在")
+    # 键由文件标识派生，内容不会变化，可长期缓存
+    return FileResponse(str(path), media_type="image/jpeg", headers={"Cache-Control": "max-age=31536000, immutable"})
+
+
+# ---------- 目录扫描 ----------
+class ScanSpec(BaseModel):
+    roots: list[str]
+    recursive: bool = True
+    pattern: str = ""  # 可选 glob，匹配相对根目录的路径或文件名，如 "*.mp4"、"2024/*/*.mov"
+
+
+class ScanBody(ScanSpec):
+    probe: bool = False  # 附带 ffprobe 探测的宽高与时长
+
+
+@app.post("/api/scan")
+def scan_videos(body: ScanBody):
+    """递归扫描目录，以 NDJSON 逐行返回视频文件（路径、大小、修改时间，可选探测信息），最后一行为汇总"""
+    from utils.video_normalizer import SUPPORTED_FORMATS
+    from utils.video_scanner import iter_probed, iter_video_files
+
+    def gen():
+        entries = iter_video_files(body.roots, SUPPORTED_FORMATS, recursive=body.recursive, pattern=body.pattern)
+        if body.probe:
+            entries = iter_probed(entries, get_processor("normalize").get_video_info)
+        count = 0
+        for entry in entries:
+            count += 1
+            yield json.dumps({"type": "file", **entry}, ensure_ascii=False) + "\n"
+        yield json.dumps({"type": "done", "count": count}) + "\n"
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+
+def resolve_input_paths(input_paths: list, input_spec, exts: set) -> list:
+    """合并显式路径列表与扫描规格展开的路径（去重保序），批处理接口可只传扫描规格"""
+    paths = list(input_paths)
+    if input_spec is not None:
+        from utils.video_scanner import expand_input_spec
+        seen = set(paths)
+        for p in expand_input_spec(input_spec.roots, exts, recursive=input_spec.recursive, pattern=input_spec.pattern):
+            if p not in seen:
+                seen.add(p)
+                paths.append(p)
+    return paths
+
+
+def output_roots(input_spec) -> list:
+    """扫描规格中的目录根；其下的文件在输出目录中保留相对该根的子目录结构"""
+    return [r for r in input_spec.roots if os.path.isdir(r)] if input_spec is not None else []
+
+
+def check_output_collisions(paths: list, roots: list) -> None:
+    """多个输入会写到同一输出文件时拒绝提交（如显式列出的不同目录下的同名文件）"""
+    from utils.video_scanner import output_collisions
+    collisions = output_collisions(paths, roots)
+    if collisions:
+        rel, same = next(iter(collisions.items()))
+        raise HTTPException(
+            status_code=400,
+            detail=f"{len(collisions)} 个输出文件对应多个输入，如 {rel}: {', '.join(same[:3])}",
+        )
+
+
+# ---------- 任务队列 ----------
+# 任务库位置、并发任务数与 ffmpeg 并发进程数可通过环境变量配置；
+# 所有批处理都在同一事件循环中执行，线程数不随任务与订阅者增长
+JOB_DB_PATH = os.environ.get("CHANNEL_VIDEO_JOB_DB", str(_root / "cache" / "jobs.sqlite3"))
+JOB_WORKERS = int(os.environ.get("CHANNEL_VIDEO_JOB_WORKERS", "2"))
+FFMPEG_MAX_PROCS = int(os.environ.get("CHANNEL_VIDEO_FFMPEG_PROCS", str(JOB_WORKERS)))
+# 交互通道（如单个合并）的并发任务数；运行时挂起批量任务的 ffmpeg，结束后恢复
+INTERACTIVE_WORKERS = int(os.environ.get("CHANNEL_VIDEO_INTERACTIVE_WORKERS", "1"))
+# 批量编码并发数与每进程线程数由自适应控制器按 CPU 利用率与实测帧率调整，初值为 FFMPEG_MAX_PROCS；设为 0 时固定
+ADAPTIVE_CONCURRENCY = os.environ.get("CHANNEL_VIDEO_ADAPTIVE_CONCURRENCY", "1") == "1"
+# 编码内存预算（MB）：未设置时取物理内存的 70%，设为 0 时不做内存准入；估算校准比值保存在 cache 目录
+MEMORY_BUDGET_MB = os.environ.get("CHANNEL_VIDEO_MEMORY_BUDGET_MB", "")
+MEMORY_CALIBRATION_PATH = str(_root / "cache" / "memory_calibration.json")
+# 编码进程调度：nice 值、I/O 优先级（none / best-effort / idle）、保留给 API/界面的核心数、是否把各编码固定到互不重叠的核心
+ENCODE_NICE = int(os.environ.get("CHANNEL_VIDEO_ENCODE_NICE", "10"))
+ENCODE_IONICE = os.environ.get("CHANNEL_VIDEO_ENCODE_IONICE", "best-effort")
+ENCODE_IONICE_LEVEL = int(os.environ.get("CHANNEL_VIDEO_ENCODE_IONICE_LEVEL", "7"))
+RESERVED_CORES = int(os.environ.get("CHANNEL_VIDEO_RESERVED_CORES", "1"))
+PIN_ENCODES = os.environ.get("CHANNEL_VIDEO_PIN_ENCODES", "0") == "1"
+# 任务时间线追踪：请求参数 trace 为 true 的任务（或 CHANNEL_VIDEO_TRACE_ALL=1 时全部任务）保存 Chrome trace JSON
+TRACE_DIR = os.environ.get("CHANNEL_VIDEO_TRACE_DIR", str(_root / "cache" / "traces"))
+TRACE_ALL = os.environ.get("CHANNEL_VIDEO_TRACE_ALL", "0") == "1"
+# 本机吞吐记录（按操作类型与分辨率的媒体秒 / 编码秒），用于进度加权、剩余时间与批次耗时预估
+THROUGHPUT_PATH = os.environ.get("CHANNEL_VIDEO_THROUGHPUT_PATH", str(_root / "cache" / "throughput.json"))
+# 编码参数调优的工作目录（参考片段与候选编码，完成后删除）及最近一次调优报告
+ENCODER_TUNE_DIR = str(_root / "cache" / "encoder_tune")
+# 长时间编码没有事件时按此间隔发送 SSE 注释保活，不再以超时判定任务结束
+SSE_KEEPALIVE_SEC = 15
+# SSE 进度/日志合并后的最大推送频率（次/秒），0 表示不限速
+SSE_FLUSH_HZ = float(os.environ.get("CHANNEL_VIDEO_SSE_FLUSH_HZ", "4"))
+# fifo 派发时后台探测最多领先已完成文件的个数（须小于执行器的探测缓存条数）
+PLAN_PROBE_LEAD = 1024
+# 每个 SSE / NDJSON / WebSocket 订阅者最多积压的日志与结果条数；消费跟不上时丢弃积压并推送 lagged 事件
+SUBSCRIBER_BUFFER = int(os.environ.get("CHANNEL_VIDEO_SUBSCRIBER_BUFFER", "1000"))
+_job_queue = None
+_ffmpeg_engine = None
+_policy_installed = False
+
+
+def install_scheduling_policy():
+    """安装编码调度策略（降低编码进程优先级，保留核心给 API），可重复调用；桌面与命令行不调整优先级"""
+    global _policy_installed
+    from utils.process_priority import SchedulingPolicy, get_policy, set_policy
+    if not _policy_installed:
+        set_policy(SchedulingPolicy(
+            nice=ENCODE_NICE, ionice=ENCODE_IONICE, ionice_level=ENCODE_IONICE_LEVEL,
+            reserved_cores=RESERVED_CORES, pin=PIN_ENCODES,
+        ))
+        _policy_installed = True
+    return get_policy()
+
+
+def get_ffmpeg_engine():
+    global _ffmpeg_engine
+    if _ffmpeg_engine is None:
+        from utils.async_ffmpeg import AsyncFFmpegEngine
+        from utils.concurrency import AdaptiveConcurrency
+        from utils.memory_admission import MB, MemoryAdmission
+        policy = install_scheduling_policy()
+        # 线程预算只按编码可用的核心分配
+        controller = None
+        if ADAPTIVE_CONCURRENCY:
+            controller = AdaptiveConcurrency(initial=FFMPEG_MAX_PROCS, cpu_count=len(policy.worker_cores))
+        memory = None
+        if MEMORY_BUDGET_MB != "0":
+            budget = int(float(MEMORY_BUDGET_MB) * MB) if MEMORY_BUDGET_MB else None
+            memory = MemoryAdmission(budget, calibration_path=MEMORY_CALIBRATION_PATH)
+        _ffmpeg_engine = AsyncFFmpegEngine(
+            max_processes=FFMPEG_MAX_PROCS, max_interactive=INTERACTIVE_WORKERS,
+            controller=controller, memory=memory,
+        )
+    return _ffmpeg_engine
+
+
+def get_job_queue():
+    global _job_queue
+    if _job_queue is None:
+        from utils.job_queue import JobQueue, JobStore
+        from utils.throughput_model import ThroughputModel
+        os.makedirs(os.path.dirname(JOB_DB_PATH), exist_ok=True)
+        _job_queue = JobQueue(
+            JobStore(JOB_DB_PATH), max_workers=JOB_WORKERS, interactive_workers=INTERACTIVE_WORKERS,
+            trace_dir=TRACE_DIR, trace_all=TRACE_ALL, throughput=ThroughputModel(THROUGHPUT_PATH),
+            subscriber_buffer=SUBSCRIBER_BUFFER,
+        )
+        _job_queue.register("normalize", run_normalize_job)
+        _job_queue.register("watermark", run_watermark_job)
+        _job_queue.register("merge", run_merge_job)
+        _job_queue.register("tune", run_tune_job)
+    return _job_queue
+
+
+def job_lane(priority: Optional[str], default: str) -> str:
+    from utils.job_queue import LANES
+    if priority is None:
+        return default
+    if priority not in LANES:
+        raise HTTPException(status_code=400, detail=f"priority 须为 {' / '.join(LANES)}")
+    return priority
+
+
+def check_schedule(schedule: str) -> None:
+    from utils.makespan import ORDERS
+    if schedule not in ORDERS:
+        raise HTTPException(status_code=400, detail=f"schedule 须为 {' / '.join(ORDERS)}")
+
+
+async def schedule_costs(ctx, engine, ffprobe_path: str, output_size=None):
+    """
+    派发顺序为 lpt / spt 且多于一个文件时先探测全部输入，返回各子任务的编码代价，
+    任务运行期间探测缓存按批次扩容，编码时不再重复探测；
+    fifo 时立即开始编码，后台按输入顺序边编码边探测（见 plan_in_order）。
+    时长同时用于按时长加权的总进度与剩余时间估算
+    """
+    from utils.makespan import ORDER_FIFO, costs_from_infos, probe_infos
+    from utils.tracing import span
+    order = ctx.params.get("schedule", ORDER_FIFO)
+    if order == ORDER_FIFO or len(ctx.tasks) < 2:
+        ctx.background(plan_in_order(ctx, engine, ffprobe_path, output_size))
+        return None, ORDER_FIFO
+    ctx.on_close(engine.reserve_probe_cache(len(ctx.tasks)))
+    with span("schedule_probe", files=len(ctx.tasks)):
+        infos = await probe_infos(engine, ffprobe_path, ctx.tasks)
+    ctx.plan(infos, output_size)
+    return costs_from_infos(infos, output_size), order
+
+
+async def plan_in_order(ctx, engine, ffprobe_path: str, output_size=None) -> None:
+    """
+    按输入顺序分批探测并提供给 ctx.plan；探测最多领先已完成文件 PLAN_PROBE_LEAD 个，
+    探测结果在编码开始时仍在执行器的探测缓存中，尚未探测的文件按平均时长与吞吐模型估算
+    """
+    from utils.makespan import PROBE_CHUNK, probe_infos
+    for start in range(0, len(ctx.tasks), PROBE_CHUNK):
+        await ctx.wait_finished(start - PLAN_PROBE_LEAD + 1)
+        ctx.plan(await probe_infos(engine, ffprobe_path, ctx.tasks[start:start + PROBE_CHUNK]), output_size)
+
+
+def body_params(body: BaseModel, exclude: set) -> dict:
+    data = body.model_dump() if hasattr(body, "model_dump") else body.dict()
+    return {k: v for k, v in data.items() if k not in exclude}
+
+
+def sse(ev: dict) -> str:
+    return f"data: {json.dumps(ev)}\n\n"
+
+
+def job_event_stream(job_id: str) -> StreamingResponse:
+    """
+    订阅任务事件并以 SSE 推送；首个事件携带 job_id，客户端断开后任务继续执行。
+    进度与日志按 SSE_FLUSH_HZ 合并输出（进度取最新值、日志合并为 logs 帧），done 等事件立即输出；
+    客户端读得慢时积压的日志与结果被丢弃并收到 lagged 事件，完整结果可从 /api/jobs/{job_id}/results 读取
+    """
+    from utils.event_coalescer import EventCoalescer
+    jobs = get_job_queue()
+    queue = jobs.subscribe(job_id)
+    interval = 1.0 / SSE_FLUSH_HZ if SSE_FLUSH_HZ > 0 else 0.0
+
+    async def gen():
+        loop = asyncio.get_running_loop()
+        coalescer = EventCoalescer()
+        last_flush = 0.0
+        finished = False
+        try:
+            yield sse({"type": "job", "job_id": job_id})
+            while not finished:
+                if coalescer.empty:
+                    timeout = SSE_KEEPALIVE_SEC
+                else:
+                    timeout = max(0.0, last_flush + interval - loop.time())
+                try:
+                    ev = await asyncio.wait_for(queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    if coalescer.empty:
+                        yield ": keepalive\n\n"
+                        continue
+                    ev = None
+                while ev is not None:
+                    coalescer.add(ev)
+                    finished = ev.get("type") == "done"
+                    if finished or coalescer.urgent:
+                        break
+                    ev = queue.get_nowait() if not queue.empty() else None
+                if coalescer.urgent or loop.time() - last_flush >= interval:
+                    frames = coalescer.drain()
+                    last_flush = loop.time()
+                    yield "".join(sse(f) for f in frames)
+        finally:
+            jobs.unsubscribe(job_id, queue)
+
+    return StreamingResponse(gen(), media_type="text/event-stream")
+
+
+def ndjson(rec: dict) -> str:
+    return json.dumps(rec, ensure_ascii=False) + "\n"
+
+
+def job_results_stream(job_id: str) -> StreamingResponse:
+    """
+    以 NDJSON 输出任务的逐文件结果，最后一行为 done 汇总。
+    先订阅再从任务库分页读取已完成部分，之后只输出序号更大的实时结果，内存占用与批次规模无关；
+    客户端读得慢、订阅队列丢弃了积压结果（lagged）时从任务库补读，输出不重不漏；长时间无结果时输出空行保活
+    """
+    jobs = get_job_queue()
+    queue = jobs.subscribe(job_id)
+    until_seq = jobs.store.last_seq(job_id)
+
+    async def gen():
+        sent_seq = until_seq
+        try:
+            for rec in jobs.store.iter_task_results(job_id, until_seq=until_seq):
+                yield ndjson({"type": "result", **rec})
+            while True:
+                try:
+                    ev = await asyncio.wait_for(queue.get(), SSE_KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    yield "\n"
+                    continue
+                if ev.get("type") == "result" and ev.get("seq", 0) > sent_seq:
+                    sent_seq = ev["seq"]
+                    yield ndjson(ev)
+                elif ev.get("type") == "lagged":
+                    # 结果先写入任务库再推送，被丢弃的结果此时都已在库中
+                    latest = jobs.store.last_seq(job_id)
+                    for rec in jobs.store.iter_task_results(job_id, after_seq=sent_seq, until_seq=latest):
+                        yield ndjson({"type": "result", **rec})
+                    sent_seq = max(sent_seq, latest)
+                elif ev.get("type") == "done":
+                    yield ndjson(ev)
+                    break
+        finally:
+            jobs.unsubscribe(job_id, queue)
+
+    return StreamingResponse(gen(), media_type="application/x-ndjson")
+
+
 # ---------- 视频规范 ----------
 class NormalizeBody(BaseModel):
-    input_paths: list[str]
+    input_paths: list[str] = []
+    input_spec: Optional[ScanSpec] = None  # 以扫描规格代替完整路径列表
     output_dir: str
     target_width: int = 1920
     target_height: int = 1080
     pad_color: str = "black"
+    dedupe: bool = True  # 内容相同的输入只处理一次
+    use_cache: bool = False  # 启用跨批次结果缓存
+    priority: Optional[str] = None  # interactive / bulk，默认按操作类型
+    schedule: str = "lpt"  # 派发顺序：lpt 长任务优先（整批最快完成）/ spt 短任务优先（尽早产出）/ fifo 输入顺序
+    trace: bool = False  # 记录时间线，结束后可从 /api/jobs/{job_id}/trace 下载
 
 
-class NormalizeResult(BaseModel):
-    ok: bool
-    results: dict[str, list]  # path -> [ok, action, err]
+async def submit_normalize(body: NormalizeBody) -> str:
+    from utils.video_normalizer import SUPPORTED_FORMATS
+    check_schedule(body.schedule)
+    input_paths = await asyncio.to_thread(
+        resolve_input_paths, body.input_paths, body.input_spec, SUPPORTED_FORMATS
+    )
+    roots = output_roots(body.input_spec)
+    await asyncio.to_thread(check_output_collisions, input_paths, roots)
+    params = body_params(body, {"input_paths", "input_spec", "priority"})
+    params["output_roots"] = roots
+    return get_job_queue().submit("normalize", params, input_paths, job_lane(body.priority, "bulk"))
 
 
-@app.post("/api/normalize", response_model=NormalizeResult)
-def normalize_videos(body: NormalizeBody):
-    try:
-        from utils.video_normalizer import VideoNormalizer
-        normalizer = VideoNormalizer()
-        results = normalizer.batch_normalize(
-            body.input_paths,
-            body.output_dir,
-            body.target_width,
-            body.target_height,
-            body.pad_color,
+async def run_normalize_job(ctx) -> None:
+    from utils.file_dedup import BatchDeduplicator
+    from utils.tracing import span
+    from utils.video_scanner import output_relpath
+    p = ctx.params
+    engine = get_ffmpeg_engine()
+    normalizer = get_processor("normalize", p.get("use_cache"))
+    with span("dedup_scan", files=len(ctx.tasks)):
+        dedup = await asyncio.to_thread(
+            BatchDeduplicator, [inp for _, inp in ctx.tasks], enabled=p.get("dedupe", True)
         )
-        out = {}
-        for path, (ok, action, err) in results.items():
-            out[path] = [ok, action, err or ""]
-        return NormalizeResult(ok=all(r[0] for r in results.values()), results=out)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
-
-
-@app.post("/api/normalize/stream")
-def normalize_videos_stream(body: NormalizeBody):
-    """流式返回：实时日志与进度，最后返回 done 事件"""
-    queue = Queue()
+    total = ctx.total
 
-    def progress_cb(idx: int, total: int, name: str, pct: float, action: str, err: str):
-        if pct < 100:
-            queue.put(("log", f"正在处理 {idx}/{total}: {name}"))
+    async def process(idx, inp):
+        name = os.path.basename(inp)
+        out_path = os.path.join(p["output_dir"], output_relpath(inp, p.get("output_roots", ())))
+        with span("dedup_reuse"):
+            reused = await asyncio.to_thread(dedup.reuse, inp, out_path)
+        if reused:
+            ctx.log(f"重复文件 [{idx}/{total}]: {name}，已复用相同内容的输出")
+            ctx.record(idx, True, "duplicate")
+            return
+        ctx.log(f"正在处理 {idx}/{total}: {name}")
+        ok, action, err = await normalizer.normalize_video_async(
+            engine, inp, out_path, p["target_width"], p["target_height"], p["pad_color"],
+            lambda pct: ctx.file_progress(idx, min(pct, 100)),
+        )
+        if ok:
+            ctx.log(f"{'命中缓存' if action == 'cached' else '完成'} [{idx}/{total}]: {name}")
+            dedup.record(inp, out_path)
         else:
-            if action:
-                if err:
-                    queue.put(("log", f"失败 [{idx}/{total}]: {name} - {err}"))
-                else:
-                    queue.put(("log", f"完成 [{idx}/{total}]: {name}"))
-        progress_pct = ((idx - 1) * 100 + min(pct, 100)) / total if total else 0
-        queue.put(("progress", round(progress_pct, 1)))
+            ctx.log(f"失败 [{idx}/{total}]: {name} - {err}")
+        ctx.record(idx, ok, action, err)
 
-    def run():
-        try:
-            from utils.video_normalizer import VideoNormalizer
-            normalizer = VideoNormalizer()
-            results = normalizer.batch_normalize(
-                body.input_paths,
-                body.output_dir,
-                body.target_width,
-                body.target_height,
-                body.pad_color,
-                progress_callback=progress_cb,
-            )
-            ok_count = sum(1 for r in results.values() if r[0])
-            fail_count = len(results) - ok_count
-            queue.put(("done", {"ok": ok_count == len(results), "ok_count": ok_count, "fail_count": fail_count, "results": {k: list(v) for k, v in results.items()}}))
-        except Exception as e:
-            queue.put(("log", f"错误: {e}"))
-            queue.put(("done", {"ok": False, "ok_count": 0, "fail_count": len(body.input_paths), "results": {}, "error": str(e)}))
+    # 同一任务内的文件并行处理，实际编码并发由执行器（自适应控制器）限制
+    costs, order = await schedule_costs(
+        ctx, engine, normalizer.ffprobe_path, (p["target_width"], p["target_height"])
+    )
+    await ctx.run_tasks(
+        process, engine.max_parallelism, dedup.duplicates, costs, order,
+        live_concurrency=lambda: engine.parallelism,
+    )
 
-    threading.Thread(target=run, daemon=True).start()
 
-    def gen():
-        while True:
-            try:
-                ev = queue.get(timeout=300)
-            except Empty:
-                yield f"data: {json.dumps({'type': 'done', 'ok': False, 'error': '超时'})}\n\n"
-                break
-            if ev[0] == "log":
-                yield f"data: {json.dumps({'type': 'log', 'msg': ev[1]})}\n\n"
-            elif ev[0] == "progress":
-                yield f"data: {json.dumps({'type': 'progress', 'value': ev[1]})}\n\n"
-            elif ev[0] == "done":
-                yield f"data: {json.dumps({'type': 'done', **ev[1]})}\n\n"
-                break
+@app.post("/api/normalize")
+async def normalize_videos(body: NormalizeBody):
+    """NDJSON：每个文件完成时输出一行 result 记录，最后一行为 done 汇总（仅计数）"""
+    try:
+        job_id = await submit_normalize(body)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return job_results_stream(job_id)
 
-    return StreamingResponse(gen(), media_type="text/event-stream")
+
+@app.post("/api/normalize/stream")
+async def normalize_videos_stream(body: NormalizeBody):
+    """流式返回：提交任务后推送实时日志与进度，最后返回 done 事件"""
+    return job_event_stream(await submit_normalize(body))
 
 
 # ---------- 视频水印 ----------
 class WatermarkBody(BaseModel):
-    input_paths: list[str]
+    input_paths: list[str] = []
+    input_spec: Optional[ScanSpec] = None  # 以扫描规格代替完整路径列表
     output_dir: str
     watermark_path: str
     opacity: float = 1.0
     position: str = "center"
+    dedupe: bool = True  # 内容相同的输入只处理一次
+    use_cache: bool = False  # 启用跨批次结果缓存
+    priority: Optional[str] = None  # interactive / bulk，默认按操作类型
+    schedule: str = "lpt"  # 派发顺序：lpt / spt / fifo
+    trace: bool = False  # 记录时间线
 
 
-class WatermarkResult(BaseModel):
-    ok: bool
-    results: dict[str, list]
+async def submit_watermark(body: WatermarkBody) -> str:
+    from utils.video_watermark import VIDEO_EXTS
+    check_schedule(body.schedule)
+    input_paths = await asyncio.to_thread(resolve_input_paths, body.input_paths, body.input_spec, VIDEO_EXTS)
+    roots = output_roots(body.input_spec)
+    await asyncio.to_thread(check_output_collisions, input_paths, roots)
+    params = body_params(body, {"input_paths", "input_spec", "priority"})
+    params["output_roots"] = roots
+    return get_job_queue().submit("watermark", params, input_paths, job_lane(body.priority, "bulk"))
+
+
+async def run_watermark_job(ctx) -> None:
+    from utils.file_dedup import BatchDeduplicator
+    from utils.tracing import span
+    from utils.video_scanner import output_relpath
+    p = ctx.params
+    engine = get_ffmpeg_engine()
+    wm = get_processor("watermark", p.get("use_cache"))
+    with span("dedup_scan", files=len(ctx.tasks)):
+        dedup = await asyncio.to_thread(
+            BatchDeduplicator, [inp for _, inp in ctx.tasks], enabled=p.get("dedupe", True)
+        )
+    total = ctx.total
+
+    async def process(idx, inp):
+        name = os.path.basename(inp)
+        if not wm.is_supported_video(inp):
+            ctx.log(f"跳过 [{idx}/{total}]: {name} 格式不支持")
+            ctx.record(idx, False, "unsupported")
+            return
+        out_path = os.path.join(p["output_dir"], output_relpath(inp, p.get("output_roots", ())))
+        with span("dedup_reuse"):
+            reused = await asyncio.to_thread(dedup.reuse, inp, out_path)
+        if reused:
+            ctx.log(f"重复文件 [{idx}/{total}]: {name}，已复用相同内容的输出")
+            ctx.record(idx, True, "duplicate")
+            return
+        ctx.log(f"正在处理 {idx}/{total}: {name}")
+        ok, action, err = await wm.apply_watermark_async(
+            engine, inp, out_path, p["watermark_path"],
+            opacity=p["opacity"], position=p["position"],
+            progress_callback=lambda pct: ctx.file_progress(idx, min(pct, 100)),
+        )
+        if ok:
+            ctx.log(f"{'命中缓存' if action == 'cached' else '完成'} [{idx}/{total}]: {name}")
+            dedup.record(inp, out_path)
+        else:
+            ctx.log(f"失败 [{idx}/{total}]: {name} - {err}")
+        ctx.record(idx, ok, action, err)
 
+    costs, order = await schedule_costs(ctx, engine, get_ffprobe_path())
+    await ctx.run_tasks(
+        process, engine.max_parallelism, dedup.duplicates, costs, order,
+        live_concurrency=lambda: engine.parallelism,
+    )
 
-@app.post("/api/watermark", response_model=WatermarkResult)
-def watermark_videos(body: WatermarkBody):
+
+@app.post("/api/watermark")
+async def watermark_videos(body: WatermarkBody):
+    """NDJSON：每个文件完成时输出一行 result 记录，最后一行为 done 汇总（仅计数）"""
     try:
-        from utils.video_watermark import VideoWatermark
-        import os
-        wm = VideoWatermark()
-        results = {}
-        for inp in body.input_paths:
-            if not wm.is_supported_video(inp):
-                results[inp] = [False, "unsupported", ""]
-                continue
-            name = os.path.basename(inp)
-            out_path = os.path.join(body.output_dir, name)
-            ok, err = wm.apply_watermark(
-                inp, out_path, body.watermark_path,
-                opacity=body.opacity, position=body.position,
-            )
-            results[inp] = [ok, "processed", err or ""]
-        return WatermarkResult(ok=all(r[0] for r in results.values()), results=results)
+        job_id = await submit_watermark(body)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return job_results_stream(job_id)
 
 
 @app.post("/api/watermark/stream")
-def watermark_videos_stream(body: WatermarkBody):
-    """流式返回：实时日志与进度，最后返回 done 事件"""
-    import os
-    queue = Queue()
+async def watermark_videos_stream(body: WatermarkBody):
+    """流式返回：提交任务后推送实时日志与进度，最后返回 done 事件"""
+    return job_event_stream(await submit_watermark(body))
 
-    def run():
-        try:
-            from utils.video_watermark import VideoWatermark
-            wm = VideoWatermark()
-            results = {}
-            total = len(body.input_paths)
-            for idx, inp in enumerate(body.input_paths, 1):
-                if not wm.is_supported_video(inp):
-                    results[inp] = (False, "unsupported")
-                    queue.put(("log", f"跳过 [{idx}/{total}]: {os.path.basename(inp)} 格式不支持"))
-                    queue.put(("progress", round(idx * 100 / total, 1)))
-                    continue
-                name = os.path.basename(inp)
-                out_path = os.path.join(body.output_dir, name)
-                queue.put(("log", f"正在处理 {idx}/{total}: {name}"))
-
-                def file_progress(pct, i=idx, n=total):
-                    progress_pct = ((i - 1) * 100 + min(pct, 100)) / n if n else 0
-                    queue.put(("progress", round(progress_pct, 1)))
-
-                ok, err = wm.apply_watermark(
-                    inp, out_path, body.watermark_path,
-                    opacity=body.opacity, position=body.position,
-                    progress_callback=file_progress,
-                )
-                if err:
-                    queue.put(("log", f"失败 [{idx}/{total}]: {name} - {err}"))
-                else:
-                    queue.put(("log", f"完成 [{idx}/{total}]: {name}"))
-                queue.put(("progress", round(idx * 100 / total, 1)))
-                results[inp] = (ok, err or "")
-            ok_count = sum(1 for r in results.values() if r[0])
-            fail_count = len(results) - ok_count
-            queue.put(("done", {"ok": fail_count == 0, "ok_count": ok_count, "fail_count": fail_count, "results": {k: [v[0], "processed", v[1] or ""] for k, v in results.items()}}))
-        except Exception as e:
-            queue.put(("log", f"错误: {e}"))
-            queue.put(("done", {"ok": False, "ok_count": 0, "fail_count": len(body.input_paths), "results": {}, "error": str(e)}))
 
-    threading.Thread(target=run, daemon=True).start()
+class WatermarkPreviewBody(BaseModel):
+    video_path: str
+    watermark_path: str
+    opacity: float = 1.0
+    position: str = "center"
+    timestamp: float = 0.0
+    image_format: str = "jpg"  # jpg / png
+    max_width: int = 640
+
 
-    def gen():
-        while True:
-            try:
-                ev = queue.get(timeout=300)
-            except Empty:
-                yield f"data: {json.dumps({'type': 'done', 'ok': False, 'error': '超时'})}\n\n"
-                break
-            if ev[0] == "log":
-                yield f"data: {json.dumps({'type': 'log', 'msg': ev[1]})}\n\n"
-            elif ev[0] == "progress":
-                yield f"data: {json.dumps({'type': 'progress', 'value': ev[1]})}\n\n"
-            elif ev[0] == "done":
-                yield f"data: {json.dumps({'type': 'done', **ev[1]})}\n\n"
-                break
+# 预览图缓存：拖动不透明度滑块、切换位置时的重复请求直接返回
+_preview_cache = None
 
-    return StreamingResponse(gen(), media_type="text/event-stream")
+
+def get_preview_cache():
+    global _preview_cache
+    if _preview_cache is None:
+        from utils.preview_cache import PreviewCache
+        _preview_cache = PreviewCache()
+    return _preview_cache
+
+
+@app.post("/api/watermark/preview")
+def watermark_preview(body: WatermarkPreviewBody):
+    """单帧水印预览：按关键帧定位截取一帧并叠加水印，返回 JPEG/PNG 图片"""
+    from utils.preview_cache import quantize
+    if not os.path.isfile(body.video_path):
+        raise HTTPException(status_code=400, detail="视频文件不存在")
+    if not os.path.isfile(body.watermark_path):
+        raise HTTPException(status_code=400, detail="水印图片不存在")
+    image_format = "png" if body.image_format == "png" else "jpg"
+    media_type = "image/png" if image_format == "png" else "image/jpeg"
+    timestamp, opacity = quantize(body.timestamp, body.opacity)
+    cache = get_preview_cache()
+    key = cache.make_key(
+        body.video_path, timestamp, body.watermark_path,
+        opacity, body.position, image_format, body.max_width,
+    )
+    data = cache.get(key)
+    if data is not None:
+        return Response(content=data, media_type=media_type, headers={"X-Preview-Cache": "hit"})
+    ok, data, err = get_processor("watermark").render_preview(
+        body.video_path, body.watermark_path,
+        opacity=opacity, position=body.position, timestamp=timestamp,
+        image_format=image_format, max_width=body.max_width,
+    )
+    if not ok:
+        raise HTTPException(status_code=500, detail=err)
+    cache.put(key, data)
+    return Response(content=data, media_type=media_type, headers={"X-Preview-Cache": "miss"})
 
 
 # ---------- 视频合并 ----------
@@ -274,6 +764,9 @@ class MergeBody(BaseModel):
     insert_video: str
     output_path: str
     insert_position: str = "head"
+    use_cache: bool = False  # 启用跨批次结果缓存
+    priority: Optional[str] = None  # interactive / bulk，默认按操作类型
+    trace: bool = False  # 记录时间线
 
 
 class MergeResult(BaseModel):
@@ -281,22 +774,451 @@ class MergeResult(BaseModel):
     message: str
 
 
+async def submit_merge(body: MergeBody) -> str:
+    params = body_params(body, {"main_video", "priority"})
+    # 单个合并默认走交互通道，不必排在大批量任务之后
+    return get_job_queue().submit("merge", params, [body.main_video], job_lane(body.priority, "interactive"))
+
+
+async def run_merge_job(ctx) -> None:
+    p = ctx.params
+    engine = get_ffmpeg_engine()
+    merger = get_processor("merge", p.get("use_cache"))
+    # 合并输出的媒体时长为主视频与插入视频之和，用于进度加权与剩余时间估算
+    ffprobe_path = get_ffprobe_path()
+    insert_info = await engine.probe(ffprobe_path, p["insert_video"])
+    infos = {}
+    for idx, main_video in ctx.tasks:
+        info = await engine.probe(ffprobe_path, main_video)
+        if info and insert_info:
+            info = {**info, "duration": info["duration"] + insert_info["duration"]}
+        infos[idx] = info
+    ctx.plan(infos)
+
+    async def process(idx, main_video):
+        name = os.path.basename(main_video)
+        ctx.log(f"正在合并: {name}")
+        ok, action, err = await merger.merge_videos_async(
+            engine, main_video, p["insert_video"], p["output_path"],
+            insert_position=p["insert_position"],
+            progress_callback=lambda pct: ctx.file_progress(idx, min(pct, 100)),
+        )
+        ctx.log(f"完成: {name}" if ok else f"失败: {name} - {err}")
+        ctx.record(idx, ok, action, err)
+
+    await ctx.run_tasks(process)
+
+
 @app.post("/api/merge", response_model=MergeResult)
-def merge_videos(body: MergeBody):
+async def merge_videos(body: MergeBody):
     try:
-        from utils.video_merger import VideoMerger
-        merger = VideoMerger()
-        ok, msg = merger.merge_videos(
-            body.main_video,
-            body.insert_video,
-            body.output_path,
-            insert_position=body.insert_position,
-        )
-        return MergeResult(ok=ok, message=msg or "")
+        done = await get_job_queue().wait(await submit_merge(body))
+        if done.get("error"):
+            return MergeResult(ok=False, message=done["error"])
+        rec = next(get_job_queue().store.iter_task_results(done["job_id"]), None)
+        if rec is None:
+            return MergeResult(ok=False, message="未执行")
+        return MergeResult(ok=rec["ok"], message=rec["error"])
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ---------- 耗时预估 ----------
+class EstimateBody(BaseModel):
+    op: str  # normalize / watermark / merge
+    input_paths: list[str] = []
+    input_spec: Optional[ScanSpec] = None
+    target_width: int = 1920  # normalize 的目标尺寸
+    target_height: int = 1080
+    insert_video: Optional[str] = None  # merge 的插入视频，时长计入每个输出
+    parallelism: Optional[int] = None  # 并行编码数，默认取执行器当前并发数
+
+
+@app.post("/api/estimate")
+async def estimate_batch(body: EstimateBody):
+    """
+    按本机历史吞吐预估一批文件的耗时：探测全部输入（结果缓存），返回媒体总时长、串行编码秒数
+    与按并行数、长任务优先派发时的完工秒数；normalize 中尺寸已符合目标的文件直接复制，不计编码时间
+    """
+    from utils.makespan import probe_infos
+    from utils.video_normalizer import SUPPORTED_FORMATS
+    if body.op not in ("normalize", "watermark", "merge"):
+        raise HTTPException(status_code=400, detail="op 须为 normalize / watermark / merge")
+    input_paths = await asyncio.to_thread(
+        resolve_input_paths, body.input_paths, body.input_spec, SUPPORTED_FORMATS
+    )
+    engine = get_ffmpeg_engine()
+    ffprobe_path = get_ffprobe_path()
+    infos = await probe_infos(engine, ffprobe_path, list(enumerate(input_paths, 1)))
+    insert = None
+    if body.op == "merge" and body.insert_video:
+        insert = await engine.probe(ffprobe_path, body.insert_video)
+    target = (body.target_width, body.target_height) if body.op == "normalize" else None
+    items, unknown, copies = [], 0, 0
+    for info in infos.values():
+        if not info or info.get("duration", 0) <= 0:
+            unknown += 1
+            continue
+        size = (info["width"], info["height"])
+        if target and size == target:
+            copies += 1
+            continue
+        items.append((info["duration"] + (insert["duration"] if insert else 0), size))
+    result = get_job_queue().throughput.estimate(body.op, items, target, body.parallelism or engine.parallelism)
+    result.update(copy_files=copies, unknown_files=unknown, queued_jobs=get_job_queue().queued_count())
+    return result
+
+
+# ---------- 编码参数 ----------
+class TuneBody(BaseModel):
+    input_paths: list[str] = []
+    input_spec: Optional[ScanSpec] = None  # 以扫描规格代替完整路径列表
+    samples: int = 6  # 从批次中等间隔选取的样本数
+    segment_sec: float = 4.0  # 每个样本截取的时长
+    presets: Optional[list[str]] = None  # 默认 ultrafast ~ medium
+    crfs: Optional[list[float]] = None  # 默认 18 / 20 / 23 / 26
+    min_ssim: Optional[float] = 0.97  # 画质下限（全部样本的最差值）
+    min_psnr: Optional[float] = None
+    apply: bool = False  # 完成后把推荐结果保存为当前编码配置
+    priority: Optional[str] = None
+    trace: bool = False
+
+
+class EncoderProfileBody(BaseModel):
+    preset: str
+    crf: Optional[float] = None  # 不指定时使用编码器默认值
+
+
+def tune_report_path() -> str:
+    return os.path.join(ENCODER_TUNE_DIR, "last_report.json")
+
+
+async def submit_tune(body: TuneBody) -> str:
+    from utils.encoder_profile import X264_PRESETS
+    from utils.encoder_tuner import pick_samples
+    from utils.video_normalizer import SUPPORTED_FORMATS
+    unknown = [p for p in body.presets or [] if p not in X264_PRESETS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"未知预设: {', '.join(unknown)}")
+    if any(not 0 <= c <= 51 for c in body.crfs or []):
+        raise HTTPException(status_code=400, detail="crf 须在 0-51 之间")
+    input_paths = await asyncio.to_thread(
+        resolve_input_paths, body.input_paths, body.input_spec, SUPPORTED_FORMATS
+    )
+    samples = pick_samples(input_paths, body.samples)
+    if not samples:
+        raise HTTPException(status_code=400, detail="没有可用的输入视频")
+    params = body_params(body, {"input_paths", "input_spec", "priority", "samples"})
+    return get_job_queue().submit("tune", params, samples, job_lane(body.priority, "bulk"))
+
+
+async def run_tune_job(ctx) -> None:
+    """逐个样本测量 预设 × CRF 网格；各样本结果写入工作目录，任务续跑时已完成的样本不再测量"""
+    from utils.encoder_profile import save_profile
+    from utils.encoder_tuner import DEFAULT_CRFS, DEFAULT_PRESETS, recommend, tune_sample
+    p = ctx.params
+    normalizer = get_processor("normalize")
+    work_dir = os.path.join(ENCODER_TUNE_DIR, ctx.job_id)
+    presets = p.get("presets") or list(DEFAULT_PRESETS)
+    crfs = p.get("crfs") or list(DEFAULT_CRFS)
+    loop = asyncio.get_running_loop()
+    ctx.log(f"编码参数调优：{len(presets)} 个预设 × {len(crfs)} 个 CRF，同时运行的其他编码会影响帧率测量")
+    for idx, inp in ctx.tasks:
+        await ctx.checkpoint()
+        name = os.path.basename(inp)
+        ctx.log(f"正在测量样本 {idx}/{ctx.total}: {name}")
+        try:
+            rows = await asyncio.to_thread(
+                tune_sample, normalizer.ffmpeg_path, normalizer.ffprobe_path, inp, work_dir,
+                presets, crfs, p.get("segment_sec", 4.0),
+                lambda pct, i=idx: loop.call_soon_threadsafe(ctx.file_progress, i, pct),
+            )
+        except Exception as e:
+            ctx.log(f"失败 [{idx}/{ctx.total}]: {name} - {e}")
+            ctx.record(idx, False, "failed", str(e))
+            continue
+        with open(os.path.join(work_dir, f"{idx}.json"), "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False)
+        ctx.record(idx, True, "sampled")
+
+    rows = []
+    if os.path.isdir(work_dir):
+        for fn in sorted(os.listdir(work_dir)):
+            if fn.endswith(".json"):
+                with open(os.path.join(work_dir, fn), "r", encoding="utf-8") as f:
+                    rows.extend(json.load(f))
+    report = recommend(rows, p.get("min_ssim"), p.get("min_psnr"))
+    report["job_id"] = ctx.job_id
+    chosen = report["recommended"]
+    if chosen:
+        c = report["chosen"]
+        ctx.log(
+            f"推荐: {chosen['preset']} / CRF {chosen['crf']}，{c['fps']} fps，最差 SSIM {c['min_ssim']}，"
+            f"{c['kbps']} kbps" + ("" if report["meets_floor"] else "（没有组合达到画质下限，取画质最高的组合）")
+        )
+        if p.get("apply") and report["meets_floor"]:
+            save_profile({**chosen, "tuned_by": ctx.job_id, "fps": c["fps"], "min_ssim": c["min_ssim"]})
+            report["applied"] = True
+            ctx.log("已保存为当前编码配置")
+    os.makedirs(ENCODER_TUNE_DIR, exist_ok=True)
+    with open(tune_report_path(), "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    shutil.rmtree(work_dir, ignore_errors=True)
+    ctx.emit("tune", report=report)
+
+
+@app.post("/api/encoder/tune/stream")
+async def tune_encoder_stream(body: TuneBody):
+    """流式返回：提交调优任务后推送日志与进度，tune 事件携带报告，最后返回 done 事件"""
+    return job_event_stream(await submit_tune(body))
+
+
+@app.get("/api/encoder/profile")
+def get_encoder_profile():
+    """当前编码配置及最近一次调优报告"""
+    from utils.encoder_profile import load_profile
+    report = None
+    if os.path.exists(tune_report_path()):
+        with open(tune_report_path(), "r", encoding="utf-8") as f:
+            report = json.load(f)
+    return {"profile": load_profile(), "last_tune": report}
+
+
+@app.post("/api/encoder/profile")
+def set_encoder_profile(body: EncoderProfileBody):
+    from utils.encoder_profile import save_profile
+    try:
+        return {"profile": save_profile({"encoder": "libx264", "preset": body.preset, "crf": body.crf})}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# ---------- 任务查询 ----------
+class JobSubmitted(BaseModel):
+    job_id: str
+
+
+@app.post("/api/jobs/normalize", response_model=JobSubmitted)
+async def submit_normalize_job(body: NormalizeBody):
+    return JobSubmitted(job_id=await submit_normalize(body))
+
+
+@app.post("/api/jobs/watermark", response_model=JobSubmitted)
+async def submit_watermark_job(body: WatermarkBody):
+    return JobSubmitted(job_id=await submit_watermark(body))
+
+
+@app.post("/api/jobs/merge", response_model=JobSubmitted)
+async def submit_merge_job(body: MergeBody):
+    return JobSubmitted(job_id=await submit_merge(body))
+
+
+@app.post("/api/jobs/tune", response_model=JobSubmitted)
+async def submit_tune_job(body: TuneBody):
+    return JobSubmitted(job_id=await submit_tune(body))
+
+
+@app.get("/api/concurrency")
+def concurrency_report():
+    """编码并发状态：自适应控制器各并发档位的实测帧率及相对固定设置的提升，内存预算占用与估算校准、编码进程调度策略"""
+    from utils.process_priority import get_policy
+    engine = get_ffmpeg_engine()
+    extra = {
+        "memory": engine.memory.report() if engine.memory is not None else None,
+        "scheduling": get_policy().describe(),
+    }
+    if engine.controller is None:
+        return {"adaptive": False, "limit": engine.max_processes, **extra}
+    return {"adaptive": True, **engine.controller.report(), **extra}
+
+
+@app.get("/api/metrics")
+async def metrics_endpoint():
+    """Prometheus 文本格式指标；任务数与运行中编码的实时仪表在抓取时计算"""
+    from utils import metrics
+    from utils.job_queue import JOB_PAUSED, JOB_QUEUED, JOB_RUNNING
+    counts = await asyncio.to_thread(get_job_queue().store.count_by_state)
+    by_key = {(op, state): n for op, state, n in counts}
+    ops = {"normalize", "watermark", "merge"} | {op for op, _, _ in counts}
+    metrics.JOBS.replace(
+        ({"op": op, "state": state}, by_key.get((op, state), 0))
+        for op in sorted(ops) for state in (JOB_QUEUED, JOB_RUNNING, JOB_PAUSED)
+    )
+    live = get_ffmpeg_engine().live_stats()
+    metrics.FFMPEG_RUNNING.replace(({"op": op}, v[0]) for op, v in live.items())
+    metrics.FFMPEG_FPS.replace(({"op": op}, round(v[1], 2)) for op, v in live.items())
+    metrics.FFMPEG_SPEED.replace(({"op": op}, round(v[2], 3)) for op, v in live.items())
+    metrics.MEDIA_RATE.set(round(metrics.media_rate.rate(), 3))
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/api/jobs")
+def list_jobs(limit: int = 50):
+    return {"jobs": get_job_queue().store.list_jobs(limit)}
+
+
+@app.get("/api/jobs/{job_id}")
+def get_job(job_id: str):
+    """任务状态与计数；逐文件结果见 /api/jobs/{job_id}/results"""
+    job = get_job_queue().store.get_job(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+@app.get("/api/jobs/{job_id}/results")
+async def job_results(job_id: str):
+    """NDJSON 逐文件结果：先分页输出已完成部分，任务未结束时继续输出新完成的文件"""
+    if not get_job_queue().store.get_job(job_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job_results_stream(job_id)
+
+
+@app.get("/api/jobs/{job_id}/trace")
+def job_trace(job_id: str):
+    """下载任务时间线（Chrome trace-event JSON，可在 chrome://tracing 或 Perfetto 中打开）"""
+    path = get_job_queue().trace_path(job_id)
+    if not path or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="该任务没有时间线记录（提交时设置 trace: true）")
+    return FileResponse(path, media_type="application/json", filename=f"{job_id}.trace.json")
+
+
+@app.post("/api/jobs/{job_id}/pause")
+async def pause_job(job_id: str):
+    """暂停整批任务：运行中的 ffmpeg 被挂起（不终止），继续后从原处接着编码"""
+    if not get_job_queue().pause(job_id):
+        raise HTTPException(status_code=409, detail="任务不存在或已结束")
+    return {"ok": True}
+
+
+@app.post("/api/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    if not get_job_queue().resume(job_id):
+        raise HTTPException(status_code=409, detail="任务不存在或未暂停")
+    return {"ok": True}
+
+
+@app.get("/api/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """重新订阅任务事件（如页面刷新后），已结束的任务直接返回 done 事件"""
+    if not get_job_queue().store.get_job(job_id):
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job_event_stream(job_id)
+
+
+# 多路复用连接的紧凑帧：[类型, job_id, 数据]；p=进度值，l=日志列表，r=结果列表，d=完成计数，j=任务状态，
+# g=连接读得慢时被丢弃的结果与日志条数（完整结果从 /api/jobs/{job_id}/results 读取）
+_WS_FRAME_TYPES = {"progress": "p", "logs": "l", "results": "r", "done": "d", "job": "j", "lagged": "g"}
+
+
+def ws_frame(ev: dict) -> list:
+    ev_type = ev.get("type")
+    job_id = ev.get("job_id")
+    if ev_type == "progress":
+        frame = ["p", job_id, ev.get("value")]
+        if ev.get("file") is not None or ev.get("eta_sec") is not None:
+            frame.append(ev.get("file"))
+        if ev.get("eta_sec") is not None:
+            frame.append(ev["eta_sec"])
+        return frame
+    if ev_type == "logs":
+        return ["l", job_id, ev.get("msgs", [])]
+    if ev_type == "results":
+        # 结果条目压缩为 [path, ok, action, error]
+        return ["r", job_id, [[r["path"], r["ok"], r["action"], r["error"]] for r in ev.get("items", [])]]
+    data = {k: v for k, v in ev.items() if k not in ("type", "job_id")}
+    return [_WS_FRAME_TYPES.get(ev_type, ev_type), job_id, data]
+
+
+def command_job_ids(value) -> list:
+    """WebSocket 命令中的任务 ID：单个字符串视为一个 ID，列表取其中的字符串，其余忽略"""
+    if isinstance(value, str):
+        return [value]
+    if isinstance(value, list):
+        return [v for v in value if isinstance(v, str)]
+    return []
+
+
+@app.websocket("/api/ws/jobs")
+async def jobs_socket(ws: WebSocket):
+    """
+    单连接订阅多个任务的事件。客户端发送 {"watch": [job_id, ...] | "*"} / {"unwatch": [...]}，
+    每次 watch 立即回送任务当前状态（已结束则为完成帧）；服务端按 SSE_FLUSH_HZ 合并推送，
+    每条消息为帧数组 [[类型, job_id, 数据], ...]
+    """
+    from utils.event_coalescer import EventCoalescer
+    await ws.accept()
+    jobs = get_job_queue()
+    queue = jobs.subscribe_all()
+    watched: set = set()
+    watch_all = False
+    interval = 1.0 / SSE_FLUSH_HZ if SSE_FLUSH_HZ > 0 else 0.0
+
+    async def read_commands():
+        nonlocal watch_all
+        while True:
+            try:
+                msg = json.loads(await ws.receive_text())
+            except ValueError:
+                continue
+            # 非对象消息忽略，不断开连接
+            if not isinstance(msg, dict):
+                continue
+            unwatch = msg.get("unwatch")
+            if unwatch == "*":
+                watch_all = False
+                watched.clear()
+            else:
+                watched.difference_update(command_job_ids(unwatch))
+            watch = msg.get("watch")
+            if watch == "*":
+                watch_all = True
+                continue
+            for job_id in command_job_ids(watch):
+                watched.add(job_id)
+                snap = jobs.snapshot_event(job_id)
+                queue.put_nowait(snap or {"type": "missing", "job_id": job_id})
+
+    reader = asyncio.create_task(read_commands())
+    loop = asyncio.get_running_loop()
+    coalescer = EventCoalescer()
+    last_flush = 0.0
+    try:
+        while not reader.done():
+            timeout = SSE_KEEPALIVE_SEC if coalescer.empty else max(0.0, last_flush + interval - loop.time())
+            getter = asyncio.ensure_future(queue.get())
+            done, _ = await asyncio.wait({getter, reader}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if getter not in done:
+                getter.cancel()
+                if reader in done:
+                    break
+                if coalescer.empty:
+                    await ws.send_text("[]")
+                    continue
+            else:
+                ev = getter.result()
+                while ev is not None:
+                    if watch_all or ev.get("job_id") in watched:
+                        coalescer.add(ev)
+                        if ev.get("type") in ("done", "missing"):
+                            watched.discard(ev.get("job_id"))
+                    ev = queue.get_nowait() if not queue.empty() else None
+            if coalescer.empty:
+                continue
+            if coalescer.urgent or loop.time() - last_flush >= interval:
+                frames = [ws_frame(f) for f in coalescer.drain()]
+                last_flush = loop.time()
+                await ws.send_text(json.dumps(frames, ensure_ascii=False, separators=(",", ":")))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        reader.cancel()
+        await asyncio.gather(reader, return_exceptions=True)
+        jobs.unsubscribe_all(queue)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=API_PORT)
@@ -0,0 +1,158 @@
+"""
+编码满载时的接口延迟测量
+依次运行三种场景：空闲、满载（编码进程不设调度策略）、满载（nice + I/O 优先级 + 保留核心 + 固定核心），
+每种场景持续 --duration 秒，统计请求延迟的分位数。
+指定 --url（如 http://127.0.0.1:8765/api/concurrency）时测量运行中后端的 HTTP 延迟，
+否则测量本进程事件循环的调度延迟（与后端事件循环所处的处境相同）。
+负载优先使用 ffmpeg lavfi 编码，找不到 ffmpeg 时用 Python 忙循环进程代替
+
+用法：python benchmarks/api_latency.py [--url URL] [--duration 10] [--workers N] [--reserved-cores 1] [--json out.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_root / "src"))
+
+from utils.process_priority import CorePool, SchedulingPolicy  # noqa: E402
+
+
+def find_ffmpeg() -> str:
+    bundled = _root / "tools" / "ffmpeg" / "ffmpeg.exe"
+    if sys.platform == "win32" and bundled.exists():
+        return str(bundled)
+    return shutil.which("ffmpeg") or ""
+
+
+def load_command(ffmpeg: str, threads: int) -> list:
+    if ffmpeg:
+        return [
+            ffmpeg, "-v", "quiet", "-f", "lavfi", "-i", "testsrc2=size=1920x1080:rate=30",
+            "-t", "3600", "-c:v", "libx264", "-preset", "fast", "-threads", str(threads), "-f", "null", "-",
+        ]
+    return [sys.executable, "-c", "while True: pass"]
+
+
+def start_load(policy: SchedulingPolicy, workers: int, ffmpeg: str) -> list:
+    pool = CorePool(policy.worker_cores)
+    per_worker = max(1, len(policy.worker_cores) // workers)
+    procs = []
+    for _ in range(workers):
+        cores = pool.take(per_worker) if policy.pin else None
+        threads = len(cores) if cores else per_worker
+        proc = subprocess.Popen(
+            load_command(ffmpeg, threads), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+            **policy.spawn_kwargs(cores),
+        )
+        policy.apply_after_spawn(proc.pid, cores)
+        procs.append(proc)
+    return procs
+
+
+def stop_load(procs: list) -> None:
+    for p in procs:
+        p.kill()
+    for p in procs:
+        p.wait()
+
+
+async def measure_loop_lag(duration: float, interval: float = 0.005) -> list:
+    """事件循环调度延迟：sleep(interval) 实际耗时超出 interval 的部分（毫秒）"""
+    samples = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        t = time.perf_counter()
+        await asyncio.sleep(interval)
+        samples.append((time.perf_counter() - t - interval) * 1000)
+    return samples
+
+
+def measure_http(url: str, duration: float) -> list:
+    samples = []
+    end = time.perf_counter() + duration
+    while time.perf_counter() < end:
+        t = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=10) as resp:
+                resp.read()
+        except OSError:
+            continue
+        samples.append((time.perf_counter() - t) * 1000)
+        time.sleep(0.01)
+    return samples
+
+
+def summarize(samples: list) -> dict:
+    if not samples:
+        return {"count": 0}
+    s = sorted(samples)
+
+    def pct(q):
+        return round(s[min(len(s) - 1, int(q * len(s)))], 2)
+
+    return {
+        "count": len(s), "mean_ms": round(statistics.fmean(s), 2),
+        "p50_ms": pct(0.5), "p95_ms": pct(0.95), "p99_ms": pct(0.99), "max_ms": round(s[-1], 2),
+    }
+
+
+def run_scenario(name, policy, args, ffmpeg) -> dict:
+    procs = start_load(policy, args.workers, ffmpeg) if policy is not None else []
+    try:
+        # 负载启动后稍等再采样
+        time.sleep(1 if procs else 0)
+        if args.url:
+            samples = measure_http(args.url, args.duration)
+        else:
+            samples = asyncio.run(measure_loop_lag(args.duration))
+    finally:
+        stop_load(procs)
+    result = {"scenario": name, **summarize(samples)}
+    if policy is not None:
+        result["policy"] = policy.describe()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="编码满载时的接口延迟测量")
+    parser.add_argument("--url", default="", help="后端接口地址；不指定时测量本进程事件循环延迟")
+    parser.add_argument("--duration", type=float, default=10.0, help="每个场景的采样秒数")
+    parser.add_argument("--workers", type=int, default=0, help="负载进程数，默认等于 CPU 核数")
+    parser.add_argument("--nice", type=int, default=10)
+    parser.add_argument("--ionice", default="idle", help="none / best-effort / idle")
+    parser.add_argument("--reserved-cores", type=int, default=1)
+    parser.add_argument("--json", default="", help="结果另存为 JSON 文件")
+    args = parser.parse_args()
+    args.workers = args.workers or (os.cpu_count() or 1)
+
+    ffmpeg = find_ffmpeg()
+    print(f"负载: {'ffmpeg lavfi x264' if ffmpeg else 'Python 忙循环'} x {args.workers}")
+    scenarios = [
+        ("idle", None),
+        ("load_default", SchedulingPolicy(nice=0, ionice="none", reserved_cores=0, pin=False)),
+        ("load_policy", SchedulingPolicy(
+            nice=args.nice, ionice=args.ionice, reserved_cores=args.reserved_cores, pin=True,
+        )),
+    ]
+    results = []
+    for name, policy in scenarios:
+        r = run_scenario(name, policy, args, ffmpeg)
+        results.append(r)
+        print(f"{name:14s} n={r.get('count', 0):6d}  p50={r.get('p50_ms')}ms  p95={r.get('p95_ms')}ms  "
+              f"p99={r.get('p99_ms')}ms  max={r.get('max_ms')}ms")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,402 @@
+"""
+端到端性能基准
+用 ffmpeg lavfi 源（testsrc2 画面 + sine 音频）按固定参数生成多种分辨率、时长与宽高比的测试视频，
+依次运行规范化、水印（静态 PNG / GIF）与合并场景，记录 files/s、media-seconds/s、CPU 秒数与峰值内存到 JSON；
+compare 子命令对比基线并标出退化（退化时退出码为 1）。
+
+每个场景在独立子进程中运行，CPU 与内存统计包含其启动的全部 ffmpeg 进程：
+POSIX 取 wait4 的资源统计（峰值为最大单个进程的 RSS），Windows 通过作业对象统计（峰值为最大单个进程的提交内存）。
+
+用法：
+  python benchmarks/bench.py generate [--preset quick|full]
+  python benchmarks/bench.py run [--preset quick|full] [--scenario NAME ...] [--out result.json] [--save-baseline]
+  python benchmarks/bench.py compare [BASELINE] CURRENT [--threshold 0.1]
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_root / "src"))
+
+MEDIA_ROOT = _root / "cache" / "bench_media"
+RESULTS_DIR = _root / "cache" / "bench_results"
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+
+# 测试素材：（名称, 宽, 高, 时长秒）；quick 供日常对比，full 覆盖 4K 与长视频
+PRESETS = {
+    "quick": [
+        ("land_720p_5s", 1280, 720, 5),
+        ("land_1080p_10s", 1920, 1080, 10),
+        ("vert_1080x1920_10s", 1080, 1920, 10),
+        ("square_720_5s", 720, 720, 5),
+        ("land_1080p_5s", 1920, 1080, 5),
+    ],
+    "full": [
+        ("land_720p_5s", 1280, 720, 5),
+        ("land_1080p_30s", 1920, 1080, 30),
+        ("land_1080p_120s", 1920, 1080, 120),
+        ("vert_1080x1920_30s", 1080, 1920, 30),
+        ("square_1080_30s", 1080, 1080, 30),
+        ("wide_2560x1080_30s", 2560, 1080, 30),
+        ("uhd_3840x2160_20s", 3840, 2160, 20),
+        ("land_1080p_5s", 1920, 1080, 5),
+    ],
+}
+# 合并场景的插入片段（与主体同尺寸）
+INSERT_SECONDS = 3
+
+SCENARIOS = ("normalize_1080p", "normalize_vertical", "watermark_png", "watermark_gif", "merge_head")
+
+# compare：越大越好 / 越小越好的指标
+HIGHER_IS_BETTER = ("files_per_sec", "media_sec_per_sec")
+LOWER_IS_BETTER = ("cpu_sec", "peak_rss_mb")
+
+
+def find_ffmpeg(explicit: str = "") -> str:
+    if explicit:
+        return explicit
+    bundled = _root / "tools" / "ffmpeg" / "ffmpeg.exe"
+    if sys.platform == "win32" and bundled.exists():
+        return str(bundled)
+    return shutil.which("ffmpeg") or ""
+
+
+def find_ffprobe(ffmpeg: str) -> str:
+    for name in ("ffprobe.exe", "ffprobe"):
+        candidate = Path(ffmpeg).parent / name
+        if candidate.exists():
+            return str(candidate)
+    return shutil.which("ffprobe") or str(Path(ffmpeg).parent / "ffprobe.exe")
+
+
+def ffmpeg_version(ffmpeg: str) -> str:
+    try:
+        out = subprocess.run([ffmpeg, "-version"], capture_output=True, text=True, timeout=10).stdout
+        return out.splitlines()[0] if out else ""
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+# ---------- 素材生成 ----------
+def _bitexact() -> List[str]:
+    # 固定编码器与封装的随机/版本信息，同一 ffmpeg 版本生成的素材逐字节一致
+    return ["-fflags", "+bitexact", "-flags:v", "+bitexact", "-flags:a", "+bitexact", "-map_metadata", "-1"]
+
+
+def _gen_video(ffmpeg: str, path: Path, w: int, h: int, seconds: float) -> None:
+    cmd = [
+        ffmpeg, "-v", "error", "-y",
+        "-f", "lavfi", "-i", f"testsrc2=size={w}x{h}:rate=30:duration={seconds}",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={seconds}",
+        "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", "-threads", "1",
+        "-c:a", "aac", "-b:a", "128k", "-shortest", *_bitexact(), str(path),
+    ]
+    subprocess.run(cmd, check=True)
+
+
+def generate(ffmpeg: str, preset: str) -> Path:
+    """生成（或复用）素材目录；清单与参数一致时不重新生成"""
+    media_dir = MEDIA_ROOT / preset
+    spec = {
+        "videos": PRESETS[preset], "insert_seconds": INSERT_SECONDS,
+        "ffmpeg": ffmpeg_version(ffmpeg),
+    }
+    manifest = media_dir / "manifest.json"
+    if manifest.exists():
+        try:
+            if json.loads(manifest.read_text(encoding="utf-8")) == json.loads(json.dumps(spec)):
+                return media_dir
+        except ValueError:
+            pass
+    shutil.rmtree(media_dir, ignore_errors=True)
+    (media_dir / "inputs").mkdir(parents=True)
+    (media_dir / "inserts").mkdir()
+    for name, w, h, seconds in PRESETS[preset]:
+        print(f"生成素材 {name} ({w}x{h}, {seconds}s)")
+        _gen_video(ffmpeg, media_dir / "inputs" / f"{name}.mp4", w, h, seconds)
+    for w, h in sorted({(w, h) for _, w, h, _ in PRESETS[preset]}):
+        _gen_video(ffmpeg, media_dir / "inserts" / f"insert_{w}x{h}.mp4", w, h, INSERT_SECONDS)
+    subprocess.run([
+        ffmpeg, "-v", "error", "-y", "-f", "lavfi", "-i", "color=c=white@0.6:s=240x96,format=rgba",
+        "-frames:v", "1", str(media_dir / "wm.png"),
+    ], check=True)
+    subprocess.run([
+        ffmpeg, "-v", "error", "-y", "-f", "lavfi", "-i", "testsrc2=size=160x90:rate=10:duration=2",
+        str(media_dir / "wm.gif"),
+    ], check=True)
+    manifest.write_text(json.dumps(spec, ensure_ascii=False, indent=2), encoding="utf-8")
+    return media_dir
+
+
+# ---------- 场景执行（子进程内） ----------
+def _inputs(media_dir: Path) -> List[Tuple[Path, int, int, float]]:
+    sizes = {name: (w, h, s) for name, w, h, s in PRESETS[media_dir.name]}
+    out = []
+    for p in sorted((media_dir / "inputs").glob("*.mp4")):
+        w, h, s = sizes[p.stem]
+        out.append((p, w, h, float(s)))
+    return out
+
+
+def run_scenario_inline(name: str, media_dir: Path, ffmpeg: str, out_dir: Path) -> Dict:
+    from utils.video_merger import VideoMerger
+    from utils.video_normalizer import VideoNormalizer
+    from utils.video_watermark import VideoWatermark
+
+    files = 0
+    media_sec = 0.0
+    failures: List[str] = []
+    ffprobe = find_ffprobe(ffmpeg)
+    normalizer = VideoNormalizer(ffmpeg_path=ffmpeg, ffprobe_path=ffprobe)
+    watermark = VideoWatermark(ffmpeg_path=ffmpeg)
+    merger = VideoMerger(ffmpeg_path=ffmpeg)
+    start = time.perf_counter()
+    for path, w, h, seconds in _inputs(media_dir):
+        out_path = str(out_dir / path.name)
+        media = seconds
+        if name in ("normalize_1080p", "normalize_vertical"):
+            tw, th = (1920, 1080) if name == "normalize_1080p" else (1080, 1920)
+            ok, _, err = normalizer.normalize_video(str(path), out_path, tw, th)
+        elif name in ("watermark_png", "watermark_gif"):
+            wm = media_dir / ("wm.png" if name == "watermark_png" else "wm.gif")
+            ok, _, err = watermark.apply_watermark(str(path), out_path, str(wm), 0.8, "bottom_right")
+        elif name == "merge_head":
+            insert = media_dir / "inserts" / f"insert_{w}x{h}.mp4"
+            ok, _, err = merger.merge_videos(str(path), str(insert), out_path, "head")
+            media = seconds + INSERT_SECONDS
+        else:
+            raise SystemExit(f"未知场景: {name}")
+        files += 1
+        if ok:
+            media_sec += media
+        else:
+            failures.append(f"{path.name}: {(err or '')[-200:]}")
+    return {"files": files, "media_sec": media_sec, "wall_sec": time.perf_counter() - start, "failures": failures}
+
+
+# ---------- 资源统计 ----------
+def _run_measured_posix(cmd: List[str]) -> Tuple[int, Optional[float], Optional[int]]:
+    proc = subprocess.Popen(cmd)
+    _, status, ru = os.wait4(proc.pid, 0)
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # Linux 的 ru_maxrss 单位为 KB，macOS 为字节
+    rss = ru.ru_maxrss if sys.platform == "darwin" else ru.ru_maxrss * 1024
+    return proc.returncode, ru.ru_utime + ru.ru_stime, rss
+
+
+def _run_measured_windows(cmd: List[str]) -> Tuple[int, Optional[float], Optional[int]]:
+    import ctypes
+    from ctypes import wintypes
+
+    class IoCounters(ctypes.Structure):
+        _fields_ = [(n, ctypes.c_ulonglong) for n in (
+            "ReadOperationCount", "WriteOperationCount", "OtherOperationCount",
+            "ReadTransferCount", "WriteTransferCount", "OtherTransferCount",
+        )]
+
+    class BasicLimit(ctypes.Structure):
+        _fields_ = [
+            ("PerProcessUserTimeLimit", ctypes.c_longlong), ("PerJobUserTimeLimit", ctypes.c_longlong),
+            ("LimitFlags", wintypes.DWORD), ("MinimumWorkingSetSize", ctypes.c_size_t),
+            ("MaximumWorkingSetSize", ctypes.c_size_t), ("ActiveProcessLimit", wintypes.DWORD),
+            ("Affinity", ctypes.c_size_t), ("PriorityClass", wintypes.DWORD), ("SchedulingClass", wintypes.DWORD),
+        ]
+
+    class ExtendedLimit(ctypes.Structure):
+        _fields_ = [
+            ("BasicLimitInformation", BasicLimit), ("IoInfo", IoCounters),
+            ("ProcessMemoryLimit", ctypes.c_size_t), ("JobMemoryLimit", ctypes.c_size_t),
+            ("PeakProcessMemoryUsed", ctypes.c_size_t), ("PeakJobMemoryUsed", ctypes.c_size_t),
+        ]
+
+    class BasicAccounting(ctypes.Structure):
+        _fields_ = [
+            ("TotalUserTime", ctypes.c_longlong), ("TotalKernelTime", ctypes.c_longlong),
+            ("ThisPeriodTotalUserTime", ctypes.c_longlong), ("ThisPeriodTotalKernelTime", ctypes.c_longlong),
+            ("TotalPageFaultCount", wintypes.DWORD), ("TotalProcesses", wintypes.DWORD),
+            ("ActiveProcesses", wintypes.DWORD), ("TotalTerminatedProcesses", wintypes.DWORD),
+        ]
+
+    kernel32 = ctypes.windll.kernel32
+    job = kernel32.CreateJobObjectW(None, None)
+    proc = subprocess.Popen(cmd)
+    # 子进程的 Python 启动远慢于此处加入作业对象，ffmpeg 子进程都会继承作业
+    kernel32.AssignProcessToJobObject(job, int(proc._handle))
+    proc.wait()
+    acct, ext = BasicAccounting(), ExtendedLimit()
+    cpu = rss = None
+    if kernel32.QueryInformationJobObject(job, 1, ctypes.byref(acct), ctypes.sizeof(acct), None):
+        cpu = (acct.TotalUserTime + acct.TotalKernelTime) / 1e7
+    if kernel32.QueryInformationJobObject(job, 9, ctypes.byref(ext), ctypes.sizeof(ext), None):
+        rss = int(ext.PeakProcessMemoryUsed)
+    kernel32.CloseHandle(job)
+    return proc.returncode, cpu, rss
+
+
+def run_measured(cmd: List[str]) -> Tuple[int, Optional[float], Optional[int]]:
+    """运行命令，返回（退出码, 进程树 CPU 秒数, 最大单进程内存字节）"""
+    if sys.platform == "win32":
+        return _run_measured_windows(cmd)
+    return _run_measured_posix(cmd)
+
+
+def run_scenario(name: str, media_dir: Path, ffmpeg: str) -> Dict:
+    with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as tmp:
+        stats_path = Path(tmp) / "stats.json"
+        out_dir = Path(tmp) / "out"
+        out_dir.mkdir()
+        cmd = [
+            sys.executable, __file__, "_scenario", name,
+            "--media-dir", str(media_dir), "--ffmpeg", ffmpeg, "--out-dir", str(out_dir), "--stats", str(stats_path),
+        ]
+        code, cpu, rss = run_measured(cmd)
+        if code != 0 or not stats_path.exists():
+            return {"error": f"场景进程退出码 {code}"}
+        stats = json.loads(stats_path.read_text(encoding="utf-8"))
+    wall = stats["wall_sec"]
+    return {
+        "files": stats["files"],
+        "failures": stats["failures"],
+        "wall_sec": round(wall, 3),
+        "media_sec": stats["media_sec"],
+        "files_per_sec": round(stats["files"] / wall, 4) if wall > 0 else None,
+        "media_sec_per_sec": round(stats["media_sec"] / wall, 4) if wall > 0 else None,
+        "cpu_sec": None if cpu is None else round(cpu, 3),
+        "peak_rss_mb": None if rss is None else round(rss / 1024 / 1024, 1),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=_root, capture_output=True, text=True, timeout=10
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+
+def cmd_run(args) -> int:
+    ffmpeg = find_ffmpeg(args.ffmpeg)
+    if not ffmpeg:
+        print("未找到 ffmpeg（tools/ffmpeg 或 PATH），可用 --ffmpeg 指定")
+        return 2
+    media_dir = generate(ffmpeg, args.preset)
+    result = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"), "revision": git_revision(), "preset": args.preset,
+            "ffmpeg": ffmpeg_version(ffmpeg), "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+        },
+        "scenarios": {},
+    }
+    for name in args.scenario or SCENARIOS:
+        print(f"运行场景 {name} ...", flush=True)
+        r = run_scenario(name, media_dir, ffmpeg)
+        result["scenarios"][name] = r
+        if "error" in r:
+            print(f"  失败: {r['error']}")
+            continue
+        print(f"  {r['files']} 个文件  {r['wall_sec']}s  {r['files_per_sec']} files/s  "
+              f"{r['media_sec_per_sec']} media-s/s  CPU {r['cpu_sec']}s  峰值 {r['peak_rss_mb']}MB"
+              + (f"  失败 {len(r['failures'])}" if r["failures"] else ""))
+    out = Path(args.out) if args.out else RESULTS_DIR / f"{time.strftime('%Y%m%d_%H%M%S')}_{args.preset}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"结果: {out}")
+    if args.save_baseline:
+        BASELINE_PATH.write_text(json.dumps(result, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"已保存为基线: {BASELINE_PATH}")
+    return 0
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[Dict]:
+    """逐场景对比指标，返回变化列表（regression 为真表示退化超过阈值）"""
+    rows = []
+    for name, cur in current.get("scenarios", {}).items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base or "error" in base or "error" in cur:
+            continue
+        for metric in HIGHER_IS_BETTER + LOWER_IS_BETTER:
+            b, c = base.get(metric), cur.get(metric)
+            if not b or c is None:
+                continue
+            change = (c - b) / b
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            rows.append({
+                "scenario": name, "metric": metric, "baseline": b, "current": c,
+                "change": round(change, 4), "regression": worse > threshold,
+            })
+    return rows
+
+
+def cmd_compare(args) -> int:
+    paths = args.files
+    baseline_path, current_path = (BASELINE_PATH, paths[0]) if len(paths) == 1 else (paths[0], paths[1])
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))
+    current = json.loads(Path(current_path).read_text(encoding="utf-8"))
+    if baseline.get("meta", {}).get("preset") != current.get("meta", {}).get("preset"):
+        print("警告: 基线与当前结果的素材预设不同，对比结果仅供参考")
+    rows = compare(baseline, current, args.threshold)
+    regressions = [r for r in rows if r["regression"]]
+    for r in rows:
+        flag = "退化" if r["regression"] else ""
+        print(f"{r['scenario']:20s} {r['metric']:18s} {r['baseline']:>10} -> {r['current']:>10}  "
+              f"{r['change'] * 100:+6.1f}%  {flag}")
+    print(f"共 {len(regressions)} 项退化（阈值 {args.threshold * 100:.0f}%）")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="端到端性能基准")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_gen = sub.add_parser("generate", help="生成测试素材")
+    p_gen.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    p_gen.add_argument("--ffmpeg", default="")
+
+    p_run = sub.add_parser("run", help="运行基准并保存结果")
+    p_run.add_argument("--preset", choices=sorted(PRESETS), default="quick")
+    p_run.add_argument("--scenario", action="append", choices=SCENARIOS)
+    p_run.add_argument("--ffmpeg", default="")
+    p_run.add_argument("--out", default="")
+    p_run.add_argument("--save-baseline", action="store_true", help=f"同时保存为基线 {BASELINE_PATH.name}")
+
+    p_cmp = sub.add_parser("compare", help="对比基线，退化时退出码为 1")
+    p_cmp.add_argument("files", nargs="+", help="[基线] 当前结果；只给一个文件时与 benchmarks/baseline.json 对比")
+    p_cmp.add_argument("--threshold", type=float, default=0.1, help="退化阈值（比例），默认 0.1")
+
+    p_sc = sub.add_parser("_scenario")  # 内部：在子进程中运行单个场景
+    p_sc.add_argument("name")
+    p_sc.add_argument("--media-dir", required=True)
+    p_sc.add_argument("--ffmpeg", required=True)
+    p_sc.add_argument("--out-dir", required=True)
+    p_sc.add_argument("--stats", required=True)
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        ffmpeg = find_ffmpeg(args.ffmpeg)
+        if not ffmpeg:
+            print("未找到 ffmpeg（tools/ffmpeg 或 PATH），可用 --ffmpeg 指定")
+            return 2
+        print(f"素材目录: {generate(ffmpeg, args.preset)}")
+        return 0
+    if args.command == "run":
+        return cmd_run(args)
+    if args.command == "compare":
+        return cmd_compare(args)
+    stats = run_scenario_inline(args.name, Path(args.media_dir), args.ffmpeg, Path(args.out_dir))
+    Path(args.stats).write_text(json.dumps(stats, ensure_ascii=False), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,311 @@
+"""
+ffmpeg / ffprobe 替身
+用于在没有真实编码负载的环境（任意 Linux / macOS）中快速测试调度、流式推送与并发行为：
+  - ffmpeg：按配置的速度（媒体秒 / 墙钟秒）输出与真实 ffmpeg 相同格式的 frame=/fps=/time=/speed= 进度行，
+    按失败率随机失败，结束时写出占位输出文件（JSON，记录时长与尺寸，可再次作为输入）
+  - ffprobe：-show_streams 输出 JSON；输入为占位文件时返回其中的时长与尺寸，否则按路径哈希生成固定的值
+
+安装（生成 ffmpeg / ffmpeg.exe / ffprobe / ffprobe.exe 启动脚本与配置文件）：
+  python benchmarks/fake_ffmpeg.py install DIR [--speed 20] [--fail-rate 0.05] [--startup 0.1] [--busy]
+之后把 DIR/ffmpeg.exe 作为 ffmpeg_path 传给处理器，或设置 CHANNEL_VIDEO_FFMPEG_PATH 后启动后端。
+生成占位输入：
+  python benchmarks/fake_ffmpeg.py inputs DIR --count 50 [--min-duration 5 --max-duration 60]
+
+配置读取顺序：安装目录下的 fake_ffmpeg.json，环境变量 FAKE_FFMPEG_<KEY>（如 FAKE_FFMPEG_FAIL_RATE=0.2）覆盖
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import re
+import stat
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+CONFIG_NAME = "fake_ffmpeg.json"
+PLACEHOLDER_KEY = "fake_media"
+
+DEFAULTS = {
+    "speed": 20.0,  # 媒体秒 / 墙钟秒
+    "startup_sec": 0.1,  # 启动到输出第一行进度的时间
+    "tick_sec": 0.25,  # 进度行间隔
+    "fail_rate": 0.0,  # 失败概率
+    "seed": None,  # 指定时失败与否只取决于种子与输出路径，可复现
+    "busy": False,  # 以忙循环代替 sleep，产生真实 CPU 占用（测试按 CPU 利用率调整的并发控制）
+    "rss_mb": 0,  # 运行期间额外占用的内存（测试内存准入）
+    "fps": 30.0,
+}
+# 占位输入的尺寸组合（横屏 / 竖屏 / 方形 / 4K）
+SIZES = [(1920, 1080), (1280, 720), (1080, 1920), (720, 720), (3840, 2160)]
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp"}
+# x264 预设的相对编码速度（fast 为 1）与画质损失，供编码参数调优在替身上得到有区分度的结果
+PRESET_SPEED = {
+    "ultrafast": 3.5, "superfast": 2.6, "veryfast": 1.9, "faster": 1.3, "fast": 1.0,
+    "medium": 0.8, "slow": 0.5, "slower": 0.3, "veryslow": 0.15,
+}
+PRESET_SSIM_LOSS = {"ultrafast": 0.012, "superfast": 0.008, "veryfast": 0.004, "faster": 0.002}
+
+
+def load_config(base_dir: Path) -> Dict:
+    config = dict(DEFAULTS)
+    path = base_dir / CONFIG_NAME
+    if path.exists():
+        try:
+            config.update(json.loads(path.read_text(encoding="utf-8")))
+        except ValueError:
+            pass
+    for key, default in DEFAULTS.items():
+        raw = os.environ.get(f"FAKE_FFMPEG_{key.upper()}")
+        if raw is None:
+            continue
+        if isinstance(default, bool):
+            config[key] = raw == "1"
+        elif key == "seed":
+            config[key] = int(raw)
+        else:
+            config[key] = type(default)(raw)
+    return config
+
+
+def media_info(path: str) -> Optional[Dict]:
+    """占位文件返回其中记录的信息；其他文件按路径哈希生成固定的时长与尺寸；文件不存在时返回 None"""
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.loads(f.read(4096))
+        if isinstance(data, dict) and data.get(PLACEHOLDER_KEY):
+            return data
+    except (ValueError, UnicodeDecodeError, OSError):
+        pass
+    h = int(hashlib.md5(os.path.abspath(path).encode("utf-8")).hexdigest()[:8], 16)
+    w, ht = SIZES[h % len(SIZES)]
+    return {PLACEHOLDER_KEY: True, "width": w, "height": ht, "duration": 5.0 + h % 56}
+
+
+def write_placeholder(path: str, info: Dict, extra: str = "") -> None:
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({**info, PLACEHOLDER_KEY: True, "extra": extra}, f)
+
+
+def _fmt_time(sec: float) -> str:
+    h, rem = divmod(max(0.0, sec), 3600)
+    m, s = divmod(rem, 60)
+    return f"{int(h):02d}:{int(m):02d}:{s:05.2f}"
+
+
+def _wait(seconds: float, busy: bool) -> None:
+    if not busy:
+        time.sleep(seconds)
+        return
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def run_ffprobe(args: List[str]) -> int:
+    path = args[-1] if args else ""
+    info = media_info(path)
+    if info is None:
+        return 1
+    streams = [
+        {
+            "index": 0, "codec_type": "video", "codec_name": "h264", "width": info["width"],
+            "height": info["height"], "pix_fmt": "yuv420p", "duration": f"{info['duration']:.6f}",
+        },
+        {"index": 1, "codec_type": "audio", "codec_name": "aac", "duration": f"{info['duration']:.6f}"},
+    ]
+    print(json.dumps({"streams": streams}, indent=2))
+    return 0
+
+
+def _output_info(args: List[str], inputs: List[str]) -> Dict:
+    infos = [media_info(p) for p in inputs if Path(p).suffix.lower() not in IMAGE_EXTS]
+    infos = [i for i in infos if i] or [{"width": 1920, "height": 1080, "duration": 10.0}]
+    graph = " ".join(args[i + 1] for i, a in enumerate(args[:-1]) if a in ("-vf", "-filter_complex"))
+    duration = infos[0]["duration"]
+    if "concat=n=" in graph:
+        duration = sum(i["duration"] for i in infos)
+    if "-t" in args:
+        try:
+            duration = min(duration, float(args[args.index("-t") + 1]))
+        except (ValueError, IndexError):
+            pass
+    width, height = infos[0]["width"], infos[0]["height"]
+    m = re.search(r"pad=(\d+):(\d+)", graph)
+    if m:
+        width, height = int(m.group(1)), int(m.group(2))
+    out = {"width": width, "height": height, "duration": duration}
+    if "-preset" in args:
+        out["preset"] = args[args.index("-preset") + 1]
+        out["crf"] = float(args[args.index("-crf") + 1]) if "-crf" in args else 23.0
+        if "-qp" in args and args[args.index("-qp") + 1] == "0":
+            out["crf"] = 0.0
+    return out
+
+
+def _quality_lines(inputs: List[str]) -> List[str]:
+    """按第一个输入记录的预设与 CRF 模拟 ssim / psnr 滤镜的汇总输出"""
+    info = media_info(inputs[0]) if inputs else None
+    crf = (info or {}).get("crf", 23.0)
+    if crf == 0:
+        return [
+            "[Parsed_ssim_4 @ 0x0] SSIM Y:1.000000 (inf) U:1.000000 (inf) V:1.000000 (inf) All:1.000000 (inf)",
+            "[Parsed_psnr_5 @ 0x0] PSNR y:inf u:inf v:inf average:inf min:inf max:inf",
+        ]
+    loss = PRESET_SSIM_LOSS.get((info or {}).get("preset", "fast"), 0.0)
+    ssim = max(0.5, 0.995 - 0.0025 * (crf - 18) - loss)
+    psnr = 48.0 - 0.6 * (crf - 18) - loss * 300
+    return [
+        f"[Parsed_ssim_4 @ 0x0] SSIM Y:{ssim:.6f} U:{ssim:.6f} V:{ssim:.6f} All:{ssim:.6f} (20.0)",
+        f"[Parsed_psnr_5 @ 0x0] PSNR y:{psnr:.2f} u:{psnr:.2f} v:{psnr:.2f} average:{psnr:.2f} "
+        f"min:{psnr - 3:.2f} max:{psnr + 3:.2f}",
+    ]
+
+
+# 能力探测（-encoders / -filters）时列出的条目，覆盖处理器用到的编码器与滤镜
+FAKE_ENCODERS = (("V....D", "libx264"), ("A....D", "aac"), ("V....D", "png"), ("V....D", "mjpeg"))
+FAKE_FILTERS = (
+    ("scale", "V->V"), ("pad", "V->V"), ("overlay", "VV->V"), ("concat", "N->N"),
+    ("colorchannelmixer", "V->V"), ("format", "V->V"), ("ssim", "VV->V"), ("psnr", "VV->V"),
+)
+
+
+def run_ffmpeg(args: List[str], config: Dict) -> int:
+    if "-version" in args:
+        print("ffmpeg version fake-ffmpeg (benchmarks/fake_ffmpeg.py)")
+        return 0
+    if "-encoders" in args:
+        print("Encoders:\n ------")
+        print("\n".join(f" {flags} {name:20s} fake" for flags, name in FAKE_ENCODERS))
+        return 0
+    if "-filters" in args:
+        print("Filters:\n  T.. = Timeline support")
+        print("\n".join(f" ... {name:16s} {io:6s} fake" for name, io in FAKE_FILTERS))
+        return 0
+    if "-hwaccels" in args:
+        print("Hardware acceleration methods:\n")
+        return 0
+    inputs = [args[i + 1] for i, a in enumerate(args[:-1]) if a == "-i"]
+    output = args[-1] if args else ""
+    missing = [p for p in inputs if not os.path.exists(p) and not p.startswith(("lavfi", "color=", "testsrc"))]
+    err = sys.stderr
+    err.write("ffmpeg version fake-ffmpeg\n")
+    if missing:
+        err.write(f"{missing[0]}: No such file or directory\n")
+        return 1
+    info = _output_info(args, inputs)
+    for n, path in enumerate(inputs):
+        err.write(f"Input #{n}, mov,mp4,m4a,3gp,3g2,mj2, from '{path}':\n")
+        err.write(f"  Duration: {_fmt_time(info['duration'])}, start: 0.000000, bitrate: 4000 kb/s\n")
+    err.flush()
+
+    seed = config.get("seed")
+    rng = random.Random(f"{seed}:{output}") if seed is not None else random.Random()
+    fail_at = rng.uniform(0.1, 0.9) if rng.random() < config["fail_rate"] else None
+    ballast = bytearray(int(config["rss_mb"]) * 1024 * 1024) if config["rss_mb"] else None  # noqa: F841
+    busy = bool(config["busy"])
+    speed = max(0.01, float(config["speed"])) * PRESET_SPEED.get(info.get("preset", "fast"), 1.0)
+    fps = float(config["fps"])
+    duration = info["duration"]
+
+    _wait(float(config["startup_sec"]), busy)
+    start = time.perf_counter()
+    media = 0.0
+    while media < duration:
+        _wait(float(config["tick_sec"]), busy)
+        media = min(duration, (time.perf_counter() - start) * speed)
+        if fail_at is not None and media >= duration * fail_at:
+            err.write("\nError while encoding: simulated failure (fake ffmpeg)\n")
+            err.write("Conversion failed!\n")
+            return 1
+        frame = int(media * fps)
+        wall = max(1e-6, time.perf_counter() - start)
+        err.write(
+            f"frame={frame:6d} fps={frame / wall:5.1f} q=28.0 size={int(media * 500):8d}kB "
+            f"time={_fmt_time(media)} bitrate=4000.0kbits/s speed={media / wall:5.2f}x\r"
+        )
+        err.flush()
+    err.write("\n")
+    graph = " ".join(args[i + 1] for i, a in enumerate(args[:-1]) if a in ("-lavfi", "-filter_complex"))
+    if "ssim" in graph or "psnr" in graph:
+        err.write("\n".join(_quality_lines(inputs)) + "\n")
+    if output and output != "-" and output not in ("/dev/null", "NUL"):
+        write_placeholder(output, info, extra=" ".join(inputs))
+    return 0
+
+
+def install(target: Path, config: Dict) -> None:
+    """写入启动脚本与配置；启动脚本用当前 Python 解释器执行本文件"""
+    target.mkdir(parents=True, exist_ok=True)
+    script = Path(__file__).resolve()
+    for tool in ("ffmpeg", "ffprobe"):
+        content = f'#!/bin/sh\nFAKE_FFMPEG_DIR="{target.resolve()}" exec "{sys.executable}" "{script}" {tool} "$@"\n'
+        for name in (tool, f"{tool}.exe"):
+            path = target / name
+            path.write_text(content, encoding="utf-8")
+            path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+    (target / CONFIG_NAME).write_text(json.dumps(config, indent=2), encoding="utf-8")
+
+
+def make_inputs(target: Path, count: int, min_duration: float, max_duration: float, seed: int) -> List[str]:
+    """生成占位输入视频（尺寸在 SIZES 中轮换，时长在区间内随机）"""
+    target.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed)
+    paths = []
+    for i in range(count):
+        w, h = SIZES[i % len(SIZES)]
+        path = target / f"fake_{i:04d}.mp4"
+        info = {"width": w, "height": h, "duration": round(rng.uniform(min_duration, max_duration), 2)}
+        write_placeholder(str(path), info, extra=str(i))
+        paths.append(str(path))
+    return paths
+
+
+def main() -> int:
+    if len(sys.argv) > 1 and sys.argv[1] in ("ffmpeg", "ffprobe"):
+        tool, args = sys.argv[1], sys.argv[2:]
+    else:
+        tool, args = Path(sys.argv[0]).stem, sys.argv[1:]
+    if tool == "ffprobe":
+        return run_ffprobe(args)
+    if tool == "ffmpeg":
+        config_dir = os.environ.get("FAKE_FFMPEG_DIR") or Path(sys.argv[0]).resolve().parent
+        return run_ffmpeg(args, load_config(Path(config_dir)))
+
+    parser = argparse.ArgumentParser(description="ffmpeg / ffprobe 替身")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_inst = sub.add_parser("install", help="生成启动脚本与配置")
+    p_inst.add_argument("dir")
+    p_inst.add_argument("--speed", type=float, default=DEFAULTS["speed"], help="媒体秒 / 墙钟秒")
+    p_inst.add_argument("--startup", type=float, default=DEFAULTS["startup_sec"])
+    p_inst.add_argument("--tick", type=float, default=DEFAULTS["tick_sec"])
+    p_inst.add_argument("--fail-rate", type=float, default=DEFAULTS["fail_rate"])
+    p_inst.add_argument("--seed", type=int, default=None)
+    p_inst.add_argument("--busy", action="store_true", help="忙循环产生 CPU 占用")
+    p_inst.add_argument("--rss-mb", type=int, default=0)
+    p_in = sub.add_parser("inputs", help="生成占位输入视频")
+    p_in.add_argument("dir")
+    p_in.add_argument("--count", type=int, default=20)
+    p_in.add_argument("--min-duration", type=float, default=5.0)
+    p_in.add_argument("--max-duration", type=float, default=60.0)
+    p_in.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.command == "install":
+        install(Path(args.dir), {
+            "speed": args.speed, "startup_sec": args.startup, "tick_sec": args.tick, "fail_rate": args.fail_rate,
+            "seed": args.seed, "busy": args.busy, "rss_mb": args.rss_mb, "fps": DEFAULTS["fps"],
+        })
+        print(f"ffmpeg_path: {Path(args.dir).resolve() / 'ffmpeg.exe'}")
+    else:
+        paths = make_inputs(Path(args.dir), args.count, args.min_duration, args.max_duration, args.seed)
+        print(f"已生成 {len(paths)} 个占位输入: {Path(args.dir).resolve()}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+"""
+桌面 GUI 启动耗时测量
+每轮在独立子进程中启动主窗口，记录从进程创建到主窗口首次可见的时间（含解释器启动与导入），
+以及子进程内部的导入、窗口构建、首次绘制耗时和首次切换到其他标签页的耗时。
+对比两种启动方式：
+  before  所有标签页在启动时创建，图标每次重新渲染（空的图标缓存目录）
+  after   只创建当前标签页，其余在首次选中时创建，图标读取磁盘缓存
+需要图形环境（Linux 无显示器时可用 xvfb-run 运行）
+
+用法：python benchmarks/gui_startup.py [--runs 5] [--mode both|before|after] [--json out.json]
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+_root = Path(__file__).resolve().parent.parent
+
+METRICS = ("process_to_window_ms", "import_ms", "build_ms", "map_ms", "first_switch_ms")
+
+
+def _child(lazy: bool, icon_cache: str) -> None:
+    """子进程：构建主窗口，等待首次可见后输出各阶段耗时（JSON 一行）"""
+    t0 = time.perf_counter()
+    sys.path.insert(0, str(_root))
+    sys.path.insert(0, str(_root / "src"))
+    import customtkinter as ctk
+    from gui import theme_icons
+    from gui.main_window import ChannelVideoToolsGUI
+    t_import = time.perf_counter()
+    if icon_cache:
+        theme_icons.ICON_CACHE_DIR = Path(icon_cache)
+    ctk.set_appearance_mode("dark")
+    ctk.set_default_color_theme("blue")
+    app = ChannelVideoToolsGUI(config_dir=str(_root / "config"), lazy_tabs=lazy)
+    t_built = time.perf_counter()
+    deadline = t_built + 10
+    while not app.root.winfo_viewable() and time.perf_counter() < deadline:
+        app.root.update()
+    app.root.update()
+    t_mapped = time.perf_counter()
+    print(json.dumps({"event": "window"}), flush=True)
+    # 切换到第二个标签页：延迟创建时这里才构建该页
+    app.tabview.set("视频水印")
+    app._on_tab_selected()
+    app.root.update()
+    t_switch = time.perf_counter()
+    print(json.dumps({
+        "event": "done",
+        "import_ms": (t_import - t0) * 1000,
+        "build_ms": (t_built - t_import) * 1000,
+        "map_ms": (t_mapped - t_built) * 1000,
+        "first_switch_ms": (t_switch - t_mapped) * 1000,
+        "visible": bool(app.root.winfo_viewable()),
+    }), flush=True)
+    app.root.destroy()
+
+
+def run_once(mode: str, icon_cache: str) -> Dict:
+    cmd = [sys.executable, __file__, "--child", mode, "--icon-cache", icon_cache]
+    start = time.perf_counter()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, cwd=str(_root))
+    result: Dict = {}
+    for line in proc.stdout:
+        try:
+            ev = json.loads(line)
+        except ValueError:
+            continue
+        if ev.get("event") == "window":
+            result["process_to_window_ms"] = (time.perf_counter() - start) * 1000
+        elif ev.get("event") == "done":
+            result.update({k: v for k, v in ev.items() if k != "event"})
+    err = proc.stderr.read()
+    proc.wait()
+    if "process_to_window_ms" not in result:
+        raise SystemExit(f"GUI 启动失败（退出码 {proc.returncode}）:\n{err.strip()[-800:]}")
+    return result
+
+
+def measure(mode: str, runs: int) -> Dict:
+    samples: List[Dict] = []
+    with tempfile.TemporaryDirectory(prefix="gui_icons_") as warm_dir:
+        if mode == "after":
+            # 预热一次写入图标缓存，之后各轮均为缓存命中
+            run_once("after", warm_dir)
+        for _ in range(runs):
+            if mode == "before":
+                with tempfile.TemporaryDirectory(prefix="gui_icons_") as cold_dir:
+                    samples.append(run_once("before", cold_dir))
+            else:
+                samples.append(run_once("after", warm_dir))
+    return {
+        "mode": mode,
+        "runs": runs,
+        **{f"{m}_median": round(statistics.median(s[m] for s in samples), 1) for m in METRICS},
+        "samples": samples,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="桌面 GUI 启动耗时测量")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--mode", choices=("both", "before", "after"), default="both")
+    parser.add_argument("--json", default="", help="结果另存为 JSON 文件")
+    parser.add_argument("--child", choices=("before", "after"), help=argparse.SUPPRESS)
+    parser.add_argument("--icon-cache", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.child == "after", args.icon_cache)
+        return 0
+
+    modes = ("before", "after") if args.mode == "both" else (args.mode,)
+    results = {m: measure(m, max(1, args.runs)) for m in modes}
+    print(f"{'mode':8s} " + " ".join(f"{m.replace('_ms', ''):>18s}" for m in METRICS) + "  (ms, median)")
+    for m, r in results.items():
+        print(f"{m:8s} " + " ".join(f"{r[f'{k}_median']:>18.1f}" for k in METRICS))
+    if len(results) == 2:
+        before = results["before"]["process_to_window_ms_median"]
+        after = results["after"]["process_to_window_ms_median"]
+        print(f"首个窗口可见: {before:.0f} ms -> {after:.0f} ms（{(before - after) / before * 100:.1f}% 更快）")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
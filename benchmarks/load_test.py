@@ -0,0 +1,280 @@
+"""
+后端负载测试
+同时发起多个 /api/{normalize,watermark}/stream 批次，统计事件延迟、吞吐量与后端内存。
+默认在临时目录中安装 ffmpeg 替身（benchmarks/fake_ffmpeg.py）、生成占位输入，并在 --port 上启动独立的后端进程
+（任务库、结果缓存与追踪目录都在临时目录中）；指定 --url 时改为压测已运行的后端，
+该后端需以 CHANNEL_VIDEO_FFMPEG_PATH 指向替身启动，且与本脚本共享文件系统。
+
+统计项：
+  submit_to_job_ms     提交请求到收到首个 job 事件
+  first_progress_ms    提交到首个 progress 事件
+  frame_gap_ms         同一批次相邻 SSE 帧的间隔（不含保活），反映事件循环阻塞
+  batch_sec            单个批次从提交到 done
+  files_per_sec / media_sec_per_sec   全部批次的吞吐
+  server_rss_mb        后端进程常驻内存（峰值 / 均值，仅 Linux 且已知进程号时）
+
+用法：python benchmarks/load_test.py [--batches 20] [--files 10] [--op normalize|watermark|mixed]
+                                     [--speed 20] [--fail-rate 0] [--url URL --server-pid PID] [--json out.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import fake_ffmpeg  # noqa: E402
+
+
+def percentiles(samples: List[float]) -> Dict:
+    if not samples:
+        return {"count": 0}
+    s = sorted(samples)
+
+    def pct(q):
+        return round(s[min(len(s) - 1, int(q * len(s)))], 2)
+
+    return {
+        "count": len(s), "mean": round(statistics.fmean(s), 2),
+        "p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "max": round(s[-1], 2),
+    }
+
+
+def current_rss(pid: int) -> Optional[int]:
+    """进程当前常驻内存（字节），读取 /proc，其他平台返回 None"""
+    try:
+        with open(f"/proc/{pid}/status", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+class RssSampler(threading.Thread):
+    def __init__(self, pid: Optional[int], interval: float = 0.25):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.interval = interval
+        self.samples: List[int] = []
+        self._halt = threading.Event()
+
+    def run(self) -> None:
+        while self.pid and not self._halt.is_set():
+            rss = current_rss(self.pid)
+            if rss is not None:
+                self.samples.append(rss)
+            self._halt.wait(self.interval)
+
+    def stop(self) -> Dict:
+        self._halt.set()
+        self.join()
+        if not self.samples:
+            return {}
+        mb = [s / 1024 / 1024 for s in self.samples]
+        return {"start_mb": round(mb[0], 1), "peak_mb": round(max(mb), 1), "mean_mb": round(statistics.fmean(mb), 1),
+                "end_mb": round(mb[-1], 1)}
+
+
+def run_batch(base_url: str, op: str, body: Dict, timeout: float) -> Dict:
+    """发起一个流式批次并读取 SSE 直到 done，记录各事件的到达时间"""
+    url = urllib.parse.urlparse(base_url)
+    conn = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=timeout)
+    result = {"op": op, "frames": 0, "types": {}, "gaps_ms": []}
+    start = time.perf_counter()
+    try:
+        conn.request("POST", f"/api/{op}/stream", json.dumps(body), {"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        if resp.status != 200:
+            result["error"] = f"HTTP {resp.status}: {resp.read()[:200]!r}"
+            return result
+        last_frame = None
+        while True:
+            line = resp.fp.readline()
+            if not line:
+                result["error"] = "连接在 done 之前关闭"
+                break
+            line = line.strip()
+            if not line.startswith(b"data:"):
+                continue  # 空行与保活注释
+            now = time.perf_counter()
+            ev = json.loads(line[5:])
+            kind = ev.get("type", "")
+            result["types"][kind] = result["types"].get(kind, 0) + 1
+            if last_frame is not None and now - last_frame > 1e-4:
+                # 同一次刷新输出的多个事件间隔接近 0，只统计帧之间的间隔
+                result["gaps_ms"].append((now - last_frame) * 1000)
+            last_frame = now
+            result["frames"] += 1
+            if kind == "job" and "submit_to_job_ms" not in result:
+                result["submit_to_job_ms"] = (now - start) * 1000
+            elif kind == "progress" and "first_progress_ms" not in result:
+                result["first_progress_ms"] = (now - start) * 1000
+            elif kind == "done":
+                result.update(ok_count=ev.get("ok_count", 0), fail_count=ev.get("fail_count", 0))
+                break
+    except (OSError, http.client.HTTPException, ValueError) as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    finally:
+        conn.close()
+        result["batch_sec"] = time.perf_counter() - start
+    return result
+
+
+def wait_ready(base_url: str, proc: Optional[subprocess.Popen], timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise SystemExit(f"后端进程已退出（退出码 {proc.returncode}）")
+        try:
+            with urllib.request.urlopen(base_url + "/api/ready", timeout=2) as resp:
+                resp.read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise SystemExit(f"后端在 {timeout:.0f} 秒内未就绪: {base_url}")
+
+
+def spawn_server(work: Path, port: int, fake_bin: Path, extra_env: Dict[str, str]) -> subprocess.Popen:
+    env = dict(os.environ)
+    env.update({
+        "CHANNEL_VIDEO_FFMPEG_PATH": str(fake_bin / "ffmpeg.exe"),
+        "CHANNEL_VIDEO_JOB_DB": str(work / "jobs.sqlite3"),
+        "CHANNEL_VIDEO_RESULT_CACHE_DIR": str(work / "results"),
+        "CHANNEL_VIDEO_TRACE_DIR": str(work / "traces"),
+        "CHANNEL_VIDEO_FFMPEG_CAPS_PATH": str(work / "ffmpeg_capabilities.json"),
+        "CHANNEL_VIDEO_THROUGHPUT_PATH": str(work / "throughput.json"),
+        **extra_env,
+    })
+    code = (
+        "import sys, uvicorn; sys.path.insert(0, sys.argv[1]); import main; "
+        "uvicorn.run(main.app, host='127.0.0.1', port=int(sys.argv[2]), log_level='warning')"
+    )
+    return subprocess.Popen([sys.executable, "-c", code, str(_root / "api"), str(port)], env=env)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="后端负载测试（ffmpeg 替身）")
+    parser.add_argument("--batches", type=int, default=20, help="同时发起的批次数")
+    parser.add_argument("--files", type=int, default=10, help="每个批次的文件数")
+    parser.add_argument("--op", choices=("normalize", "watermark", "mixed"), default="mixed")
+    parser.add_argument("--min-duration", type=float, default=5.0, help="占位输入的最短媒体时长（秒）")
+    parser.add_argument("--max-duration", type=float, default=60.0)
+    parser.add_argument("--speed", type=float, default=20.0, help="替身编码速度（媒体秒 / 墙钟秒）")
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    parser.add_argument("--busy", action="store_true", help="替身以忙循环占用 CPU")
+    parser.add_argument("--ramp", type=float, default=0.0, help="各批次提交间隔（秒），默认同时提交")
+    parser.add_argument("--port", type=int, default=18765, help="自启动后端的端口")
+    parser.add_argument("--url", default="", help="压测已运行的后端（如 http://127.0.0.1:8765）")
+    parser.add_argument("--server-pid", type=int, default=0, help="配合 --url 采样后端内存")
+    parser.add_argument("--env", action="append", default=[], help="自启动后端的额外环境变量 KEY=VALUE")
+    parser.add_argument("--timeout", type=float, default=600.0)
+    parser.add_argument("--json", default="", help="结果另存为 JSON 文件")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="cvt_load_") as tmp:
+        work = Path(tmp)
+        fake_bin = work / "bin"
+        fake_ffmpeg.install(fake_bin, {
+            **fake_ffmpeg.DEFAULTS, "speed": args.speed, "fail_rate": args.fail_rate, "busy": args.busy,
+        })
+        inputs = fake_ffmpeg.make_inputs(
+            work / "inputs", args.batches * args.files, args.min_duration, args.max_duration, seed=0
+        )
+        media_total = sum(fake_ffmpeg.media_info(p)["duration"] for p in inputs)
+        watermark = work / "wm.png"
+        watermark.write_bytes(b"\x89PNG placeholder")
+
+        proc = None
+        if args.url:
+            base_url = args.url.rstrip("/")
+            server_pid = args.server_pid or None
+        else:
+            extra = dict(kv.split("=", 1) for kv in args.env)
+            proc = spawn_server(work, args.port, fake_bin, extra)
+            base_url = f"http://127.0.0.1:{args.port}"
+            server_pid = proc.pid
+        try:
+            wait_ready(base_url, proc)
+            sampler = RssSampler(server_pid)
+            sampler.start()
+            jobs = []
+            for b in range(args.batches):
+                op = args.op if args.op != "mixed" else ("normalize", "watermark")[b % 2]
+                body = {
+                    "input_paths": inputs[b * args.files:(b + 1) * args.files],
+                    "output_dir": str(work / "out" / f"batch_{b:03d}"),
+                }
+                if op == "watermark":
+                    body.update(watermark_path=str(watermark), position="bottom_right", opacity=0.8)
+                jobs.append((op, body))
+
+            print(f"{args.batches} 个批次 x {args.files} 个文件（{args.op}），媒体总时长 {media_total:.0f} 秒")
+            start = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(1, args.batches)) as pool:
+                futures = []
+                for op, body in jobs:
+                    futures.append(pool.submit(run_batch, base_url, op, body, args.timeout))
+                    if args.ramp > 0:
+                        time.sleep(args.ramp)
+                batches = [f.result() for f in futures]
+            wall = time.perf_counter() - start
+            memory = sampler.stop()
+        finally:
+            if proc is not None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+
+    ok = sum(b.get("ok_count", 0) for b in batches)
+    failed = sum(b.get("fail_count", 0) for b in batches)
+    errors = [b["error"] for b in batches if "error" in b]
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "env")},
+        "wall_sec": round(wall, 2),
+        "files_ok": ok,
+        "files_failed": failed,
+        "batch_errors": errors,
+        "files_per_sec": round((ok + failed) / wall, 3) if wall > 0 else None,
+        "media_sec_per_sec": round(media_total / wall, 2) if wall > 0 else None,
+        "submit_to_job_ms": percentiles([b["submit_to_job_ms"] for b in batches if "submit_to_job_ms" in b]),
+        "first_progress_ms": percentiles([b["first_progress_ms"] for b in batches if "first_progress_ms" in b]),
+        "frame_gap_ms": percentiles([g for b in batches for g in b["gaps_ms"]]),
+        "batch_sec": percentiles([b["batch_sec"] for b in batches]),
+        "frames": sum(b["frames"] for b in batches),
+        "server_rss_mb": memory,
+    }
+    print(f"完成 {ok} 个，失败 {failed} 个，批次错误 {len(errors)} 个，用时 {report['wall_sec']} 秒")
+    print(f"吞吐: {report['files_per_sec']} files/s, {report['media_sec_per_sec']} media-s/s")
+    for key in ("submit_to_job_ms", "first_progress_ms", "frame_gap_ms", "batch_sec"):
+        r = report[key]
+        print(f"{key:18s} n={r.get('count', 0):5d}  p50={r.get('p50')}  p95={r.get('p95')}  "
+              f"p99={r.get('p99')}  max={r.get('max')}")
+    if memory:
+        print(f"后端内存: 峰值 {memory['peak_mb']}MB  均值 {memory['mean_mb']}MB  "
+              f"(起始 {memory['start_mb']}MB → 结束 {memory['end_mb']}MB)")
+    for e in errors[:5]:
+        print(f"  批次错误: {e}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+编码参数调优
+从代表性视频中各截取一段，按 预设 × CRF 网格编码，测量编码帧率、码率与 SSIM / PSNR，
+推荐满足画质下限且最快的组合；--apply 时写入 config/encoder_profile.json，规范化、水印与合并随即使用该配置。
+测量期间应避免运行其他编码任务，否则帧率不准确
+
+用法：python benchmarks/tune_encoder.py 路径或目录 ... [--samples 6] [--presets veryfast,fast,medium] [--crfs 20,23]
+                                        [--min-ssim 0.97] [--min-psnr 40] [--apply] [--json report.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(_root / "src"))
+
+from utils.encoder_profile import X264_PRESETS, load_profile, save_profile  # noqa: E402
+from utils.encoder_tuner import (  # noqa: E402
+    DEFAULT_CRFS, DEFAULT_MIN_SSIM, DEFAULT_PRESETS, SEGMENT_SEC, pick_samples, recommend, tune_sample,
+)
+from utils.video_normalizer import SUPPORTED_FORMATS  # noqa: E402
+
+
+def find_ffmpeg(explicit: str = "") -> str:
+    if explicit:
+        return explicit
+    bundled = _root / "tools" / "ffmpeg" / "ffmpeg.exe"
+    if sys.platform == "win32" and bundled.exists():
+        return str(bundled)
+    return shutil.which("ffmpeg") or ""
+
+
+def find_ffprobe(ffmpeg: str) -> str:
+    for name in ("ffprobe.exe", "ffprobe"):
+        candidate = Path(ffmpeg).parent / name
+        if candidate.exists():
+            return str(candidate)
+    return shutil.which("ffprobe") or ""
+
+
+def collect_inputs(paths) -> list:
+    out = []
+    for p in paths:
+        if os.path.isdir(p):
+            for root, _, files in os.walk(p):
+                out.extend(os.path.join(root, f) for f in sorted(files) if Path(f).suffix.lower() in SUPPORTED_FORMATS)
+        elif os.path.isfile(p):
+            out.append(p)
+    return out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="编码参数调优（速度 vs 画质）")
+    parser.add_argument("inputs", nargs="+", help="代表性视频文件或目录")
+    parser.add_argument("--samples", type=int, default=6, help="等间隔选取的样本数")
+    parser.add_argument("--segment", type=float, default=SEGMENT_SEC, help="每个样本截取的秒数")
+    parser.add_argument("--presets", default=",".join(DEFAULT_PRESETS))
+    parser.add_argument("--crfs", default=",".join(str(c) for c in DEFAULT_CRFS))
+    parser.add_argument("--min-ssim", type=float, default=DEFAULT_MIN_SSIM, help="画质下限（最差样本的 SSIM）")
+    parser.add_argument("--min-psnr", type=float, default=None)
+    parser.add_argument("--ffmpeg", default="")
+    parser.add_argument("--apply", action="store_true", help="保存推荐结果为当前编码配置")
+    parser.add_argument("--json", default="", help="报告另存为 JSON 文件")
+    args = parser.parse_args()
+
+    presets = [p.strip() for p in args.presets.split(",") if p.strip()]
+    unknown = [p for p in presets if p not in X264_PRESETS]
+    if unknown:
+        parser.error(f"未知预设: {', '.join(unknown)}")
+    crfs = [float(c) if "." in c else int(c) for c in args.crfs.split(",") if c.strip()]
+    ffmpeg = find_ffmpeg(args.ffmpeg)
+    if not ffmpeg:
+        print("未找到 ffmpeg（tools/ffmpeg 或 PATH），可用 --ffmpeg 指定")
+        return 2
+    samples = pick_samples(collect_inputs(args.inputs), args.samples)
+    if not samples:
+        print("没有可用的输入视频")
+        return 2
+
+    print(f"{len(samples)} 个样本 × {len(presets)} 个预设 × {len(crfs)} 个 CRF，当前配置: {load_profile()}")
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="encoder_tune_") as work:
+        for i, path in enumerate(samples, 1):
+            print(f"[{i}/{len(samples)}] {os.path.basename(path)}", flush=True)
+            try:
+                rows.extend(tune_sample(ffmpeg, find_ffprobe(ffmpeg), path, work, presets, crfs, args.segment))
+            except RuntimeError as e:
+                print(f"  跳过: {e}")
+    report = recommend(rows, args.min_ssim, args.min_psnr)
+    if not report["recommended"]:
+        print("没有可用的测量结果")
+        return 1
+
+    print(f"{'preset':10s} {'crf':>4s} {'fps':>8s} {'min_ssim':>9s} {'min_psnr':>9s} {'kbps':>9s}")
+    for c in report["candidates"]:
+        mark = " <-" if c is report["chosen"] else ""
+        print(f"{c['preset']:10s} {c['crf']:>4} {c['fps']:>8} {str(c['min_ssim']):>9s} {str(c['min_psnr']):>9s} "
+              f"{c['kbps']:>9}{mark}")
+    chosen = report["recommended"]
+    print(f"推荐: {chosen['preset']} / CRF {chosen['crf']}"
+          + (f"，相对当前配置 {report['speedup_vs_current']}x" if report.get("speedup_vs_current") else "")
+          + ("" if report["meets_floor"] else "（没有组合达到画质下限，取画质最高的组合）"))
+    if args.apply:
+        if report["meets_floor"]:
+            c = report["chosen"]
+            save_profile({**chosen, "fps": c["fps"], "min_ssim": c["min_ssim"]})
+            print("已保存为当前编码配置")
+        else:
+            print("未达到画质下限，不保存")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
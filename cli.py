@@ -0,0 +1,322 @@
+"""
+渠道视频批量处理工具 - 命令行入口（无界面）
+供定时任务、渲染节点与 CI 使用：只导入 utils 层，不依赖 customtkinter / FastAPI。
+标准输出为 JSON Lines：start、progress（按间隔节流）、result（每个文件一行）、done（汇总）；
+退出码 0 全部成功，1 有文件失败，2 参数错误 / 没有输入 / 找不到 ffmpeg，130 被中断
+
+用法：
+  python cli.py normalize 输入文件或目录 ... -o 输出目录 [--width 1920 --height 1080 --pad-color black] [-j 2]
+  python cli.py watermark 输入文件或目录 ... -o 输出目录 --watermark logo.png [--opacity 1.0 --position center]
+  python cli.py merge 主体视频或目录 ... -o 输出目录 --insert 片头.mp4 [--position head|tail] [--keep-names]
+目录输入中的文件在输出目录下保留相对该目录的子目录结构；多个输入对应同一输出文件时以退出码 2 结束
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+_root = Path(__file__).resolve().parent
+if str(_root / "src") not in sys.path:
+    sys.path.insert(0, str(_root / "src"))
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_INTERRUPTED = 130
+
+RESULT_CACHE_DIR = os.environ.get("CHANNEL_VIDEO_RESULT_CACHE_DIR", str(_root / "cache" / "results"))
+RESULT_CACHE_MAX_GB = float(os.environ.get("CHANNEL_VIDEO_RESULT_CACHE_GB", "50"))
+
+
+class UsageError(Exception):
+    """参数或输入问题，以退出码 2 结束"""
+
+
+class JsonLinesReporter:
+    """线程安全的 JSON Lines 输出；同一文件的进度按 interval 秒节流，0% 与结果总会输出"""
+
+    def __init__(self, stream=None, interval: float = 1.0, progress: bool = True):
+        self.stream = stream or sys.stdout
+        self.interval = interval
+        self.progress_enabled = progress
+        self._lock = threading.Lock()
+        self._last = {}
+        self._done = set()
+
+    def emit(self, event_type: str, **fields) -> None:
+        line = json.dumps({"type": event_type, **fields}, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+    def progress(self, index: int, total: int, path: str, percent: float) -> None:
+        if not self.progress_enabled:
+            return
+        now = time.monotonic()
+        percent = round(percent, 1)
+        with self._lock:
+            last = self._last.get(index)
+            if index in self._done or (last is not None and (
+                percent == last[1] or (percent < 100 and now - last[0] < self.interval)
+            )):
+                return
+            self._last[index] = (now, percent)
+        self.emit("progress", index=index, total=total, input=path, percent=percent)
+
+    def result(self, index: int, path: str, ok: bool, action: str = "", error: str = "") -> None:
+        with self._lock:
+            if index in self._done:
+                return
+            self._done.add(index)
+        self.emit("result", index=index, input=path, ok=ok, action=action, error=error)
+
+
+def collect_inputs(paths, exts, recursive: bool, pattern: str) -> list:
+    """文件原样保留（保持命令行顺序），目录按扩展名与可选 glob 展开"""
+    from utils.video_scanner import expand_input_spec
+    out, seen = [], set()
+    for p in paths:
+        found = expand_input_spec([p], exts, recursive=recursive, pattern=pattern) if os.path.isdir(p) else [p]
+        for f in found:
+            if f not in seen:
+                seen.add(f)
+                out.append(f)
+    return out
+
+
+def input_roots(paths) -> list:
+    """目录输入；其中的文件在输出目录下保留相对该目录的子目录结构"""
+    return [p for p in paths if os.path.isdir(p)]
+
+
+def check_collisions(paths: list, roots: list) -> None:
+    """多个输入会写到同一输出文件时（如分别列出的不同目录下的同名文件）在开始前报错"""
+    from utils.video_scanner import output_collisions
+    collisions = output_collisions(paths, roots)
+    if collisions:
+        rel, same = next(iter(collisions.items()))
+        raise UsageError(f"{len(collisions)} 个输出文件对应多个输入，如 {rel}: {', '.join(same[:3])}")
+
+
+def schedule_inputs(paths: list, order: str, jobs: int, ffmpeg: str, output_size=None) -> list:
+    """多路并行时按编码代价排序派发（与 API 的 schedule 相同）；单路或 fifo 时保持输入顺序"""
+    from utils.makespan import ORDER_FIFO, costs_from_infos, order_tasks
+    if order == ORDER_FIFO or jobs <= 1 or len(paths) < 2:
+        return paths
+    from utils.video_normalizer import VideoNormalizer
+    probe = VideoNormalizer(ffmpeg_path=ffmpeg).get_video_info
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        infos = dict(enumerate(pool.map(probe, paths), 1))
+    tasks = list(enumerate(paths, 1))
+    return [p for _, p in order_tasks(tasks, costs_from_infos(infos, output_size), order)]
+
+
+def resolve_ffmpeg(explicit: str) -> str:
+    from utils.ffmpeg_locator import find_ffmpeg
+    ffmpeg = find_ffmpeg(explicit or None)
+    return ffmpeg if shutil.which(ffmpeg) else ""
+
+
+def get_result_cache(enabled: bool):
+    if not enabled:
+        return None
+    from utils.result_cache import ResultCache
+    return ResultCache(RESULT_CACHE_DIR, max_bytes=int(RESULT_CACHE_MAX_GB * 1024 ** 3))
+
+
+def run_normalize(args, ffmpeg: str, reporter: JsonLinesReporter) -> dict:
+    from utils.video_normalizer import SUPPORTED_FORMATS, VideoNormalizer
+    paths = collect_inputs(args.inputs, SUPPORTED_FORMATS, args.recursive, args.pattern)
+    if not paths:
+        return {}
+    roots = input_roots(args.inputs)
+    check_collisions(paths, roots)
+    target = (args.width, args.height)
+    ordered = schedule_inputs(paths, args.schedule, args.jobs, ffmpeg, target)
+    index_of = {p: i for i, p in enumerate(paths, 1)}
+    reporter.emit("start", op="normalize", files=len(paths), jobs=args.jobs, output_dir=args.output_dir)
+    normalizer = VideoNormalizer(ffmpeg_path=ffmpeg, result_cache=get_result_cache(args.use_cache))
+
+    def progress_cb(curr, n, name, pct, action, err):
+        path = ordered[curr - 1]
+        if action:
+            ok = action != "failed" and not err
+            reporter.result(index_of[path], path, ok, action if ok else "failed", err)
+        else:
+            reporter.progress(index_of[path], n, path, pct)
+
+    results = normalizer.batch_normalize(
+        ordered, args.output_dir, args.width, args.height, args.pad_color, progress_cb,
+        dedupe=not args.no_dedupe, max_workers=args.jobs, input_roots=roots,
+    )
+    return {p: (r[0], r[1], r[2]) for p, r in results.items()}
+
+
+def run_watermark(args, ffmpeg: str, reporter: JsonLinesReporter) -> dict:
+    from utils.video_watermark import VIDEO_EXTS, VideoWatermark
+    paths = collect_inputs(args.inputs, VIDEO_EXTS, args.recursive, args.pattern)
+    if not paths:
+        return {}
+    roots = input_roots(args.inputs)
+    check_collisions(paths, roots)
+    ordered = schedule_inputs(paths, args.schedule, args.jobs, ffmpeg)
+    index_of = {p: i for i, p in enumerate(paths, 1)}
+    reporter.emit("start", op="watermark", files=len(paths), jobs=args.jobs, output_dir=args.output_dir)
+    wm = VideoWatermark(ffmpeg_path=ffmpeg, result_cache=get_result_cache(args.use_cache))
+
+    def progress_cb(curr, n, name, pct, action, err):
+        path = ordered[curr - 1]
+        if action:
+            ok = action != "failed" and not err
+            reporter.result(index_of[path], path, ok, action if ok else "failed", err)
+        else:
+            reporter.progress(index_of[path], n, path, pct)
+
+    results = wm.batch_apply(
+        ordered, args.output_dir, args.watermark, args.opacity, args.position, progress_cb,
+        dedupe=not args.no_dedupe, max_workers=args.jobs, input_roots=roots,
+    )
+    return {p: (ok, action if ok else "failed", err) for p, (ok, action, err) in results.items()}
+
+
+def run_merge(args, ffmpeg: str, reporter: JsonLinesReporter) -> dict:
+    from utils.video_merger import SUPPORTED_FORMATS, VideoMerger
+    paths = collect_inputs(args.inputs, SUPPORTED_FORMATS, args.recursive, args.pattern)
+    if not paths:
+        return {}
+    roots = input_roots(args.inputs)
+    if args.keep_names:
+        check_collisions(paths, roots)
+    reporter.emit("start", op="merge", files=len(paths), jobs=args.jobs, output_dir=args.output_dir)
+    merger = VideoMerger(ffmpeg_path=ffmpeg, result_cache=get_result_cache(args.use_cache))
+
+    def progress_cb(curr, n, name, pct, action, err):
+        path = paths[curr - 1]
+        if action:
+            ok = action != "failed" and not err
+            reporter.result(curr, path, ok, action if ok else "failed", err)
+        else:
+            reporter.progress(curr, n, path, pct)
+
+    results = merger.batch_merge(
+        paths, args.insert, args.output_dir, args.position, progress_cb,
+        max_workers=args.jobs, keep_names=args.keep_names, input_roots=roots,
+    )
+    return {p: (ok, action if ok else "failed", err) for p, (ok, action, err) in results.items()}
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="渠道视频批量处理（命令行，无界面）")
+    sub = parser.add_subparsers(dest="op", required=True)
+
+    def common(p):
+        p.add_argument("inputs", nargs="+", help="输入视频文件或目录")
+        p.add_argument("-o", "--output-dir", required=True)
+        p.add_argument("-j", "--jobs", type=int, default=1, help="同时处理的文件数（每个文件各运行一个 ffmpeg）")
+        p.add_argument("--no-recursive", dest="recursive", action="store_false", help="目录输入不递归子目录")
+        p.add_argument("--pattern", default="", help="目录输入的 glob 过滤，如 *.mp4")
+        p.add_argument("--use-cache", action="store_true", help="启用跨批次结果缓存")
+        p.add_argument("--ffmpeg", default="", help="ffmpeg 路径，默认 tools/ffmpeg 或 PATH")
+        p.add_argument("--progress-interval", type=float, default=1.0, help="同一文件两次进度输出的最小间隔（秒）")
+        p.add_argument("--no-progress", dest="progress", action="store_false", help="不输出 progress 行")
+
+    def schedule(p):
+        from utils.makespan import ORDER_LPT, ORDERS
+        p.add_argument("--no-dedupe", action="store_true", help="不对内容相同的输入去重")
+        p.add_argument("--schedule", choices=ORDERS, default=ORDER_LPT, help="并行时的派发顺序")
+
+    p = sub.add_parser("normalize", help="统一分辨率（保持宽高比并填充）")
+    common(p)
+    schedule(p)
+    p.add_argument("--width", type=int, default=1920)
+    p.add_argument("--height", type=int, default=1080)
+    p.add_argument("--pad-color", default="black")
+
+    p = sub.add_parser("watermark", help="添加静态或动态水印")
+    common(p)
+    schedule(p)
+    p.add_argument("--watermark", required=True, help="水印图片（png / gif 等）")
+    p.add_argument("--opacity", type=float, default=1.0, help="不透明度 0-1")
+    p.add_argument("--position", default="center", help="九宫格位置，如 top_left / center / bottom_right")
+
+    p = sub.add_parser("merge", help="批量添加片头或片尾")
+    common(p)
+    p.add_argument("--insert", required=True, help="插入的片头 / 片尾视频")
+    p.add_argument("--position", choices=("head", "tail"), default="head")
+    p.add_argument("--keep-names", action="store_true", help="输出沿用主体视频文件名（默认按序号命名）")
+    return parser
+
+
+def validate(args) -> str:
+    missing = [p for p in args.inputs if not os.path.exists(p)]
+    if missing:
+        return f"输入不存在: {', '.join(missing)}"
+    if args.jobs < 1:
+        return "--jobs 须为正整数"
+    if args.op == "normalize" and (args.width <= 0 or args.height <= 0):
+        return "宽度和高度必须大于 0"
+    if args.op == "watermark":
+        from utils.video_watermark import POSITION_OVERLAY
+        if not os.path.isfile(args.watermark):
+            return f"水印图片不存在: {args.watermark}"
+        if not 0 < args.opacity <= 1:
+            return "--opacity 须在 0-1 之间"
+        if args.position not in POSITION_OVERLAY:
+            return f"--position 须为 {' / '.join(POSITION_OVERLAY)}"
+    if args.op == "merge" and not os.path.isfile(args.insert):
+        return f"插入视频不存在: {args.insert}"
+    return ""
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    stdout = sys.stdout
+    reporter = JsonLinesReporter(stream=stdout, interval=args.progress_interval, progress=args.progress)
+    # 标准输出只留给事件行：处理器或依赖库的 print 改到标准错误
+    sys.stdout = sys.stderr
+    try:
+        return run(args, reporter)
+    finally:
+        sys.stdout = stdout
+
+
+def run(args, reporter: JsonLinesReporter) -> int:
+    err = validate(args)
+    ffmpeg = resolve_ffmpeg(args.ffmpeg) if not err else ""
+    if not err and not ffmpeg:
+        err = "未找到 ffmpeg（tools/ffmpeg 或 PATH），可用 --ffmpeg 或环境变量 CHANNEL_VIDEO_FFMPEG_PATH 指定"
+    if err:
+        reporter.emit("error", error=err)
+        return EXIT_USAGE
+    runner = {"normalize": run_normalize, "watermark": run_watermark, "merge": run_merge}[args.op]
+    start = time.perf_counter()
+    try:
+        results = runner(args, ffmpeg, reporter)
+    except UsageError as e:
+        reporter.emit("error", error=str(e))
+        return EXIT_USAGE
+    except KeyboardInterrupt:
+        reporter.emit("interrupted", elapsed_sec=round(time.perf_counter() - start, 2))
+        return EXIT_INTERRUPTED
+    if not results:
+        reporter.emit("error", error="没有可处理的输入视频")
+        return EXIT_USAGE
+    failed = [p for p, (ok, _, _) in results.items() if not ok]
+    actions = {}
+    for ok, action, _ in results.values():
+        if ok:
+            actions[action] = actions.get(action, 0) + 1
+    reporter.emit(
+        "done", op=args.op, ok=len(results) - len(failed), failed=len(failed), actions=actions,
+        failed_inputs=failed, elapsed_sec=round(time.perf_counter() - start, 2),
+    )
+    return EXIT_FAILED if failed else EXIT_OK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,6 +9,72 @@ function wrapNetworkError(e) {
   return e
 }
 
+/**
+ * 逐条解析 SSE 响应体（data: JSON），回调每个事件，收到 done 事件时返回该事件
+ * @param {Response} r
+ * @param {(ev: object) => void} onEvent
+ */
+async function readEventStream(r, onEvent) {
+  const reader = r.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    const parts = buffer.split('\n\n')
+    buffer = parts.pop() || ''
+    for (const part of parts) {
+      const line = part.split('\n').find(l => l.startsWith('data:'))
+      if (!line) continue
+      try {
+        const data = JSON.parse(line.slice(5).trim())
+        onEvent(data)
+        if (data.type === 'done') return data
+      } catch (_) {}
+    }
+  }
+  return null
+}
+
+/**
+ * 逐行解析 NDJSON 响应体，回调每条记录
+ * @param {Response} r
+ * @param {(rec: object) => void} onRecord
+ */
+async function readNdjson(r, onRecord) {
+  const reader = r.body.getReader()
+  const decoder = new TextDecoder()
+  let buffer = ''
+  while (true) {
+    const { value, done } = await reader.read()
+    if (done) break
+    buffer += decoder.decode(value, { stream: true })
+    const lines = buffer.split('\n')
+    buffer = lines.pop() || ''
+    for (const line of lines) {
+      if (!line.trim()) continue
+      try {
+        onRecord(JSON.parse(line))
+      } catch (_) {}
+    }
+  }
+}
+
+/**
+ * 读取任务结果 NDJSON：result 记录回调 onResult，返回最后的 done 汇总
+ * @param {Response} r
+ * @param {(rec: object) => void} [onResult]
+ */
+async function readJobResults(r, onResult) {
+  let done = null
+  await readNdjson(r, (rec) => {
+    if (rec.type === 'result') onResult?.(rec)
+    else if (rec.type === 'done') done = rec
+  })
+  return done
+}
+
 export async function getTheme() {
   try {
     const r = await fetch(`${API_BASE}/api/theme`)
@@ -33,7 +99,12 @@ export async function setTheme(mode) {
   }
 }
 
-export async function normalize(body) {
+/**
+ * 同步执行批处理：逐文件结果以 NDJSON 返回，通过 onResult 回调，最后返回 done 汇总（仅计数）
+ * @param {object} body
+ * @param {(rec: { path: string, ok: boolean, action: string, error: string }) => void} [onResult]
+ */
+export async function normalize(body, onResult) {
   try {
     const r = await fetch(`${API_BASE}/api/normalize`, {
       method: 'POST',
@@ -41,13 +112,13 @@ export async function normalize(body) {
       body: JSON.stringify(body),
     })
     if (!r.ok) throw new Error(await r.text())
-    return r.json()
+    return readJobResults(r, onResult)
   } catch (e) {
     throw wrapNetworkError(e)
   }
 }
 
-export async function watermark(body) {
+export async function watermark(body, onResult) {
   try {
     const r = await fetch(`${API_BASE}/api/watermark`, {
       method: 'POST',
@@ -55,81 +126,288 @@ export async function watermark(body) {
       body: JSON.stringify(body),
     })
     if (!r.ok) throw new Error(await r.text())
-    return r.json()
+    return readJobResults(r, onResult)
+  } catch (e) {
+    throw wrapNetworkError(e)
+  }
+}
+
+const JOB_SOCKET_URL = API_BASE.replace(/^http/, 'ws') + '/api/ws/jobs'
+const JOB_SOCKET_RETRY_MS = 1000
+const JOB_SOCKET_RETRY_MAX_MS = 10000
+const JOB_SOCKET_MAX_RETRIES = 8
+
+/** job_id -> { onEvent, resolve, reject } */
+const jobWatchers = new Map()
+let jobSocket = null
+let jobSocketOpen = null
+let jobSocketRetries = 0
+
+/**
+ * 解码服务端紧凑帧 [类型, job_id, 数据] 为与 SSE 一致的事件对象
+ * @param {Array} frame
+ */
+function decodeJobFrame([t, jobId, data, file, eta]) {
+  if (t === 'p') return { type: 'progress', job_id: jobId, value: data, file: file ?? undefined, eta_sec: eta }
+  if (t === 'l') return { type: 'logs', job_id: jobId, msgs: data }
+  if (t === 'r') {
+    const items = data.map(([path, ok, action, error]) => ({ path, ok, action, error }))
+    return { type: 'results', job_id: jobId, items }
+  }
+  if (t === 'd') return { type: 'done', job_id: jobId, ...data }
+  if (t === 'j') return { type: 'job', job_id: jobId, ...data }
+  return { type: t, job_id: jobId, ...data }
+}
+
+/**
+ * 仍有在观察的任务时按指数退避重连；连续失败 JOB_SOCKET_MAX_RETRIES 次后以连接错误结束这些观察，
+ * 调用方可改用其他方式获取结果
+ */
+function scheduleJobSocketRetry() {
+  if (!jobWatchers.size) return
+  if (jobSocketRetries >= JOB_SOCKET_MAX_RETRIES) {
+    jobSocketRetries = 0
+    const err = new Error(API_CONNECT_MSG)
+    for (const watcher of jobWatchers.values()) watcher.reject(err)
+    jobWatchers.clear()
+    return
+  }
+  const delay = Math.min(JOB_SOCKET_RETRY_MS * 2 ** jobSocketRetries, JOB_SOCKET_RETRY_MAX_MS)
+  jobSocketRetries += 1
+  setTimeout(() => connectJobSocket().catch(() => {}), delay)
+}
+
+/**
+ * 建立（或复用）唯一的任务事件 WebSocket；断开或重连失败后若仍有在观察的任务则继续重连并重新订阅
+ * @returns {Promise<WebSocket>}
+ */
+function connectJobSocket() {
+  if (jobSocketOpen) return jobSocketOpen
+  jobSocketOpen = new Promise((resolve, reject) => {
+    const ws = new WebSocket(JOB_SOCKET_URL)
+    ws.onopen = () => {
+      jobSocket = ws
+      jobSocketRetries = 0
+      if (jobWatchers.size) ws.send(JSON.stringify({ watch: [...jobWatchers.keys()] }))
+      resolve(ws)
+    }
+    ws.onmessage = (msg) => {
+      let frames
+      try {
+        frames = JSON.parse(msg.data)
+      } catch (_) {
+        return
+      }
+      for (const frame of frames) {
+        const ev = decodeJobFrame(frame)
+        const watcher = jobWatchers.get(ev.job_id)
+        if (!watcher) continue
+        watcher.onEvent(ev)
+        if (ev.type === 'done' || ev.type === 'missing') {
+          jobWatchers.delete(ev.job_id)
+          watcher.resolve(ev.type === 'done' ? ev : null)
+        }
+      }
+    }
+    ws.onclose = () => {
+      const wasOpen = jobSocket === ws
+      jobSocket = null
+      jobSocketOpen = null
+      if (!wasOpen) reject(new Error(API_CONNECT_MSG))
+      scheduleJobSocketRetry()
+    }
+  })
+  return jobSocketOpen
+}
+
+/**
+ * 通过共享 WebSocket 观察任务，实时回调 logs / progress / job 事件，任务结束时返回 done 事件
+ * @param {string} jobId
+ * @param {(ev: object) => void} onEvent
+ */
+export async function watchJob(jobId, onEvent) {
+  const ws = await connectJobSocket()
+  return new Promise((resolve, reject) => {
+    jobWatchers.set(jobId, { onEvent, resolve, reject })
+    ws.send(JSON.stringify({ watch: [jobId] }))
+  })
+}
+
+/**
+ * 提交批处理任务，返回 job_id
+ * @param {'normalize'|'watermark'|'merge'|'tune'} op
+ * @param {object} body
+ */
+export async function submitJob(op, body) {
+  const r = await fetch(`${API_BASE}/api/jobs/${op}`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify(body),
+  })
+  if (!r.ok) throw new Error(await r.text())
+  return (await r.json()).job_id
+}
+
+/**
+ * 暂停 / 继续整批任务（运行中的 ffmpeg 被挂起而非终止）
+ * @param {string} jobId
+ * @param {'pause'|'resume'} action
+ */
+async function controlJob(jobId, action) {
+  try {
+    const r = await fetch(`${API_BASE}/api/jobs/${jobId}/${action}`, { method: 'POST' })
+    if (!r.ok) throw new Error(await r.text())
   } catch (e) {
     throw wrapNetworkError(e)
   }
 }
 
+export const pauseJob = (jobId) => controlJob(jobId, 'pause')
+export const resumeJob = (jobId) => controlJob(jobId, 'resume')
+
+/** 任务时间线下载地址（提交时 body.trace 为 true 才会记录；Chrome trace JSON） */
+export const jobTraceUrl = (jobId) => `${API_BASE}/api/jobs/${jobId}/trace`
+
 /**
- * 流式调用 normalize，通过 onEvent 实时接收 log / progress / done
- * @param {object} body - 同 normalize
- * @param {(ev: { type: 'log'|'progress'|'done', msg?: string, value?: number, ok?: boolean, ok_count?: number, fail_count?: number, results?: object }) => void} onEvent
+ * 提交 normalize 任务并通过共享 WebSocket 实时接收 logs / progress / results / done
+ * @param {{ input_paths: string[], output_dir: string, target_width: number, target_height: number, pad_color: string }} body
+ * @param {(ev: { type: 'logs'|'progress'|'results'|'job'|'done', msgs?: string[], value?: number, eta_sec?: number, items?: { path: string, ok: boolean, action: string, error: string }[], ok?: boolean, ok_count?: number, fail_count?: number }) => void} onEvent
  */
 export async function normalizeStream(body, onEvent) {
   try {
-    const r = await fetch(`${API_BASE}/api/normalize/stream`, {
+    return await watchJob(await submitJob('normalize', body), onEvent)
+  } catch (e) {
+    throw wrapNetworkError(e)
+  }
+}
+
+/**
+ * 提交 watermark 任务并通过共享 WebSocket 实时接收 logs / progress / results / done
+ */
+export async function watermarkStream(body, onEvent) {
+  try {
+    return await watchJob(await submitJob('watermark', body), onEvent)
+  } catch (e) {
+    throw wrapNetworkError(e)
+  }
+}
+
+/**
+ * 按本机历史吞吐预估一批文件的耗时（秒），返回 { files, media_sec, encode_sec, parallelism, wall_sec, copy_files, unknown_files, ... }
+ * @param {{ op: 'normalize'|'watermark'|'merge', input_paths: string[], target_width?: number, target_height?: number, insert_video?: string }} body
+ */
+export async function estimateBatch(body) {
+  try {
+    const r = await fetch(`${API_BASE}/api/estimate`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify(body),
     })
     if (!r.ok) throw new Error(await r.text())
-    const reader = r.body.getReader()
-    const decoder = new TextDecoder()
-    let buffer = ''
-    while (true) {
-      const { value, done } = await reader.read()
-      if (done) break
-      buffer += decoder.decode(value, { stream: true })
-      const parts = buffer.split('\n\n')
-      buffer = parts.pop() || ''
-      for (const part of parts) {
-        const line = part.split('\n').find(l => l.startsWith('data:'))
-        if (!line) continue
-        try {
-          const data = JSON.parse(line.slice(5).trim())
-          onEvent(data)
-          if (data.type === 'done') return data
-        } catch (_) {}
-      }
-    }
-    return null
+    return await r.json()
   } catch (e) {
     throw wrapNetworkError(e)
   }
 }
 
 /**
- * 流式调用 watermark，通过 onEvent 实时接收 log / progress / done
+ * 提交编码参数调优任务（样本 × 预设 × CRF 测量帧率与 SSIM / PSNR），tune 事件携带报告
+ * @param {{ input_paths: string[], samples?: number, presets?: string[], crfs?: number[], min_ssim?: number, min_psnr?: number, apply?: boolean }} body
  */
-export async function watermarkStream(body, onEvent) {
+export async function tuneEncoderStream(body, onEvent) {
+  try {
+    return await watchJob(await submitJob('tune', body), onEvent)
+  } catch (e) {
+    throw wrapNetworkError(e)
+  }
+}
+
+/** 当前编码配置（preset / crf）及最近一次调优报告 */
+export async function getEncoderProfile() {
+  try {
+    const r = await fetch(`${API_BASE}/api/encoder/profile`)
+    return await r.json()
+  } catch (e) {
+    throw wrapNetworkError(e)
+  }
+}
+
+/**
+ * 手动设置编码配置
+ * @param {{ preset: string, crf?: number|null }} profile
+ */
+export async function setEncoderProfile(profile) {
   try {
-    const r = await fetch(`${API_BASE}/api/watermark/stream`, {
+    const r = await fetch(`${API_BASE}/api/encoder/profile`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(profile),
+    })
+    if (!r.ok) throw new Error(await r.text())
+    return (await r.json()).profile
+  } catch (e) {
+    throw wrapNetworkError(e)
+  }
+}
+
+/**
+ * 单帧水印预览，返回图片 Blob
+ * @param {{ video_path: string, watermark_path: string, opacity: number, position: string, timestamp?: number, max_width?: number }} body
+ * @param {AbortSignal} [signal] - 用于取消过期的预览请求
+ */
+export async function watermarkPreview(body, signal) {
+  try {
+    const r = await fetch(`${API_BASE}/api/watermark/preview`, {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
       body: JSON.stringify(body),
+      signal,
     })
     if (!r.ok) throw new Error(await r.text())
-    const reader = r.body.getReader()
-    const decoder = new TextDecoder()
-    let buffer = ''
-    while (true) {
-      const { value, done } = await reader.read()
-      if (done) break
-      buffer += decoder.decode(value, { stream: true })
-      const parts = buffer.split('\n\n')
-      buffer = parts.pop() || ''
-      for (const part of parts) {
-        const line = part.split('\n').find(l => l.startsWith('data:'))
-        if (!line) continue
-        try {
-          const data = JSON.parse(line.slice(5).trim())
-          onEvent(data)
-          if (data.type === 'done') return data
-        } catch (_) {}
-      }
-    }
-    return null
+    return r.blob()
+  } catch (e) {
+    throw wrapNetworkError(e)
+  }
+}
+
+/**
+ * 流式获取缩略图，每生成一张通过 onEvent 推送 { type: 'thumb', path, ok, key, error }
+ * @param {string[]} paths
+ * @param {(ev: object) => void} onEvent
+ */
+export async function thumbnailsStream(paths, onEvent) {
+  try {
+    const r = await fetch(`${API_BASE}/api/thumbnails/stream`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ paths }),
+    })
+    if (!r.ok) throw new Error(await r.text())
+    return readEventStream(r, onEvent)
+  } catch (e) {
+    throw wrapNetworkError(e)
+  }
+}
+
+/** 缩略图缓存键对应的图片地址 */
+export function thumbnailUrl(key) {
+  return `${API_BASE}/api/thumbnails/${key}`
+}
+
+/**
+ * 递归扫描目录，逐条回调 { type: 'file', path, size, mtime } 与最终的 { type: 'done', count }
+ * @param {{ roots: string[], recursive?: boolean, pattern?: string, probe?: boolean }} body
+ * @param {(rec: object) => void} onRecord
+ */
+export async function scanStream(body, onRecord) {
+  try {
+    const r = await fetch(`${API_BASE}/api/scan`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify(body),
+    })
+    if (!r.ok) throw new Error(await r.text())
+    await readNdjson(r, onRecord)
   } catch (e) {
     throw wrapNetworkError(e)
   }
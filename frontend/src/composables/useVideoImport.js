@@ -4,6 +4,10 @@
  */
 import { ref, computed } from 'vue'
 import { openFiles, openDir, listVideoFilesInDir } from '../dialog'
+import { scanStream, thumbnailsStream, thumbnailUrl } from '../api'
+
+/** 文件夹扫描结果分批追加到列表的条数，避免逐条触发渲染 */
+const SCAN_APPEND_BATCH = 200
 
 const STATUS_MAP = { pending: '待处理', processing: '处理中', success: '成功', fail: '失败' }
 
@@ -21,6 +25,8 @@ export function useVideoImport(options = {}) {
   const dropActive = ref(false)
 
   const inputPaths = computed(() => videoList.value.map(i => i.path))
+  /** 路径 -> 缩略图地址，随后端逐张生成逐步填充 */
+  const thumbnails = ref({})
 
   function openVideoDialog() {
     videoDialogOpen.value = true
@@ -30,24 +36,37 @@ export function useVideoImport(options = {}) {
     videoDialogOpen.value = false
   }
 
+  /** 后台流式加载缩略图，失败不影响导入 */
+  function loadThumbnails(paths) {
+    const missing = paths.filter(p => !thumbnails.value[p])
+    if (!missing.length) return
+    thumbnailsStream(missing, (ev) => {
+      if (ev.type === 'thumb' && ev.ok) thumbnails.value[ev.path] = thumbnailUrl(ev.key)
+    }).catch(() => {})
+  }
+
   function appendPaths(newPaths) {
     if (maxItems === 1) {
       if (newPaths.length) {
         videoList.value = [{ path: newPaths[0], status: 'pending' }]
         onLog(`已选择主体视频`)
+        loadThumbnails(newPaths.slice(0, 1))
       }
       return
     }
     const set = new Set(videoList.value.map(i => i.path))
+    const added = []
     for (const p of newPaths) {
       if (!set.has(p)) {
         set.add(p)
+        added.push(p)
         videoList.value.push({ path: p, status: 'pending' })
       }
     }
     if (newPaths.length) {
       onLog(`已添加 ${newPaths.length} 个文件，当前共 ${videoList.value.length} 个`)
     }
+    loadThumbnails(added)
   }
 
   async function pickInputFiles() {
@@ -55,13 +74,39 @@ export function useVideoImport(options = {}) {
     if (paths?.length) appendPaths(paths)
   }
 
+  /** 通过后端递归扫描文件夹，边扫描边追加；后端不可用时返回 null */
+  async function scanFolder(dir) {
+    let pending = []
+    let count = 0
+    const flush = () => {
+      if (pending.length) appendPaths(pending)
+      pending = []
+    }
+    try {
+      await scanStream({ roots: [dir], recursive: true }, (rec) => {
+        if (rec.type !== 'file') return
+        count++
+        pending.push(rec.path)
+        if (pending.length >= SCAN_APPEND_BATCH) flush()
+      })
+    } catch {
+      if (!count) return null
+    }
+    flush()
+    return count
+  }
+
   async function pickInputFolder() {
     const dir = await openDir()
     if (!dir) return
-    const paths = await listVideoFilesInDir(dir)
-    if (paths?.length) {
-      appendPaths(paths)
-      onLog(`已添加文件夹内 ${paths.length} 个视频，当前共 ${videoList.value.length} 个`)
+    let count = await scanFolder(dir)
+    if (count === null) {
+      const paths = await listVideoFilesInDir(dir)
+      count = paths?.length || 0
+      if (count) appendPaths(paths)
+    }
+    if (count) {
+      onLog(`已添加文件夹内 ${count} 个视频，当前共 ${videoList.value.length} 个`)
     } else {
       onLog('该文件夹内没有视频文件')
     }
@@ -108,6 +153,7 @@ export function useVideoImport(options = {}) {
   return {
     videoList,
     inputPaths,
+    thumbnails,
     videoDialogOpen,
     openVideoDialog,
     closeVideoDialog,
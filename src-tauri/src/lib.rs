@@ -1,5 +1,15 @@
+use std::io::{Read, Write};
+use std::net::{SocketAddr, TcpStream};
 use std::path::{Path, PathBuf};
 use std::process::{Child, Command, Stdio};
+use std::time::{Duration, Instant};
+
+use tauri::Manager;
+
+/// 后端地址，与 api/main.py 的 API_PORT 一致
+const API_ADDR: &str = "127.0.0.1:8765";
+/// 等待后端就绪的最长时间，超时后仍显示窗口（由前端提示连接失败）
+const API_READY_TIMEOUT: Duration = Duration::from_secs(30);
 
 /// 视频文件扩展名（小写）
 const VIDEO_EXT: &[&str] = &["mp4", "mkv", "avi", "mov", "wmv", "flv", "webm"];
@@ -52,6 +62,39 @@ fn start_python_api() -> Option<Child> {
     Some(child)
 }
 
+/// 请求一次 /api/ready，后端完成启动预热（定位 ffmpeg、加载处理器）后返回 200
+fn api_ready() -> bool {
+    let addr: SocketAddr = match API_ADDR.parse() {
+        Ok(a) => a,
+        Err(_) => return false,
+    };
+    let mut stream = match TcpStream::connect_timeout(&addr, Duration::from_millis(500)) {
+        Ok(s) => s,
+        Err(_) => return false,
+    };
+    let _ = stream.set_read_timeout(Some(Duration::from_secs(2)));
+    let req = format!("GET /api/ready HTTP/1.1\r\nHost: {}\r\nConnection: close\r\n\r\n", API_ADDR);
+    if stream.write_all(req.as_bytes()).is_err() {
+        return false;
+    }
+    let mut head = Vec::new();
+    let _ = stream.take(64).read_to_end(&mut head);
+    // 状态行形如 "HTTP/1.1 200 OK"
+    String::from_utf8_lossy(&head).split_whitespace().nth(1) == Some("200")
+}
+
+/// 轮询 /api/ready 直到后端就绪或超时，避免窗口先于后端加载而首批请求失败
+fn wait_api_ready(timeout: Duration) -> bool {
+    let deadline = Instant::now() + timeout;
+    while Instant::now() < deadline {
+        if api_ready() {
+            return true;
+        }
+        std::thread::sleep(Duration::from_millis(100));
+    }
+    false
+}
+
 /// 优先使用项目根目录下的 venv，其次环境变量 PYTHON，最后系统 python
 fn which_python(root: &Path) -> PathBuf {
     if let Ok(p) = std::env::var("PYTHON") {
@@ -79,7 +122,17 @@ pub fn run() {
         .plugin(tauri_plugin_shell::init())
         .plugin(tauri_plugin_dialog::init())
         .invoke_handler(tauri::generate_handler![list_video_files_in_dir])
-        .setup(|_app| {
+        .setup(|app| {
+            // 主窗口初始隐藏，后端就绪（或超时）后再显示
+            let window = app.get_webview_window("main");
+            std::thread::spawn(move || {
+                if !wait_api_ready(API_READY_TIMEOUT) {
+                    eprintln!("Python API not ready within {:?}", API_READY_TIMEOUT);
+                }
+                if let Some(w) = window {
+                    let _ = w.show();
+                }
+            });
             Ok(())
         })
         .run(tauri::generate_context!())
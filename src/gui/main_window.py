@@ -12,8 +12,9 @@ import tkinter as tk
 class ChannelVideoToolsGUI:
     """渠道视频批量处理工具主窗口"""
 
-    def __init__(self, config_dir: str):
+    def __init__(self, config_dir: str, lazy_tabs: bool = True):
         self.config_dir = config_dir
+        self.lazy_tabs = lazy_tabs
         self.root = ctk.CTk()
         self.root.title("渠道视频批量处理工具")
         self.root.geometry("820x520")
@@ -97,15 +98,21 @@ class ChannelVideoToolsGUI:
             height=460,
             corner_radius=15,
             border_width=2,
+            command=self._on_tab_selected,
         )
         self.tabview.pack(fill="both", expand=True, padx=10, pady=(0, 10))
         self.tabview.add("视频规范")
         self.tabview.add("视频水印")
         self.tabview.add("视频合并")
         self._ensure_src_in_path()
-        self.create_normalizer_tab()
-        self.create_watermark_tab()
-        self.create_merge_tab()
+        # 标签页（及其处理模块的导入）在首次选中时才创建，启动时只创建当前显示的一页
+        self._tab_builders = {
+            "视频规范": self.create_normalizer_tab,
+            "视频水印": self.create_watermark_tab,
+            "视频合并": self.create_merge_tab,
+        }
+        for name in ([self.tabview.get()] if self.lazy_tabs else list(self._tab_builders)):
+            self._build_tab(name)
         self._sun_ctk, self._moon_ctk = self._get_theme_icons()
         current_mode = ctk.get_appearance_mode()
         initial_image = self._sun_ctk if current_mode == "Dark" else self._moon_ctk
@@ -149,6 +156,14 @@ class ChannelVideoToolsGUI:
         if src_dir not in sys.path:
             sys.path.insert(0, src_dir)
 
+    def _build_tab(self, name: str):
+        builder = self._tab_builders.pop(name, None)
+        if builder is not None:
+            builder()
+
+    def _on_tab_selected(self):
+        self._build_tab(self.tabview.get())
+
     def create_normalizer_tab(self):
         frame = self.tabview.tab("视频规范")
         try:
@@ -10,6 +10,8 @@ import os
 import threading
 from pathlib import Path
 
+from gui.ui_events import UIEventPump
+
 
 class MergeTab:
     """视频合并标签页"""
@@ -71,6 +73,7 @@ class MergeTab:
 
         self._create_progress_section()
         self._create_log_button_section()
+        self.events = UIEventPump(self.root, self.log_text, self.progress_var, "merge", self.log_callback)
         self._log("视频合并工具已就绪")
     
     def _create_main_videos_section(self, parent):
@@ -267,13 +270,8 @@ class MergeTab:
         self.reset_button.pack()
     
     def _log(self, message: str):
-        """添加日志"""
-        from datetime import datetime
-        timestamp = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert("end", f"[{timestamp}] {message}\n")
-        self.log_text.see("end")
-        if self.log_callback:
-            self.log_callback(message)
+        """添加日志（任意线程均可调用，由主线程定时写入）"""
+        self.events.log(message)
     
     def _select_main_videos(self):
         """选择主体视频文件"""
@@ -391,15 +389,13 @@ class MergeTab:
             self._log(f"开始处理 {len(self.main_videos)} 个视频")
             self._log(f"插入位置: {position_text}")
             
-            def progress_cb(curr, total, name, prog, err):
-                self.progress_var.set(((curr - 1) * 100 + prog) / total)
+            def progress_cb(curr, total, name, prog, act, err):
+                self.events.progress(((curr - 1) * 100 + prog) / total)
+                # 进行中的百分比只体现在进度条上，日志只记录每个文件的结果
                 if err:
-                    msg = f"[{curr}/{total}] {name} - 失败 (错误: {err[:50]})"
-                elif prog >= 100:
-                    msg = f"[{curr}/{total}] {name} - 完成"
-                else:
-                    msg = f"[{curr}/{total}] {name} - 处理中 ({prog:.1f}%)"
-                self._log(msg)
+                    self._log(f"[{curr}/{total}] {name} - 失败 (错误: {err[:50]})")
+                elif act:
+                    self._log(f"[{curr}/{total}] {name} - " + ("命中缓存" if act == "cached" else "完成"))
             
             # 根据勾选状态决定输出命名规则
             if keep_original_name:
@@ -415,9 +411,9 @@ class MergeTab:
                     def file_progress(percent, curr_idx=idx, total_count=total, name=filename):
                         if percent is None:
                             return
-                        progress_cb(curr_idx, total_count, name, percent, "")
+                        progress_cb(curr_idx, total_count, name, percent, "", "")
 
-                    success, error = merger.merge_videos(
+                    success, action, error = merger.merge_videos(
                         main_video,
                         self.insert_video,
                         output_path,
@@ -427,9 +423,9 @@ class MergeTab:
 
                     # 统一使用进度回调输出最终状态
                     error_msg = error if not success else ""
-                    progress_cb(idx, total, filename, 100.0, error_msg)
+                    progress_cb(idx, total, filename, 100.0, action, error_msg)
 
-                    results[main_video] = (success, error)
+                    results[main_video] = (success, action, error)
             else:
                 # 默认行为：按序号命名输出文件
                 results = merger.batch_merge(
@@ -444,17 +440,17 @@ class MergeTab:
             
         except Exception as e:
             self._log(f"出错: {e}")
-            messagebox.showerror("错误", f"处理出错:\n{e}")
+            self.events.call(messagebox.showerror, "错误", f"处理出错:\n{e}")
         finally:
             self.is_processing = False
-            self.root.after(0, lambda: self.start_button.configure(state="normal"))
+            self.events.call(self.start_button.configure, state="normal")
     
     def _handle_merge_results(self, results: dict):
         """处理合并结果"""
-        success_count = sum(1 for success, _ in results.values() if success)
+        success_count = sum(1 for success, _, _ in results.values() if success)
         failed_count = len(results) - success_count
         failed_files = [
-            (os.path.basename(k), e) for k, (s, e) in results.items() if not s
+            (os.path.basename(k), e) for k, (s, _, e) in results.items() if not s
         ]
         
         self._log(f"完成! 成功: {success_count}, 失败: {failed_count}")
@@ -463,8 +459,9 @@ class MergeTab:
             for fname, err in failed_files:
                 self._log(f"  - {fname}: {err[:100] if err else '未知错误'}")
         
-        self.progress_var.set(100)
-        messagebox.showinfo(
+        self.events.progress(100)
+        self.events.call(
+            messagebox.showinfo,
             "完成",
             f"处理完成!\n\n成功: {success_count}\n失败: {failed_count}"
         )
@@ -492,7 +489,7 @@ class MergeTab:
         self.progress_var.set(0.0)
         
         # 清空日志
-        self.log_text.delete("1.0", "end")
+        self.events.clear()
         
         # 记录重置操作
         self._log("已重置所有设置")
@@ -10,6 +10,8 @@ from typing import Optional, Callable
 import customtkinter as ctk
 import tkinter as tk
 
+from gui.ui_events import UIEventPump
+
 
 class NormalizerTab:
     """视频规范标签页"""
@@ -25,17 +27,21 @@ class NormalizerTab:
         self.log_callback = log_callback
         self.input_files = []
         self.is_processing = False
+        self.normalizer = None
+        self._create_ui()
+        # 处理模块（连带 asyncio 等）在窗口首次绘制后再导入，不计入启动时间；加载完成前按钮不可用
+        self.root.after_idle(self._load_normalizer)
+
+    def _load_normalizer(self):
         try:
             from utils.video_normalizer import VideoNormalizer
             self.normalizer = VideoNormalizer()
-        except ImportError as e:
-            self.normalizer = None
-            ctk.CTkLabel(
-                parent, text=f"视频规范工具初始化失败: {e}",
-                font=ctk.CTkFont(size=12), text_color="red"
-            ).pack(pady=20)
+        except Exception as e:
+            self._log(f"视频规范工具初始化失败: {e}")
+            messagebox.showerror("错误", f"视频规范工具初始化失败，无法使用该功能：\n{e}")
             return
-        self._create_ui()
+        self.select_btn.configure(state="normal")
+        self.start_btn.configure(state="normal")
         self._log("视频规范工具已就绪")
         if self.normalizer.has_ffprobe:
             self._log("支持详细进度显示")
@@ -52,7 +58,8 @@ class NormalizerTab:
         btn_f.pack(fill="x", padx=10, pady=5)
         self.file_count_label = ctk.CTkLabel(btn_f, text="已选择: 0 个文件")
         self.file_count_label.pack(side="left", padx=10)
-        ctk.CTkButton(btn_f, text="选择视频", command=self._select_videos, width=120).pack(side="left", padx=5)
+        self.select_btn = ctk.CTkButton(btn_f, text="选择视频", command=self._select_videos, width=120, state="disabled")
+        self.select_btn.pack(side="left", padx=5)
         right_f = ctk.CTkFrame(top, fg_color="transparent")
         right_f.pack(side="left", fill="both", expand=True, padx=(5, 0))
         ctk.CTkLabel(right_f, text="输出设置:", font=ctk.CTkFont(weight="bold")).pack(anchor="w", padx=10, pady=5)
@@ -86,22 +93,20 @@ class NormalizerTab:
         ctk.CTkLabel(log_f, text="处理日志:", font=ctk.CTkFont(weight="bold")).pack(anchor="w", padx=10, pady=5)
         self.log_text = ctk.CTkTextbox(log_f, height=180, width=500)
         self.log_text.pack(fill="both", expand=True, padx=10, pady=5)
+        self.events = UIEventPump(self.root, self.log_text, self.progress_var, "normalizer", self.log_callback)
         btn_f2 = ctk.CTkFrame(log_btn_f, fg_color="transparent")
         btn_f2.pack(side="right", fill="y")
         ctk.CTkFrame(btn_f2, fg_color="transparent", height=45).pack(fill="x")
-        self.start_btn = ctk.CTkButton(btn_f2, text="开始处理", command=self._start, width=150, height=45, font=ctk.CTkFont(size=14, weight="bold"))
+        self.start_btn = ctk.CTkButton(btn_f2, text="开始处理", command=self._start, width=150, height=45, font=ctk.CTkFont(size=14, weight="bold"), state="disabled")
         self.start_btn.pack(pady=(0, 10))
         ctk.CTkButton(btn_f2, text="重置", command=self._reset, width=150, height=45, font=ctk.CTkFont(size=14, weight="bold"), fg_color="gray", hover_color="darkgray").pack()
 
     def _log(self, msg: str):
-        from datetime import datetime
-        ts = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert("end", f"[{ts}] {msg}\n")
-        self.log_text.see("end")
-        if self.log_callback:
-            self.log_callback(msg)
+        self.events.log(msg)
 
     def _select_videos(self):
+        if self.normalizer is None:
+            return
         choice = messagebox.askquestion("选择方式", "选择文件夹还是文件？\n\n\"是\" - 文件夹\n\"否\" - 文件", icon="question")
         if choice == "yes":
             folder = filedialog.askdirectory(title="选择包含视频的文件夹")
@@ -162,9 +167,9 @@ class NormalizerTab:
             self._log(f"目标尺寸: {w}x{h}")
 
             def progress_cb(curr, n, name, prog, act, err):
-                self.progress_var.set(((curr - 1) * 100 + prog) / n)
+                self.events.progress(((curr - 1) * 100 + prog) / n)
                 if act:
-                    msg = f"[{curr}/{n}] {name} - " + {"copied": "已复制", "processed": "已转换", "failed": "失败"}.get(act, "处理中")
+                    msg = f"[{curr}/{n}] {name} - " + {"copied": "已复制", "processed": "已转换", "duplicate": "重复文件，已复用输出", "cached": "命中缓存", "failed": "失败"}.get(act, "处理中")
                     if err:
                         msg += f" (错误: {err[:50]})"
                     self._log(msg)
@@ -173,16 +178,17 @@ class NormalizerTab:
             succ = sum(1 for s, _, _ in results.values() if s)
             copied = sum(1 for s, a, _ in results.values() if s and a == "copied")
             processed = sum(1 for s, a, _ in results.values() if s and a == "processed")
+            duplicate = sum(1 for s, a, _ in results.values() if s and a == "duplicate")
             failed = len(results) - succ
-            self._log(f"完成! 成功:{succ}(复制:{copied},转换:{processed}),失败:{failed}")
-            messagebox.showinfo("完成", f"处理完成!\n\n成功: {succ}\n  复制: {copied}\n  转换: {processed}\n失败: {failed}")
+            self._log(f"完成! 成功:{succ}(复制:{copied},转换:{processed},重复:{duplicate}),失败:{failed}")
+            self.events.call(messagebox.showinfo, "完成", f"处理完成!\n\n成功: {succ}\n  复制: {copied}\n  转换: {processed}\n  重复: {duplicate}\n失败: {failed}")
         except Exception as e:
             self._log(f"出错: {e}")
-            messagebox.showerror("错误", str(e))
+            self.events.call(messagebox.showerror, "错误", str(e))
         finally:
             self.is_processing = False
-            self.root.after(0, lambda: self.start_btn.configure(state="normal"))
-            self.progress_var.set(100)
+            self.events.progress(100)
+            self.events.call(self.start_btn.configure, state="normal")
 
     def _reset(self):
         if self.is_processing:
@@ -195,5 +201,5 @@ class NormalizerTab:
         self.height_var.set(1080)
         self.color_var.set("black")
         self.progress_var.set(0.0)
-        self.log_text.delete("1.0", "end")
+        self.events.clear()
         self._log("已重置所有设置")
@@ -2,42 +2,62 @@
 主题切换图标 - 使用 Lucide 图标库（通过 iconipy）生成太阳/月亮图标
 深色模式显示太阳图标（点击切换至浅色），浅色模式显示月亮图标（点击切换至深色）
 """
+from functools import lru_cache
+from pathlib import Path
 from typing import Optional, Tuple
 
 import customtkinter as ctk
 
+# 渲染好的图标 PNG 缓存目录，按图标名、尺寸与颜色区分；命中时启动不再导入 iconipy、不再渲染字体图标
+ICON_CACHE_DIR = Path(__file__).parent.parent.parent / "cache" / "icons"
+
+Color = Tuple[int, int, int, int]
+
+
+def _icon_path(name: str, size: Tuple[int, int], color: Color) -> Path:
+    rgba = "".join(f"{c:02x}" for c in color)
+    return ICON_CACHE_DIR / f"lucide_{name}_{size[0]}x{size[1]}_{rgba}.png"
+
+
+@lru_cache(maxsize=None)
+def _factory(size: Tuple[int, int], color: Color):
+    from iconipy import IconFactory
+    return IconFactory(icon_set="lucide", icon_size=size, font_size=max(size) - 4, font_color=color)
+
+
+def _load_icon(name: str, size: Tuple[int, int], color: Color):
+    """读取缓存的图标 PNG；未命中时用 iconipy 渲染并写入缓存（写入失败不影响使用）"""
+    from PIL import Image
+    path = _icon_path(name, size, color)
+    if path.exists():
+        with Image.open(path) as img:
+            img.load()
+            return img.copy()
+    img = _factory(size, color).asPil(name)
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        img.save(tmp, format="PNG")
+        tmp.replace(path)
+    except OSError:
+        pass
+    return img
+
 
 def _make_theme_ctk_images(
     size: Tuple[int, int] = (24, 24),
-    light_color: Tuple[int, int, int, int] = (80, 80, 80, 255),
-    dark_color: Tuple[int, int, int, int] = (200, 200, 200, 255),
+    light_color: Color = (80, 80, 80, 255),
+    dark_color: Color = (200, 200, 200, 255),
 ) -> Tuple[Optional[ctk.CTkImage], Optional[ctk.CTkImage]]:
     """
-    使用 iconipy + Lucide 生成太阳、月亮 PIL 图并封装为 CTkImage。
+    使用 iconipy + Lucide 生成太阳、月亮 PIL 图（优先读取磁盘缓存）并封装为 CTkImage。
     返回 (sun_ctk_image, moon_ctk_image)，任一方失败则返回 (None, None)。
     """
     try:
-        from PIL import Image
-        from iconipy import IconFactory
-    except ImportError:
-        return None, None
-    try:
-        factory_light = IconFactory(
-            icon_set="lucide",
-            icon_size=size,
-            font_size=max(size) - 4,
-            font_color=light_color,
-        )
-        factory_dark = IconFactory(
-            icon_set="lucide",
-            icon_size=size,
-            font_size=max(size) - 4,
-            font_color=dark_color,
-        )
-        sun_light = factory_light.asPil("sun")
-        sun_dark = factory_dark.asPil("sun")
-        moon_light = factory_light.asPil("moon")
-        moon_dark = factory_dark.asPil("moon")
+        sun_light = _load_icon("sun", size, light_color)
+        sun_dark = _load_icon("sun", size, dark_color)
+        moon_light = _load_icon("moon", size, light_color)
+        moon_dark = _load_icon("moon", size, dark_color)
         sun_ctk = ctk.CTkImage(
             light_image=sun_light,
             dark_image=sun_dark,
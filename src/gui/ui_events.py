@@ -0,0 +1,116 @@
+"""
+后台线程到 Tk 主线程的界面事件通道
+工作线程只调用 log / progress / call（入队即返回，不触碰 Tk 对象），主线程按固定间隔取出队列：
+进度只保留最新值，日志批量写入文本框；文本框只保留最近 max_lines 行，完整日志同时追加到 cache/gui_logs 下的文件
+"""
+import os
+import queue
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import tkinter as tk
+
+GUI_LOG_DIR = str(Path(__file__).parent.parent.parent / "cache" / "gui_logs")
+# 主线程取队列的间隔（毫秒），进度与日志最多按此频率刷新
+DRAIN_INTERVAL_MS = 100
+# 文本框保留的日志行数
+MAX_LOG_LINES = 1000
+
+_LOG, _PROGRESS, _CALL = 0, 1, 2
+
+
+class UIEventPump:
+    """标签页的日志与进度通道；构造与 clear 须在主线程调用，log / progress / call 可在任意线程调用"""
+
+    def __init__(
+        self,
+        root: tk.Misc,
+        log_widget,
+        progress_var: Optional[tk.Variable],
+        name: str,
+        log_callback: Optional[Callable[[str], None]] = None,
+        max_lines: int = MAX_LOG_LINES,
+        interval_ms: int = DRAIN_INTERVAL_MS,
+        log_dir: Optional[str] = GUI_LOG_DIR,
+    ):
+        self.root = root
+        self.log_widget = log_widget
+        self.progress_var = progress_var
+        self.log_callback = log_callback
+        self.max_lines = max(1, max_lines)
+        self.interval_ms = interval_ms
+        self.log_path = os.path.join(log_dir, f"{name}-{datetime.now():%Y%m%d}.log") if log_dir else None
+        self._queue: "queue.SimpleQueue" = queue.SimpleQueue()
+        self.root.after(self.interval_ms, self._drain)
+
+    def log(self, msg: str) -> None:
+        self._queue.put((_LOG, f"[{datetime.now():%H:%M:%S}] {msg}", msg))
+
+    def progress(self, value: float) -> None:
+        self._queue.put((_PROGRESS, value, None))
+
+    def call(self, fn: Callable, *args, **kwargs) -> None:
+        """在主线程执行（启用按钮、弹出消息框等）"""
+        self._queue.put((_CALL, fn, (args, kwargs)))
+
+    def clear(self) -> None:
+        self.log_widget.delete("1.0", "end")
+
+    def _drain(self) -> None:
+        try:
+            self._drain_once()
+        finally:
+            # call 中的回调出错也不能停掉定时器；模态对话框期间定时器尚未重新登记，不会重入
+            try:
+                self.root.after(self.interval_ms, self._drain)
+            except tk.TclError:
+                # 窗口已销毁
+                pass
+
+    def _drain_once(self) -> None:
+        lines: List[str] = []
+        msgs: List[str] = []
+        progress = None
+        try:
+            while True:
+                kind, a, b = self._queue.get_nowait()
+                if kind == _LOG:
+                    lines.append(a)
+                    msgs.append(b)
+                elif kind == _PROGRESS:
+                    progress = a
+                else:
+                    # 调用之前的日志与进度先落到界面上，保持先后顺序
+                    self._flush(lines, msgs, progress)
+                    lines, msgs, progress = [], [], None
+                    a(*b[0], **b[1])
+        except queue.Empty:
+            pass
+        self._flush(lines, msgs, progress)
+
+    def _flush(self, lines: List[str], msgs: List[str], progress: Optional[float]) -> None:
+        if progress is not None and self.progress_var is not None:
+            self.progress_var.set(progress)
+        if not lines:
+            return
+        # 超出文本框容量的部分只写文件
+        self.log_widget.insert("end", "\n".join(lines[-self.max_lines:]) + "\n")
+        excess = int(self.log_widget.index("end-1c").split(".")[0]) - 1 - self.max_lines
+        if excess > 0:
+            self.log_widget.delete("1.0", f"{excess + 1}.0")
+        self.log_widget.see("end")
+        self._spill(lines)
+        if self.log_callback:
+            for msg in msgs:
+                self.log_callback(msg)
+
+    def _spill(self, lines: List[str]) -> None:
+        if not self.log_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except OSError:
+            self.log_path = None
@@ -11,6 +11,8 @@ from typing import Optional, Callable
 import customtkinter as ctk
 import tkinter as tk
 
+from gui.ui_events import UIEventPump
+
 # 九宫格按钮文案与 position 键
 POSITION_LABELS = [
     ("左上", "top_left"), ("上", "top"), ("右上", "top_right"),
@@ -183,16 +185,12 @@ class WatermarkTab:
         ).pack(anchor="w", padx=10, pady=5)
         self.log_text = ctk.CTkTextbox(log_row, height=120, width=480)
         self.log_text.pack(fill="both", expand=True, padx=10, pady=5)
+        self.events = UIEventPump(self.root, self.log_text, self.progress_var, "watermark", self.log_callback)
 
         self._log("视频水印工具已就绪")
 
     def _log(self, msg: str):
-        from datetime import datetime
-        ts = datetime.now().strftime("%H:%M:%S")
-        self.log_text.insert("end", f"[{ts}] {msg}\n")
-        self.log_text.see("end")
-        if self.log_callback:
-            self.log_callback(msg)
+        self.events.log(msg)
 
     def _on_opacity_slider(self, v):
         self.opacity_entry.delete(0, "end")
@@ -282,25 +280,25 @@ class WatermarkTab:
             opacity = max(0.1, min(1.0, float(self.opacity_var.get()) / 100.0))
             total = len(self.videos)
 
-            def progress_cb(curr, n, name, pct, err):
-                self.progress_var.set(((curr - 1) * 100 + pct) / n)
+            def progress_cb(curr, n, name, pct, act, err):
+                self.events.progress(((curr - 1) * 100 + pct) / n)
                 if err:
                     self._log(f"[{curr}/{n}] {name} - 失败: {err[:80]}")
-                elif pct >= 100:
-                    self._log(f"[{curr}/{n}] {name} - 完成")
+                elif act:
+                    self._log(f"[{curr}/{n}] {name} - " + {"duplicate": "重复文件，已复用输出", "cached": "命中缓存"}.get(act, "完成"))
 
             results = wm.batch_apply(self.videos, out_dir, self.watermark_path, opacity, self.position, progress_cb)
-            ok_count = sum(1 for s, _ in results.values() if s)
+            ok_count = sum(1 for s, _, _ in results.values() if s)
             fail_count = len(results) - ok_count
             self._log(f"完成。成功: {ok_count}, 失败: {fail_count}")
-            messagebox.showinfo("完成", f"处理完成\n\n成功: {ok_count}\n失败: {fail_count}")
+            self.events.call(messagebox.showinfo, "完成", f"处理完成\n\n成功: {ok_count}\n失败: {fail_count}")
         except Exception as e:
             self._log(f"出错: {e}")
-            messagebox.showerror("错误", str(e))
+            self.events.call(messagebox.showerror, "错误", str(e))
         finally:
             self.is_processing = False
-            self.root.after(0, lambda: self.start_btn.configure(state="normal"))
-            self.progress_var.set(100)
+            self.events.progress(100)
+            self.events.call(self.start_btn.configure, state="normal")
 
     def _reset(self):
         if self.is_processing:
@@ -316,5 +314,5 @@ class WatermarkTab:
         self.opacity_entry.delete(0, "end")
         self.opacity_entry.insert(0, "100")
         self._set_position("center")
-        self.log_text.delete("1.0", "end")
+        self.events.clear()
         self._log("已重置所有设置")
@@ -0,0 +1,380 @@
+"""
+异步 ffmpeg / ffprobe 执行模块
+基于 asyncio.create_subprocess_exec 启动子进程并在事件循环中读取进度，
+并发上限由信号量控制；大量任务与订阅者共用一个事件循环，不为每个任务创建线程
+"""
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from . import metrics, tracing
+from .concurrency import AdaptiveConcurrency
+from .memory_admission import MemoryAdmission, peak_rss
+from .process_control import current_control
+from .process_priority import CorePool, get_policy
+
+# 每次从 stderr 读取的字节数
+_READ_CHUNK = 4096
+# 编码过程中采样子进程峰值内存的间隔（秒）
+_RSS_SAMPLE_SEC = 1.0
+# 探测结果缓存条数（按路径、修改时间与大小识别文件）；先探测整批再编码的任务运行期间另行扩容
+_PROBE_CACHE_SIZE = 4096
+
+# 当前子任务的编码时段列表；由任务上下文设置，执行器在每次编码结束后追加（开始, 结束）perf_counter 时间（不含排队）
+encode_spans: ContextVar[Optional[List[Tuple[float, float]]]] = ContextVar("encode_spans", default=None)
+
+
+def parse_ffmpeg_time(line: str) -> Optional[float]:
+    """从 ffmpeg 进度行中解析 time=HH:MM:SS.xx，返回秒数"""
+    if "time=" not in line:
+        return None
+    try:
+        time_str = line.split("time=")[1].split()[0]
+        h, m, s = time_str.split(":")
+        return int(h) * 3600 + int(m) * 60 + float(s)
+    except (IndexError, ValueError):
+        return None
+
+
+def parse_ffmpeg_frame(line: str) -> Optional[int]:
+    """从 ffmpeg 进度行中解析已编码帧数 frame=N"""
+    if "frame=" not in line:
+        return None
+    try:
+        return int(line.split("frame=")[1].split()[0])
+    except (IndexError, ValueError):
+        return None
+
+
+def parse_ffmpeg_stat(line: str, key: str) -> Optional[float]:
+    """从 ffmpeg 进度行中解析数值字段，如 fps=25、speed=1.5x；N/A 返回 None"""
+    marker = key + "="
+    if marker not in line:
+        return None
+    try:
+        return float(line.split(marker)[1].split()[0].rstrip("x"))
+    except (IndexError, ValueError):
+        return None
+
+
+def with_thread_budget(cmd: List[str], threads: int) -> List[str]:
+    """为编码命令加上线程数限制：滤镜线程为全局选项，编码线程为输出选项（放在输出文件前）"""
+    n = str(threads)
+    return [cmd[0], "-filter_threads", n, "-filter_complex_threads", n, *cmd[1:-1], "-threads", n, cmd[-1]]
+
+
+async def _iter_lines(stream: asyncio.StreamReader) -> AsyncIterator[str]:
+    """按 \\r 或 \\n 切分输出（ffmpeg 进度行以 \\r 结尾）"""
+    buf = ""
+    while True:
+        chunk = await stream.read(_READ_CHUNK)
+        if not chunk:
+            break
+        buf += chunk.decode("utf-8", errors="ignore").replace("\r", "\n")
+        *lines, buf = buf.split("\n")
+        for line in lines:
+            if line:
+                yield line
+    if buf:
+        yield buf
+
+
+class AsyncFFmpegEngine:
+    """
+    异步子进程执行器：编码进程与探测进程分别限制并发数；
+    交互任务的编码使用独立名额，不会因批量任务（含被挂起的）占满名额而等待。
+    指定 controller 时批量编码的并发数与每进程线程数由自适应控制器决定，max_processes 不再生效；
+    指定 memory 时编码先按估算峰值内存申请额度，结束后用实测峰值 RSS 校准估算
+    """
+
+    def __init__(
+        self,
+        max_processes: int = 2,
+        max_probes: int = 8,
+        max_interactive: int = 1,
+        controller: Optional[AdaptiveConcurrency] = None,
+        memory: Optional[MemoryAdmission] = None,
+    ):
+        self.max_processes = max(1, max_processes)
+        self.max_probes = max(1, max_probes)
+        self.max_interactive = max(1, max_interactive)
+        self.controller = controller
+        self.memory = memory
+        self._process_sem: Optional[asyncio.Semaphore] = None
+        self._probe_sem: Optional[asyncio.Semaphore] = None
+        self._interactive_sem: Optional[asyncio.Semaphore] = None
+        self._core_pool: Optional[CorePool] = None
+        self._probe_cache: "OrderedDict[Tuple, Dict]" = OrderedDict()
+        self._probe_reserved = 0
+        # 正在探测的文件：同时请求同一文件（如后台规划与编码）时共用一次 ffprobe
+        self._probing: Dict[Tuple, "asyncio.Future"] = {}
+        # 运行中编码的实时状态：pid -> [编码类型, fps, speed]
+        self._live: Dict[int, List] = {}
+
+    @property
+    def parallelism(self) -> int:
+        """当前可同时编码的文件数（自适应时为控制器的当前并发数），用于估算完工时间"""
+        if self.controller is not None:
+            return self.controller.limit
+        return self.max_processes
+
+    @property
+    def max_parallelism(self) -> int:
+        """单个任务内可同时进行的文件数：取编码并发可能达到的上限，多出的在名额处等待"""
+        if self.controller is not None:
+            return self.controller.max_limit
+        return self.max_processes
+
+    def _sems(self) -> Tuple[asyncio.Semaphore, asyncio.Semaphore]:
+        # 信号量须在事件循环内创建
+        if self._process_sem is None:
+            self._process_sem = asyncio.Semaphore(self.max_processes)
+            self._probe_sem = asyncio.Semaphore(self.max_probes)
+            self._interactive_sem = asyncio.Semaphore(self.max_interactive)
+        return self._process_sem, self._probe_sem
+
+    def reserve_probe_cache(self, n: int) -> Callable[[], None]:
+        """探测缓存容量临时增加 n 条（整批预先探测后，编码时仍能命中），返回释放函数（可重复调用）"""
+        self._probe_reserved += n
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self._probe_reserved -= n
+                self._trim_probe_cache()
+
+        return release
+
+    def _trim_probe_cache(self) -> None:
+        while len(self._probe_cache) > _PROBE_CACHE_SIZE + self._probe_reserved:
+            self._probe_cache.popitem(last=False)
+
+    async def probe(self, ffprobe_path: str, video_path: str) -> Optional[Dict]:
+        """获取视频信息（宽高、时长、像素格式），ffprobe 不存在或失败时返回 None；文件未变化时复用上次结果"""
+        if not os.path.exists(ffprobe_path):
+            return None
+        try:
+            st = os.stat(video_path)
+            key = (video_path, st.st_mtime_ns, st.st_size)
+        except OSError:
+            key = None
+        if key in self._probe_cache:
+            self._probe_cache.move_to_end(key)
+            metrics.PROBES.inc(result="cached")
+            return dict(self._probe_cache[key])
+        if key in self._probing:
+            info = await asyncio.shield(self._probing[key])
+            metrics.PROBES.inc(result="cached")
+            return dict(info) if info is not None else None
+        fut = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self._probing[key] = fut
+        info = None
+        try:
+            with tracing.span("ffprobe", path=os.path.basename(video_path)) as sp:
+                info = await self._probe(ffprobe_path, video_path)
+                sp.set(ok=info is not None)
+        finally:
+            # 发起者被取消时等待者得到 None（按探测失败处理）
+            self._probing.pop(key, None)
+            fut.set_result(info)
+        metrics.PROBES.inc(result="ok" if info is not None else "failed")
+        if info is not None and key is not None:
+            self._probe_cache[key] = info
+            self._trim_probe_cache()
+            return dict(info)
+        return info
+
+    async def _probe(self, ffprobe_path: str, video_path: str) -> Optional[Dict]:
+        _, probe_sem = self._sems()
+        cmd = [ffprobe_path, "-v", "quiet", "-print_format", "json", "-show_streams", video_path]
+        async with probe_sem:
+            try:
+                proc = await asyncio.create_subprocess_exec(
+                    *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL
+                )
+                stdout, _ = await proc.communicate()
+            except OSError:
+                return None
+        if proc.returncode != 0 or not stdout:
+            return None
+        try:
+            data = json.loads(stdout.decode("utf-8", errors="ignore"))
+        except ValueError:
+            return None
+        video_stream = next((s for s in data.get("streams", []) if s.get("codec_type") == "video"), None)
+        if not video_stream:
+            return None
+        return {
+            "width": int(video_stream.get("width", 0)),
+            "height": int(video_stream.get("height", 0)),
+            "duration": float(video_stream.get("duration", 0) or 0),
+            "pix_fmt": video_stream.get("pix_fmt", ""),
+        }
+
+    def _take_cores(self, policy, threads: Optional[int], interactive: bool) -> Optional[List[int]]:
+        """固定核心时为批量编码分配互不重叠的核心；交互编码运行时批量编码被挂起，使用全部编码核心"""
+        if not policy.pin or interactive:
+            return None
+        if self._core_pool is None or self._core_pool.cores != policy.worker_cores:
+            self._core_pool = CorePool(policy.worker_cores)
+        return self._core_pool.take(threads or len(policy.worker_cores) // self.max_processes)
+
+    def live_stats(self) -> Dict[str, Tuple[int, float, float]]:
+        """按编码类型汇总运行中编码：（进程数, fps 之和, speed 之和）"""
+        out: Dict[str, Tuple[int, float, float]] = {}
+        for op, fps, speed in list(self._live.values()):
+            n, f, s = out.get(op, (0, 0.0, 0.0))
+            out[op] = (n + 1, f + fps, s + speed)
+        return out
+
+    async def _acquire_slot(self, interactive: bool) -> Optional[int]:
+        """占用一个编码名额，返回线程数（None 表示不限制，由 ffmpeg 自行决定）"""
+        process_sem, _ = self._sems()
+        if interactive:
+            await self._interactive_sem.acquire()
+            return None
+        if self.controller is not None:
+            return await self.controller.acquire()
+        await process_sem.acquire()
+        return None
+
+    async def _release_slot(self, interactive: bool) -> None:
+        if interactive:
+            self._interactive_sem.release()
+        elif self.controller is not None:
+            await self.controller.release()
+        else:
+            self._process_sem.release()
+
+    async def run(
+        self,
+        cmd: List[str],
+        duration: float = 0,
+        progress_callback: Optional[Callable[[float], None]] = None,
+        err_tail: int = 15,
+        memory: Optional[Tuple[str, int]] = None,
+    ) -> Tuple[bool, str]:
+        """
+        执行 ffmpeg 编码命令，返回（成功, 错误信息）。
+        duration > 0 时按 time= 换算进度百分比；任务被取消时终止子进程。
+        所属任务暂停时等待恢复后再启动，运行中的子进程登记到任务的进程控制以便挂起/恢复。
+        memory 为（编码类型, 估算峰值字节数），占用编码名额之后再申请内存额度（排队等名额的编码不占额度）；
+        编码类型同时作为指标的 op 标签
+        """
+        op = memory[0] if memory else "encode"
+        queued_at = time.perf_counter()
+        control = current_control.get()
+        interactive = control is not None and control.interactive
+        if control is not None:
+            await control.wait_runnable()
+        return await self._run_in_slot(
+            cmd, duration, progress_callback, err_tail, control, interactive, op, queued_at, memory
+        )
+
+    async def _run_in_slot(
+        self, cmd, duration, progress_callback, err_tail, control, interactive, op, queued_at, memory
+    ):
+        """占用编码名额（及内存额度）执行命令，返回（成功, 错误信息）；成功时用实测峰值 RSS 校准内存估算"""
+        threads = await self._acquire_slot(interactive)
+        policy = get_policy()
+        cores = None
+        reservation = None
+        peak: Optional[int] = None
+        ok = False
+        try:
+            if self.memory is not None and memory is not None:
+                reservation = await self.memory.reserve(memory[0], memory[1], interactive)
+            cores = self._take_cores(policy, threads, interactive)
+            if control is not None:
+                await control.wait_runnable()
+            if cores is not None:
+                threads = len(cores)
+            if threads is not None:
+                cmd = with_thread_budget(cmd, threads)
+            if progress_callback:
+                progress_callback(0)
+            spawn_at = time.perf_counter()
+            proc = await asyncio.create_subprocess_exec(
+                *cmd, stdin=asyncio.subprocess.DEVNULL,
+                stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+                **policy.spawn_kwargs(cores),
+            )
+            policy.apply_after_spawn(proc.pid, cores)
+            started = time.perf_counter()
+            metrics.ENCODE_WAIT.observe(spawn_at - queued_at, op=op)
+            tracing.record("encode_wait", queued_at, spawn_at, "queue", op=op)
+            tracing.record("ffmpeg_spawn", spawn_at, started, pid=proc.pid)
+            first_progress: Optional[float] = None
+            live = self._live[proc.pid] = [op, 0.0, 0.0]
+            if control is not None:
+                control.attach(proc.pid)
+            err_lines: List[str] = []
+            last_frame = 0
+            last_time = 0.0
+            last_sample = 0.0
+            try:
+                async for line in _iter_lines(proc.stderr):
+                    if self.memory is not None and time.perf_counter() - last_sample >= _RSS_SAMPLE_SEC:
+                        # 峰值 RSS 单调不减，进程退出前最后一次采样即近似峰值
+                        last_sample = time.perf_counter()
+                        peak = peak_rss(proc.pid) or peak
+                    err_lines.append(line)
+                    if len(err_lines) > err_tail * 4:
+                        del err_lines[:-err_tail]
+                    if self.controller is not None and not interactive:
+                        frame = parse_ffmpeg_frame(line)
+                        if frame is not None and frame > last_frame:
+                            self.controller.record_frames(frame - last_frame)
+                            last_frame = frame
+                    t = parse_ffmpeg_time(line)
+                    if t is not None:
+                        if first_progress is None:
+                            # 启动阶段：打开输入、探测流、初始化编码器，直到第一行进度
+                            first_progress = time.perf_counter()
+                            tracing.record("ffmpeg_startup", started, first_progress)
+                        if t > last_time:
+                            metrics.MEDIA_SECONDS.inc(t - last_time, op=op)
+                            metrics.media_rate.add(t - last_time)
+                            last_time = t
+                        live[1] = parse_ffmpeg_stat(line, "fps") or live[1]
+                        live[2] = parse_ffmpeg_stat(line, "speed") or live[2]
+                        if progress_callback and duration > 0:
+                            progress_callback(min(100, t / duration * 100))
+                if self.memory is not None:
+                    peak = peak_rss(proc.pid) or peak
+                await proc.wait()
+                ended = time.perf_counter()
+                tracing.record("ffmpeg_encode", first_progress or started, ended, op=op, returncode=proc.returncode)
+                if proc.returncode == 0:
+                    metrics.ENCODE_DURATION.observe(ended - started, op=op)
+                spans = encode_spans.get()
+                if spans is not None:
+                    spans.append((started, ended))
+            except asyncio.CancelledError:
+                if proc.returncode is None:
+                    proc.kill()
+                    await proc.wait()
+                raise
+            finally:
+                self._live.pop(proc.pid, None)
+                if control is not None:
+                    control.detach(proc.pid)
+            ok = proc.returncode == 0
+        finally:
+            if cores is not None:
+                self._core_pool.give(cores)
+            try:
+                if reservation is not None:
+                    await self.memory.release(reservation, peak if ok else None)
+            finally:
+                await self._release_slot(interactive)
+        if ok and progress_callback:
+            progress_callback(100)
+        return ok, "" if ok else ("\n".join(err_lines[-err_tail:]).strip() or "ffmpeg返回非零")
@@ -0,0 +1,26 @@
+"""
+同步批处理的并行执行
+供 batch_normalize / batch_apply / batch_merge 使用：按 max_workers 路线程并行调用处理函数（每路各自运行 ffmpeg）；
+批内重复输入推迟到其余输入全部完成后再执行，以便复用首个同内容输入的输出
+"""
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Collection, Sequence, Tuple
+
+
+def run_pool(
+    tasks: Sequence[Tuple[int, str]],
+    fn: Callable[[int, str], None],
+    max_workers: int = 1,
+    deferred: Collection[str] = (),
+) -> None:
+    """对每个 (序号, 路径) 调用 fn；max_workers <= 1 时在当前线程按原顺序执行。fn 抛出的异常原样抛出"""
+    if max_workers <= 1 or len(tasks) <= 1:
+        for idx, path in tasks:
+            fn(idx, path)
+        return
+    first = [t for t in tasks if t[1] not in deferred]
+    later = [t for t in tasks if t[1] in deferred]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(tasks)), thread_name_prefix="batch") as pool:
+        for group in (first, later):
+            for future in [pool.submit(fn, idx, path) for idx, path in group]:
+                future.result()
@@ -0,0 +1,208 @@
+"""
+自适应并发控制模块
+根据实时 CPU 利用率、系统负载与实测编码帧率调整同时运行的 ffmpeg 编码数，并按并发数分配每个进程的线程数：
+吞吐仍在提升时逐步提高并发，吞吐不再提升（平台期）或 CPU 过载时回退
+"""
+import asyncio
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+# 吞吐提升不足该比例视为进入平台期
+IMPROVE_RATIO = 0.05
+# 过载判定：CPU 利用率与每核负载
+CPU_BUSY = 0.95
+LOAD_PER_CPU_BUSY = 1.5
+# 只有并发名额基本用满（饱和时间占比达到该值）的窗口才用于决策，否则上限并非瓶颈
+SATURATED_SHARE = 0.8
+# 回退后保持的窗口数，避免频繁来回试探
+HOLD_WINDOWS = 4
+
+
+class CpuSampler:
+    """两次采样之间的整机 CPU 利用率（0~1）；Linux 读 /proc/stat，Windows 调 GetSystemTimes，其他平台返回 None"""
+
+    def __init__(self):
+        self._last: Optional[Tuple[float, float]] = self._read()
+
+    @staticmethod
+    def _read() -> Optional[Tuple[float, float]]:
+        """返回（空闲时间, 总时间），单位不限，只用差值"""
+        try:
+            if sys.platform == "win32":
+                import ctypes
+                from ctypes import wintypes
+                idle, kernel, user = wintypes.FILETIME(), wintypes.FILETIME(), wintypes.FILETIME()
+                if not ctypes.windll.kernel32.GetSystemTimes(
+                    ctypes.byref(idle), ctypes.byref(kernel), ctypes.byref(user)
+                ):
+                    return None
+
+                def ft(t):
+                    return (t.dwHighDateTime << 32) | t.dwLowDateTime
+
+                # 内核时间包含空闲时间
+                return float(ft(idle)), float(ft(kernel) + ft(user))
+            with open("/proc/stat", "r", encoding="ascii") as f:
+                fields = [float(x) for x in f.readline().split()[1:]]
+            idle = fields[3] + (fields[4] if len(fields) > 4 else 0)
+            return idle, sum(fields[:8])
+        except (OSError, ValueError, IndexError, AttributeError):
+            return None
+
+    def sample(self) -> Optional[float]:
+        cur = self._read()
+        last, self._last = self._last, cur
+        if cur is None or last is None or cur[1] <= last[1]:
+            return None
+        return max(0.0, min(1.0, 1 - (cur[0] - last[0]) / (cur[1] - last[1])))
+
+
+def load_per_cpu() -> Optional[float]:
+    """1 分钟平均负载 / CPU 核数；Windows 无负载平均值时返回 None"""
+    if not hasattr(os, "getloadavg"):
+        return None
+    try:
+        return os.getloadavg()[0] / (os.cpu_count() or 1)
+    except OSError:
+        return None
+
+
+class AdaptiveConcurrency:
+    """
+    编码并发上限的爬山控制器。每个评估窗口统计所有编码进程的合计帧率（frames/s）：
+    提高并发后吞吐提升超过 IMPROVE_RATIO 则继续提高，否则退回上一档并保持 HOLD_WINDOWS 个窗口；
+    CPU 过载且吞吐没有提升时降低并发。每个进程的线程数 = CPU 核数 / 当前并发上限
+    """
+
+    def __init__(
+        self,
+        initial: int = 2,
+        min_limit: int = 1,
+        max_limit: Optional[int] = None,
+        window_sec: float = 15.0,
+        cpu_count: Optional[int] = None,
+    ):
+        self.cpu_count = cpu_count or os.cpu_count() or 1
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit or self.cpu_count)
+        self.baseline = max(self.min_limit, min(initial, self.max_limit))
+        self.limit = self.baseline
+        self.window_sec = window_sec
+        self.active = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self._cpu = CpuSampler()
+        self._frames = 0
+        self._window_start = time.monotonic()
+        self._saturated_time = 0.0
+        self._state_since = self._window_start
+        self._prev_limit: Optional[int] = None
+        self._hold = 0
+        # 并发上限 -> [平滑后的帧率, 窗口数]
+        self._fps: Dict[int, List[float]] = {}
+        self.history: List[Dict] = []
+
+    def _condition(self) -> asyncio.Condition:
+        # Condition 须在事件循环内创建
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def threads_per_process(self) -> int:
+        return max(1, self.cpu_count // self.limit)
+
+    def _account(self) -> None:
+        now = time.monotonic()
+        if self.active >= self.limit:
+            self._saturated_time += now - self._state_since
+        self._state_since = now
+
+    async def acquire(self) -> int:
+        """等待并发名额，返回该进程应使用的线程数"""
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: self.active < self.limit)
+            self._account()
+            self.active += 1
+        return self.threads_per_process()
+
+    async def release(self) -> None:
+        cond = self._condition()
+        async with cond:
+            self._account()
+            self.active -= 1
+            self._maybe_adjust()
+            cond.notify_all()
+
+    def record_frames(self, frames: int) -> None:
+        """编码进度回调中上报新增帧数"""
+        if frames > 0:
+            self._frames += frames
+        if time.monotonic() - self._window_start >= self.window_sec and self._cond is not None:
+            self._maybe_adjust()
+            if self.active < self.limit:
+                asyncio.ensure_future(self._notify())
+
+    async def _notify(self) -> None:
+        cond = self._condition()
+        async with cond:
+            cond.notify_all()
+
+    def _maybe_adjust(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._window_start
+        if elapsed < self.window_sec:
+            return
+        self._account()
+        fps = self._frames / elapsed
+        saturated = self._saturated_time / elapsed >= SATURATED_SHARE
+        cpu = self._cpu.sample()
+        load = load_per_cpu()
+        self._frames = 0
+        self._saturated_time = 0.0
+        self._window_start = now
+        if not saturated or fps <= 0:
+            return
+        stat = self._fps.setdefault(self.limit, [fps, 0])
+        stat[0] = fps if stat[1] == 0 else 0.5 * stat[0] + 0.5 * fps
+        stat[1] += 1
+        old = self.limit
+        overloaded = cpu is not None and cpu >= CPU_BUSY and (load is None or load >= LOAD_PER_CPU_BUSY)
+        prev_fps = self._fps.get(self._prev_limit, [0])[0] if self._prev_limit else 0
+        if self._hold > 0:
+            self._hold -= 1
+        elif self._prev_limit is not None and self._prev_limit < self.limit and fps < prev_fps * (1 + IMPROVE_RATIO):
+            # 提高并发后没有明显提升：退回并保持
+            self.limit, self._hold = self._prev_limit, HOLD_WINDOWS
+        elif overloaded and self.limit > self.min_limit:
+            self.limit -= 1
+            self._hold = HOLD_WINDOWS
+        elif self.limit < self.max_limit and (cpu is None or cpu < CPU_BUSY):
+            self.limit += 1
+        if self.limit != old:
+            self._prev_limit = old
+        self.history.append({
+            "time": time.time(), "limit": old, "new_limit": self.limit, "fps": round(fps, 2),
+            "cpu": None if cpu is None else round(cpu, 3), "load_per_cpu": None if load is None else round(load, 2),
+        })
+        del self.history[:-200]
+
+    def report(self) -> Dict:
+        """各并发档位实测帧率，以及最佳档位相对固定设置（初始并发）的提升"""
+        by_limit = {str(k): {"fps": round(v[0], 2), "windows": int(v[1])} for k, v in sorted(self._fps.items())}
+        baseline_fps = self._fps.get(self.baseline, [0])[0]
+        best_limit, best_fps = max(self._fps.items(), key=lambda kv: kv[1][0], default=(self.baseline, [0]))
+        return {
+            "limit": self.limit,
+            "threads_per_process": self.threads_per_process(),
+            "active": self.active,
+            "cpu_count": self.cpu_count,
+            "baseline_limit": self.baseline,
+            "baseline_fps": round(baseline_fps, 2),
+            "best_limit": best_limit,
+            "best_fps": round(best_fps[0], 2),
+            "speedup_vs_baseline": round(best_fps[0] / baseline_fps, 3) if baseline_fps else None,
+            "by_limit": by_limit,
+            "history": self.history[-20:],
+        }
@@ -0,0 +1,87 @@
+"""
+编码参数配置模块
+规范化、水印与合并共用的视频编码参数（编码器、x264 预设、CRF），保存在 config/encoder_profile.json；
+文件不存在时沿用 libx264 fast 预设与编码器默认 CRF。配置由编码参数调优（encoder_tuner）生成，也可手动修改，
+文件修改后下次构建命令时生效
+"""
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+PROFILE_PATH = str(Path(__file__).parent.parent.parent / "config" / "encoder_profile.json")
+
+# libx264 预设，从快到慢
+X264_PRESETS = ("ultrafast", "superfast", "veryfast", "faster", "fast", "medium", "slow", "slower", "veryslow")
+# libx264 未指定 CRF 时的默认值
+X264_DEFAULT_CRF = 23
+
+DEFAULT_PROFILE: Dict = {"encoder": "libx264", "preset": "fast", "crf": None}
+
+_lock = threading.Lock()
+# 路径 -> (mtime_ns, 配置)
+_cache: Dict[str, Tuple[int, Dict]] = {}
+
+
+def validate_profile(profile: Dict) -> Dict:
+    """校验并补全配置，非法值抛出 ValueError"""
+    merged = {**DEFAULT_PROFILE, **{k: profile[k] for k in DEFAULT_PROFILE if k in profile}}
+    if merged["encoder"] != "libx264":
+        raise ValueError(f"不支持的编码器: {merged['encoder']}")
+    if merged["preset"] not in X264_PRESETS:
+        raise ValueError(f"未知预设: {merged['preset']}")
+    crf = merged["crf"]
+    if crf is not None:
+        crf = float(crf)
+        if not 0 <= crf <= 51:
+            raise ValueError(f"CRF 超出范围 0-51: {crf}")
+        merged["crf"] = int(crf) if crf.is_integer() else crf
+    # 调优结果等附加信息原样保留
+    return {**profile, **merged}
+
+
+def load_profile(path: Optional[str] = None) -> Dict:
+    """读取编码配置；文件不存在或内容无效时返回默认配置。按修改时间缓存"""
+    path = path or PROFILE_PATH
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return dict(DEFAULT_PROFILE)
+    with _lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == mtime:
+            return dict(cached[1])
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            profile = validate_profile(json.load(f))
+    except (OSError, ValueError, TypeError):
+        profile = dict(DEFAULT_PROFILE)
+    with _lock:
+        _cache[path] = (mtime, profile)
+    return dict(profile)
+
+
+def save_profile(profile: Dict, path: Optional[str] = None) -> Dict:
+    """校验后保存编码配置，返回保存的内容"""
+    path = path or PROFILE_PATH
+    profile = validate_profile(profile)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(profile, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return profile
+
+
+def codec_args(preset: str, crf: Optional[float] = None, encoder: str = "libx264") -> List[str]:
+    args = ["-c:v", encoder, "-preset", preset]
+    if crf is not None:
+        args += ["-crf", str(crf)]
+    return args
+
+
+def video_codec_args(path: Optional[str] = None) -> List[str]:
+    """当前配置对应的 ffmpeg 视频编码参数（-c:v ... -preset ... [-crf ...]）"""
+    profile = load_profile(path)
+    return codec_args(profile["preset"], profile["crf"], profile["encoder"])
@@ -0,0 +1,214 @@
+"""
+编码参数调优模块
+从一批代表性视频中各截取一段（取中间位置），以无损 x264 保存为参考片段，
+再按 预设 × CRF 网格逐一编码，记录编码帧率与输出码率，并用 ffmpeg 自带的 ssim / psnr 滤镜与参考片段对比画质；
+汇总后推荐满足画质下限（全部样本的最差值）且编码最快的组合，写入 encoder_profile 后三个处理器即使用该配置
+"""
+import json
+import os
+import re
+import subprocess
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .async_ffmpeg import parse_ffmpeg_frame
+from .encoder_profile import X264_DEFAULT_CRF, codec_args, load_profile
+from .process_priority import get_policy
+
+DEFAULT_PRESETS = ("ultrafast", "superfast", "veryfast", "faster", "fast", "medium")
+DEFAULT_CRFS = (18, 20, 23, 26)
+DEFAULT_MIN_SSIM = 0.97
+SEGMENT_SEC = 4.0
+LOSSLESS_PSNR = 100.0
+
+_SSIM_RE = re.compile(r"SSIM .*All:([\d.]+)")
+_PSNR_RE = re.compile(r"PSNR .*average:([\d.]+|inf)")
+
+
+def pick_samples(paths: Sequence[str], count: int) -> List[str]:
+    """在批次中等间隔选取 count 个样本（保持原顺序）"""
+    if count <= 0 or len(paths) <= count:
+        return list(paths)
+    step = len(paths) / count
+    return [paths[int(i * step)] for i in range(count)]
+
+
+def _run(cmd: List[str]) -> subprocess.CompletedProcess:
+    return get_policy().run(
+        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, encoding="utf-8", errors="ignore"
+    )
+
+
+def _probe_duration(ffprobe_path: str, path: str) -> float:
+    if not ffprobe_path or not os.path.exists(ffprobe_path):
+        return 0.0
+    try:
+        out = subprocess.run(
+            [ffprobe_path, "-v", "quiet", "-print_format", "json", "-show_format", path],
+            capture_output=True, text=True, encoding="utf-8", errors="ignore",
+        )
+        return float(json.loads(out.stdout).get("format", {}).get("duration", 0) or 0)
+    except (OSError, ValueError):
+        return 0.0
+
+
+def extract_reference(
+    ffmpeg_path: str, ffprobe_path: str, input_path: str, ref_path: str, segment_sec: float = SEGMENT_SEC
+) -> Optional[str]:
+    """截取视频中间的一段保存为无损参考片段，返回错误信息（成功时为 None）"""
+    duration = _probe_duration(ffprobe_path, input_path)
+    start = max(0.0, duration / 2 - segment_sec / 2) if duration > segment_sec else 0.0
+    cmd = [
+        ffmpeg_path, "-v", "error", "-y", "-ss", f"{start:.3f}", "-i", input_path, "-t", f"{segment_sec:.3f}",
+        "-an", "-pix_fmt", "yuv420p", "-c:v", "libx264", "-preset", "ultrafast", "-qp", "0", ref_path,
+    ]
+    result = _run(cmd)
+    if result.returncode != 0 or not os.path.exists(ref_path):
+        return (result.stderr or "").strip()[-300:] or "截取参考片段失败"
+    return None
+
+
+def measure_quality(ffmpeg_path: str, encoded: str, reference: str) -> Dict:
+    """ssim / psnr 滤镜对比编码结果与参考片段，返回 {"ssim": All 值, "psnr": 平均 dB}"""
+    graph = "[0:v]split[a0][a1];[1:v]split[b0][b1];[a0][b0]ssim;[a1][b1]psnr"
+    result = _run([ffmpeg_path, "-i", encoded, "-i", reference, "-lavfi", graph, "-f", "null", "-"])
+    quality: Dict = {"ssim": None, "psnr": None}
+    m = _SSIM_RE.search(result.stderr or "")
+    if m:
+        quality["ssim"] = float(m.group(1))
+    m = _PSNR_RE.search(result.stderr or "")
+    if m:
+        # 完全一致时 psnr 为 inf，记为 100 dB 以便输出 JSON
+        quality["psnr"] = LOSSLESS_PSNR if m.group(1) == "inf" else float(m.group(1))
+    return quality
+
+
+def encode_candidate(ffmpeg_path: str, reference: str, out_path: str, preset: str, crf: float) -> Dict:
+    """按给定预设与 CRF 编码参考片段，返回帧数、编码耗时、帧率与码率"""
+    cmd = [
+        ffmpeg_path, "-y", "-i", reference, "-an", *codec_args(preset, crf), "-pix_fmt", "yuv420p", out_path,
+    ]
+    start = time.perf_counter()
+    result = _run(cmd)
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0:
+        return {"error": (result.stderr or "").strip()[-300:]}
+    frames = 0
+    for line in (result.stderr or "").replace("\r", "\n").splitlines():
+        frame = parse_ffmpeg_frame(line)
+        if frame is not None:
+            frames = frame
+    size = os.path.getsize(out_path) if os.path.exists(out_path) else 0
+    return {"frames": frames, "encode_sec": elapsed, "bytes": size, "fps": frames / elapsed if elapsed > 0 else 0.0}
+
+
+def tune_sample(
+    ffmpeg_path: str,
+    ffprobe_path: str,
+    input_path: str,
+    work_dir: str,
+    presets: Sequence[str] = DEFAULT_PRESETS,
+    crfs: Sequence[float] = DEFAULT_CRFS,
+    segment_sec: float = SEGMENT_SEC,
+    progress: Optional[Callable[[float], None]] = None,
+) -> List[Dict]:
+    """对单个样本测量全部组合，返回每个组合的测量结果；截取参考片段失败时抛出 RuntimeError"""
+    os.makedirs(work_dir, exist_ok=True)
+    stem = Path(input_path).stem
+    reference = os.path.join(work_dir, f"{stem}_ref.mkv")
+    err = extract_reference(ffmpeg_path, ffprobe_path, input_path, reference, segment_sec)
+    if err:
+        raise RuntimeError(err)
+    grid = [(p, c) for p in presets for c in crfs]
+    rows = []
+    try:
+        for n, (preset, crf) in enumerate(grid):
+            out_path = os.path.join(work_dir, f"{stem}_{preset}_crf{crf}.mp4")
+            row = {"sample": input_path, "preset": preset, "crf": crf}
+            row.update(encode_candidate(ffmpeg_path, reference, out_path, preset, crf))
+            if "error" not in row:
+                row.update(measure_quality(ffmpeg_path, out_path, reference))
+                row["kbps"] = row["bytes"] * 8 / 1000 / segment_sec
+            if os.path.exists(out_path):
+                os.remove(out_path)
+            rows.append(row)
+            if progress:
+                progress((n + 1) * 100 / len(grid))
+    finally:
+        if os.path.exists(reference):
+            os.remove(reference)
+    return rows
+
+
+def summarize(rows: List[Dict]) -> List[Dict]:
+    """
+    按组合汇总全部样本：帧率为总帧数 / 总编码耗时，画质取各样本的最差值（画质下限对每个样本都成立），
+    码率取平均
+    """
+    groups: Dict = {}
+    for r in rows:
+        groups.setdefault((r["preset"], r["crf"]), []).append(r)
+    out = []
+    for (preset, crf), rs in groups.items():
+        ok = [r for r in rs if "error" not in r]
+        if not ok:
+            out.append({"preset": preset, "crf": crf, "samples": 0, "errors": len(rs)})
+            continue
+        encode_sec = sum(r["encode_sec"] for r in ok)
+        ssims = [r["ssim"] for r in ok if r.get("ssim") is not None]
+        psnrs = [r["psnr"] for r in ok if r.get("psnr") is not None]
+        out.append({
+            "preset": preset,
+            "crf": crf,
+            "samples": len(ok),
+            "errors": len(rs) - len(ok),
+            "fps": round(sum(r["frames"] for r in ok) / encode_sec, 2) if encode_sec > 0 else 0.0,
+            "min_ssim": round(min(ssims), 5) if ssims else None,
+            "mean_ssim": round(sum(ssims) / len(ssims), 5) if ssims else None,
+            "min_psnr": round(min(psnrs), 2) if psnrs else None,
+            "kbps": round(sum(r["kbps"] for r in ok) / len(ok), 1),
+        })
+    return out
+
+
+def recommend(
+    rows: List[Dict], min_ssim: Optional[float] = DEFAULT_MIN_SSIM, min_psnr: Optional[float] = None
+) -> Dict:
+    """
+    推荐满足画质下限的组合中帧率最高的（帧率相近时取码率更低的）；
+    没有组合满足下限时返回画质最高的组合并标记 meets_floor=False
+    """
+    candidates = [c for c in summarize(rows) if c["samples"] > 0]
+    if not candidates:
+        return {"recommended": None, "candidates": [], "meets_floor": False}
+
+    def passes(c):
+        if min_ssim is not None and (c["min_ssim"] is None or c["min_ssim"] < min_ssim):
+            return False
+        if min_psnr is not None and (c["min_psnr"] is None or c["min_psnr"] < min_psnr):
+            return False
+        return True
+
+    passing = [c for c in candidates if passes(c)]
+    if passing:
+        # 与最快组合相差 2% 以内视为同速（测量误差），其中取码率最低的
+        top = max(c["fps"] for c in passing)
+        best = min((c for c in passing if c["fps"] >= top * 0.98), key=lambda c: c["kbps"])
+    else:
+        best = max(candidates, key=lambda c: (c["min_ssim"] or 0, c["min_psnr"] or 0))
+    current = load_profile()
+    current_crf = X264_DEFAULT_CRF if current["crf"] is None else current["crf"]
+    baseline = next((c for c in candidates if c["preset"] == current["preset"] and c["crf"] == current_crf), None)
+    report = {
+        "recommended": {"encoder": "libx264", "preset": best["preset"], "crf": best["crf"]},
+        "meets_floor": bool(passing),
+        "min_ssim": min_ssim,
+        "min_psnr": min_psnr,
+        "chosen": best,
+        "current": baseline,
+        "candidates": sorted(candidates, key=lambda c: -c["fps"]),
+    }
+    if baseline and baseline["fps"] > 0:
+        report["speedup_vs_current"] = round(best["fps"] / baseline["fps"], 3)
+    return report
@@ -0,0 +1,143 @@
+"""
+任务事件合并模块
+推送层按固定间隔输出事件：进度只保留每个对象的最新值，日志与逐文件结果各自合并为一帧（不丢弃），
+其他事件（如 done）不合并、不丢弃，先输出之前积累的事件再立即输出。
+订阅者队列（SubscriberQueue）有上限：消费慢的连接只会丢弃积压的日志与结果并收到 lagged 事件，内存不随批次规模增长
+"""
+import asyncio
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# 可合并的事件类型
+PROGRESS_EVENT = "progress"
+LOG_EVENT = "log"
+RESULT_EVENT = "result"
+# 合并后的帧：{"type": "logs", "msgs": [...]} / {"type": "results", "items": [...]}，多路复用时另带 job_id
+LOGS_EVENT = "logs"
+RESULTS_EVENT = "results"
+# 订阅者积压超过上限时代替被丢弃日志与结果的事件：{"type": "lagged", "results": n, "logs": m}，多路复用时另带 job_id
+LAGGED_EVENT = "lagged"
+# 每个订阅者最多缓存的日志与结果条数
+SUBSCRIBER_BUFFER = 1000
+
+
+def _result_item(event: Dict) -> Dict:
+    return {k: v for k, v in event.items() if k not in ("type", "job_id")}
+
+
+class EventCoalescer:
+    """按到达顺序积累事件，drain 时输出合并结果"""
+
+    def __init__(self):
+        # （帧类型, job_id）-> 待输出条目；单任务流的事件不带 job_id，键中为 None
+        self._batches: Dict[Tuple[str, Optional[str]], List] = {}
+        # 进度键（job_id, file）-> 最新进度事件；按首次出现顺序输出
+        self._progress: Dict[Tuple[Optional[str], Optional[object]], Dict] = {}
+        self._urgent: List[Dict] = []
+
+    @property
+    def empty(self) -> bool:
+        return not (self._batches or self._progress or self._urgent)
+
+    @property
+    def urgent(self) -> bool:
+        """是否有必须立即输出的事件"""
+        return bool(self._urgent)
+
+    def add(self, event: Dict) -> None:
+        ev_type = event.get("type")
+        job_id = event.get("job_id")
+        if ev_type == PROGRESS_EVENT:
+            self._progress[(job_id, event.get("file"))] = event
+        elif ev_type == LOG_EVENT:
+            self._batches.setdefault((LOGS_EVENT, job_id), []).append(event.get("msg", ""))
+        elif ev_type == RESULT_EVENT:
+            self._batches.setdefault((RESULTS_EVENT, job_id), []).append(_result_item(event))
+        else:
+            self._urgent.append(event)
+
+    def drain(self) -> List[Dict]:
+        """输出顺序：日志/结果帧、各进度最新值、不可合并事件（调用方在其到达后应立即 drain）"""
+        out: List[Dict] = []
+        for (frame_type, job_id), items in self._batches.items():
+            frame = {"type": frame_type, "msgs" if frame_type == LOGS_EVENT else "items": items}
+            if job_id is not None:
+                frame["job_id"] = job_id
+            out.append(frame)
+        out.extend(self._progress.values())
+        out.extend(self._urgent)
+        self._batches = {}
+        self._progress = {}
+        self._urgent = []
+        return out
+
+
+class SubscriberQueue:
+    """
+    有上限的订阅者事件队列，接口与 asyncio.Queue 的 put_nowait / get / get_nowait / empty 相同，只在事件循环内使用。
+    进度事件按（任务, 文件）只保留最新值；日志与结果最多缓存 maxsize 条，超出时丢弃已缓存的日志与结果，
+    在队尾放入 lagged 事件（按任务累计丢弃条数），订阅者可据此从任务库补读结果；状态、done 等事件不丢弃
+    """
+
+    def __init__(self, maxsize: int = SUBSCRIBER_BUFFER):
+        self.maxsize = max(1, maxsize)
+        # （事件类型, 事件）；进度与 lagged 条目的第二项为键，值分别在 _progress / _lagged 中
+        self._entries: Deque[Tuple[str, object]] = deque()
+        self._progress: Dict[Tuple[Optional[str], Optional[object]], Dict] = {}
+        self._lagged: Dict[Optional[str], Dict[str, int]] = {}
+        self._buffered = 0
+        self._ready = asyncio.Event()
+
+    def empty(self) -> bool:
+        return not self._entries
+
+    def qsize(self) -> int:
+        return len(self._entries)
+
+    def put_nowait(self, event: Dict) -> None:
+        ev_type = event.get("type")
+        if ev_type == PROGRESS_EVENT:
+            key = (event.get("job_id"), event.get("file"))
+            if key not in self._progress:
+                self._entries.append((ev_type, key))
+            self._progress[key] = event
+        else:
+            if ev_type in (LOG_EVENT, RESULT_EVENT):
+                if self._buffered >= self.maxsize:
+                    self._drop_buffered()
+                self._buffered += 1
+            self._entries.append((ev_type, event))
+        self._ready.set()
+
+    def _drop_buffered(self) -> None:
+        kept: Deque[Tuple[str, object]] = deque()
+        for ev_type, item in self._entries:
+            if ev_type in (LOG_EVENT, RESULT_EVENT):
+                lag = self._lagged.setdefault(item.get("job_id"), {"results": 0, "logs": 0})
+                lag["results" if ev_type == RESULT_EVENT else "logs"] += 1
+            elif ev_type != LAGGED_EVENT:
+                kept.append((ev_type, item))
+        kept.extend((LAGGED_EVENT, job_id) for job_id in self._lagged)
+        self._entries = kept
+        self._buffered = 0
+
+    def get_nowait(self) -> Dict:
+        if not self._entries:
+            raise asyncio.QueueEmpty
+        ev_type, item = self._entries.popleft()
+        if ev_type == PROGRESS_EVENT:
+            return self._progress.pop(item)
+        if ev_type == LAGGED_EVENT:
+            ev = {"type": LAGGED_EVENT, **self._lagged.pop(item)}
+            if item is not None:
+                ev["job_id"] = item
+            return ev
+        if ev_type in (LOG_EVENT, RESULT_EVENT):
+            self._buffered -= 1
+        return item
+
+    async def get(self) -> Dict:
+        while not self._entries:
+            self._ready.clear()
+            await self._ready.wait()
+        return self.get_nowait()
@@ -0,0 +1,172 @@
+"""
+ffmpeg 定位与能力探测模块
+按 环境变量 / 显式路径 → tools/ffmpeg 下的打包版本 → PATH 的顺序查找 ffmpeg（Windows 与 Linux 通用），
+ffprobe 优先取 ffmpeg 同目录下的版本；查找结果在进程内缓存，各处理器共用。
+ffmpeg 的版本、编码器、滤镜与硬件加速列表按可执行文件内容的 sha256 缓存到 cache 目录，
+同一个二进制只在首次使用时运行 -version / -encoders / -filters / -hwaccels
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+FFMPEG_ENV = "CHANNEL_VIDEO_FFMPEG_PATH"
+BUNDLED_DIR = Path(__file__).parent.parent.parent / "tools" / "ffmpeg"
+CAPABILITY_CACHE_PATH = str(Path(__file__).parent.parent.parent / "cache" / "ffmpeg_capabilities.json")
+
+# 规范化、水印与合并依赖的编码器与滤镜，缺少时在就绪检查中列出
+REQUIRED_ENCODERS = ("libx264", "aac")
+REQUIRED_FILTERS = ("scale", "pad", "overlay", "concat", "colorchannelmixer")
+
+_ENCODER_RE = re.compile(r"^ [VAS][A-Z.]{5} (\S+)")
+_FILTER_RE = re.compile(r"^ [A-Z.]{2,3} (\S+)\s+\S*->\S*")
+_VERSION_RE = re.compile(r"ffmpeg version (\S+)")
+
+_lock = threading.Lock()
+
+
+def _names(tool: str) -> tuple:
+    # Linux 下也接受 .exe 名称（替身或 wine 包装脚本），是否可用以可执行位为准
+    return (f"{tool}.exe",) if sys.platform == "win32" else (tool, f"{tool}.exe")
+
+
+def _usable(path: Path) -> bool:
+    return path.is_file() and (sys.platform == "win32" or os.access(path, os.X_OK))
+
+
+@lru_cache(maxsize=None)
+def find_ffmpeg(explicit: Optional[str] = None) -> str:
+    """
+    定位 ffmpeg：显式路径或环境变量 CHANNEL_VIDEO_FFMPEG_PATH 原样使用，
+    其次 tools/ffmpeg 下可执行的打包版本，再次 PATH；都没有时返回打包版本的路径（运行时报错）
+    """
+    explicit = explicit or os.environ.get(FFMPEG_ENV)
+    if explicit:
+        return explicit
+    for name in _names("ffmpeg"):
+        candidate = BUNDLED_DIR / name
+        if _usable(candidate):
+            return str(candidate)
+    return shutil.which("ffmpeg") or str(BUNDLED_DIR / "ffmpeg.exe")
+
+
+@lru_cache(maxsize=None)
+def find_ffprobe(ffmpeg_path: Optional[str] = None) -> str:
+    """定位 ffprobe：ffmpeg 同目录下的版本优先，其次 PATH；都没有时返回同目录下 ffprobe.exe 的路径"""
+    parent = Path(ffmpeg_path or find_ffmpeg()).parent
+    for name in _names("ffprobe"):
+        candidate = parent / name
+        if _usable(candidate):
+            return str(candidate)
+    return shutil.which("ffprobe") or str(parent / "ffprobe.exe")
+
+
+def binary_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _run_lines(ffmpeg_path: str, flag: str) -> List[str]:
+    out = subprocess.run(
+        [ffmpeg_path, "-hide_banner", flag], capture_output=True, text=True,
+        encoding="utf-8", errors="ignore", timeout=30,
+    )
+    return (out.stdout or "").splitlines()
+
+
+def fingerprint(ffmpeg_path: str) -> Dict:
+    """运行 ffmpeg 列出版本、编码器、滤镜与硬件加速方式"""
+    version_lines = _run_lines(ffmpeg_path, "-version")
+    m = _VERSION_RE.search(version_lines[0]) if version_lines else None
+    encoders = [m2.group(1) for m2 in map(_ENCODER_RE.match, _run_lines(ffmpeg_path, "-encoders")) if m2]
+    filters = [m2.group(1) for m2 in map(_FILTER_RE.match, _run_lines(ffmpeg_path, "-filters")) if m2]
+    hwaccels = []
+    lines = _run_lines(ffmpeg_path, "-hwaccels")
+    for i, line in enumerate(lines):
+        if line.startswith("Hardware acceleration methods"):
+            hwaccels = [x.strip() for x in lines[i + 1:] if x.strip()]
+            break
+    return {
+        "version": m.group(1) if m else "",
+        "version_line": version_lines[0] if version_lines else "",
+        "encoders": sorted(set(encoders)),
+        "filters": sorted(set(filters)),
+        "hwaccels": hwaccels,
+    }
+
+
+def _load_cache(path: str) -> Dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data.get("files"), dict) and isinstance(data.get("binaries"), dict):
+            return data
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {"files": {}, "binaries": {}}
+
+
+def _save_cache(path: str, data: Dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def probe_capabilities(ffmpeg_path: Optional[str] = None, cache_path: Optional[str] = None) -> Dict:
+    """
+    读取 ffmpeg 能力指纹：按二进制 sha256 命中缓存时不运行 ffmpeg；
+    文件大小与修改时间未变时沿用记录的哈希，不必每次启动读取整个二进制。
+    找不到或无法运行 ffmpeg 时返回 {"path": ..., "error": ...}（不写缓存）
+    """
+    path = ffmpeg_path or find_ffmpeg()
+    resolved = shutil.which(path) or path
+    cache_path = cache_path or CAPABILITY_CACHE_PATH
+    try:
+        st = os.stat(resolved)
+    except OSError:
+        return {"path": path, "error": "未找到 ffmpeg"}
+    key = os.path.abspath(resolved)
+    with _lock:
+        cache = _load_cache(cache_path)
+        ident = cache["files"].get(key)
+        if ident and ident.get("size") == st.st_size and ident.get("mtime_ns") == st.st_mtime_ns:
+            digest = ident["sha256"]
+        else:
+            digest = binary_hash(resolved)
+        caps = cache["binaries"].get(digest)
+        cached = caps is not None
+        if caps is None:
+            try:
+                caps = fingerprint(resolved)
+            except (OSError, subprocess.SubprocessError) as e:
+                return {"path": path, "sha256": digest, "error": f"无法运行 ffmpeg: {e}"}
+            cache["binaries"][digest] = caps
+        if not cached or ident is None or ident.get("sha256") != digest or ident.get("mtime_ns") != st.st_mtime_ns:
+            cache["files"][key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest}
+            try:
+                _save_cache(cache_path, cache)
+            except OSError:
+                pass
+    return {**caps, "path": path, "sha256": digest, "cached": cached}
+
+
+def missing_requirements(caps: Dict) -> List[str]:
+    """能力指纹中缺少的必需编码器与滤镜；探测失败时为空（错误另行报告）"""
+    if caps.get("error"):
+        return []
+    encoders, filters = set(caps.get("encoders", ())), set(caps.get("filters", ()))
+    return [f"encoder:{e}" for e in REQUIRED_ENCODERS if e not in encoders] + [
+        f"filter:{f}" for f in REQUIRED_FILTERS if f not in filters
+    ]
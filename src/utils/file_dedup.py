@@ -0,0 +1,169 @@
+"""
+批处理输入去重模块
+按文件大小分组，再对头/中/尾三段做内存映射局部哈希，局部哈希仍相同且文件较大时才计算全量哈希；
+同内容的输入只处理一次，重复项通过硬链接或复制获得输出
+"""
+import hashlib
+import mmap
+import os
+import shutil
+from typing import Dict, List, Optional
+
+# 局部哈希每段字节数；不超过 3 段的小文件直接全量哈希
+PARTIAL_CHUNK = 64 * 1024
+# 全量哈希时每次从映射中读取的字节数
+FULL_HASH_BLOCK = 8 * 1024 * 1024
+
+
+def _partial_digest(path: str, size: int) -> str:
+    h = hashlib.sha256()
+    h.update(str(size).encode("ascii"))
+    if size == 0:
+        return h.hexdigest()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        if size <= 3 * PARTIAL_CHUNK:
+            h.update(m[:])
+        else:
+            mid = (size - PARTIAL_CHUNK) // 2
+            h.update(m[:PARTIAL_CHUNK])
+            h.update(m[mid:mid + PARTIAL_CHUNK])
+            h.update(m[size - PARTIAL_CHUNK:])
+    return h.hexdigest()
+
+
+def full_digest(path: str) -> str:
+    """整文件 SHA256（内存映射分块读取）"""
+    h = hashlib.sha256()
+    size = os.path.getsize(path)
+    if size == 0:
+        return h.hexdigest()
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        for start in range(0, size, FULL_HASH_BLOCK):
+            h.update(m[start:start + FULL_HASH_BLOCK])
+    return h.hexdigest()
+
+
+def find_duplicates(paths: List[str]) -> Dict[str, str]:
+    """
+    查找内容重复的输入，返回 {重复路径: 首次出现的路径}。
+    无法读取的文件不参与去重，交由后续处理报错。
+    """
+    by_size: Dict[int, List[str]] = {}
+    duplicates: Dict[str, str] = {}
+    first_of: Dict[str, str] = {}
+    for p in paths:
+        ap = os.path.abspath(p)
+        if ap in first_of:
+            # 同一文件的不同写法视为重复；完全相同的路径在结果中本就只占一项
+            if p != first_of[ap]:
+                duplicates[p] = first_of[ap]
+            continue
+        first_of[ap] = p
+        try:
+            size = os.path.getsize(p)
+        except OSError:
+            continue
+        by_size.setdefault(size, []).append(p)
+    for size, group in by_size.items():
+        if len(group) < 2:
+            continue
+        by_partial: Dict[str, List[str]] = {}
+        for p in group:
+            try:
+                by_partial.setdefault(_partial_digest(p, size), []).append(p)
+            except (OSError, ValueError):
+                continue
+        for candidates in by_partial.values():
+            if len(candidates) < 2:
+                continue
+            if size <= 3 * PARTIAL_CHUNK:
+                # 局部哈希已覆盖整个文件，无需再算全量哈希
+                groups = [candidates]
+            else:
+                by_full: Dict[str, List[str]] = {}
+                for p in candidates:
+                    try:
+                        by_full.setdefault(full_digest(p), []).append(p)
+                    except (OSError, ValueError):
+                        continue
+                groups = list(by_full.values())
+            for same in groups:
+                for p in same[1:]:
+                    duplicates[p] = same[0]
+    return duplicates
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """写时复制克隆（Linux FICLONE，btrfs/xfs 等支持），不支持时返回 False"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    ficlone = 0x40049409
+    try:
+        with open(src, "rb") as fs, open(dst, "wb") as fd:
+            fcntl.ioctl(fd.fileno(), ficlone, fs.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+
+def link_or_copy(src: str, dst: str) -> str:
+    """
+    将 src 物化到 dst：优先硬链接，其次写时复制克隆，都不支持时复制；
+    返回 "linked" / "reflinked" / "copied" / "same"
+    """
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return "same"
+    os.makedirs(os.path.dirname(dst) or ".", exist_ok=True)
+    if os.path.lexists(dst):
+        os.remove(dst)
+    try:
+        os.link(src, dst)
+        return "linked"
+    except OSError:
+        pass
+    if _reflink(src, dst):
+        return "reflinked"
+    shutil.copy2(src, dst)
+    return "copied"
+
+
+def break_hardlink(path: str) -> None:
+    """
+    写入前若目标是多处共享的硬链接则先删除，避免 ffmpeg -y / 复制原地截断时
+    连带改写缓存对象或其他重复项的输出
+    """
+    try:
+        if os.stat(path).st_nlink > 1:
+            os.remove(path)
+    except OSError:
+        pass
+
+
+class BatchDeduplicator:
+    """批处理去重：重复输入复用首个同内容输入的成功输出"""
+
+    def __init__(self, input_paths: List[str], enabled: bool = True):
+        self.duplicates = find_duplicates(input_paths) if enabled else {}
+        self._outputs: Dict[str, str] = {}
+
+    def record(self, input_path: str, output_path: str) -> None:
+        """记录某输入处理成功后的输出路径"""
+        self._outputs[input_path] = output_path
+
+    def reuse(self, input_path: str, output_path: str) -> Optional[str]:
+        """若 input_path 是已成功处理输入的重复项，则物化输出并返回方式，否则返回 None"""
+        canonical = self.duplicates.get(input_path)
+        src = self._outputs.get(canonical) if canonical else None
+        if not src or not os.path.exists(src):
+            return None
+        try:
+            method = link_or_copy(src, output_path)
+        except OSError:
+            return None
+        self._outputs[input_path] = output_path
+        return method
@@ -0,0 +1,815 @@
+"""
+批处理任务队列模块
+任务与子任务（逐文件）持久化到 SQLite，交互/批量两条通道各有固定数量的工作协程按提交顺序执行；
+交互任务运行期间挂起批量任务的 ffmpeg 子进程，结束后自动恢复；整批任务可由用户暂停/继续。
+客户端断开不影响执行，结果可随时按任务 ID 查询，进程重启后未完成的任务自动续跑
+"""
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from . import metrics, tracing
+from .async_ffmpeg import encode_spans
+from .event_coalescer import SUBSCRIBER_BUFFER, SubscriberQueue
+from .makespan import ORDER_FIFO, order_tasks, schedule_report, simulate
+from .process_control import PAUSE_PREEMPT, PAUSE_USER, ProcessControl, current_control
+from .throughput_model import ThroughputModel
+
+# 任务状态
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_PAUSED = "paused"
+TERMINAL_STATES = (JOB_DONE, JOB_FAILED)
+
+# 优先级通道：交互任务（如单个合并）可抢占批量任务
+LANE_INTERACTIVE = "interactive"
+LANE_BULK = "bulk"
+LANES = (LANE_INTERACTIVE, LANE_BULK)
+
+_JOB_COLUMNS = (
+    "id", "op", "params", "status", "created_at", "started_at", "finished_at",
+    "total", "ok_count", "fail_count", "error", "lane",
+)
+
+
+class JobStore:
+    """
+    SQLite 任务存储，单连接 + 锁，供多线程共享。
+    子任务结果与状态变更交给单个写线程按提交顺序分批写入（事件循环不等待提交）；
+    读取前先等待已提交的写入完成，读到的总是最新状态
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._lock = threading.Lock()
+        # 写队列：待执行的写入函数，_queued / _written 为已提交 / 已写入的个数
+        self._writes: List[Tuple[Callable, Tuple]] = []
+        self._queued = 0
+        self._written = 0
+        self._write_cond = threading.Condition()
+        # 各任务的子任务完成序号（在内存中分配，写入可延后）
+        self._seq: Dict[str, int] = {}
+        with self._lock:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                "id TEXT PRIMARY KEY, op TEXT, params TEXT, status TEXT, "
+                "created_at REAL, started_at REAL, finished_at REAL, "
+                "total INTEGER, ok_count INTEGER DEFAULT 0, fail_count INTEGER DEFAULT 0, error TEXT, "
+                "last_seq INTEGER DEFAULT 0, lane TEXT DEFAULT 'bulk')"
+            )
+            # seq：子任务完成序号（同一任务内递增），用于按完成顺序分页读取结果
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS tasks ("
+                "job_id TEXT, idx INTEGER, input_path TEXT, status TEXT, "
+                "ok INTEGER, action TEXT, error TEXT, finished_at REAL, seq INTEGER, "
+                "PRIMARY KEY (job_id, idx))"
+            )
+            self._add_column("jobs", "last_seq", "INTEGER DEFAULT 0")
+            self._add_column("tasks", "seq", "INTEGER")
+            self._add_column("jobs", "lane", "TEXT DEFAULT 'bulk'")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_seq ON tasks (job_id, seq)")
+        threading.Thread(target=self._write_loop, name="job-store-writer", daemon=True).start()
+
+    def _add_column(self, table: str, column: str, decl: str) -> None:
+        """兼容旧版任务库：缺少的列补上"""
+        cols = {r[1] for r in self._conn.execute(f"PRAGMA table_info({table})")}
+        if column not in cols:
+            self._conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+    def _execute(self, sql: str, args: Tuple = ()) -> sqlite3.Cursor:
+        """读取：先等待已提交的写入完成"""
+        self.flush()
+        with self._lock:
+            return self._conn.execute(sql, args)
+
+    def _submit(self, fn: Callable, *args) -> None:
+        """提交写入，由写线程执行"""
+        with self._write_cond:
+            self._writes.append((fn, args))
+            self._queued += 1
+            self._write_cond.notify_all()
+
+    def flush(self) -> None:
+        """等待此前提交的写入全部完成"""
+        with self._write_cond:
+            target = self._queued
+            while self._written < target:
+                self._write_cond.wait()
+
+    def _write_loop(self) -> None:
+        while True:
+            with self._write_cond:
+                while not self._writes:
+                    self._write_cond.wait()
+                batch, self._writes = self._writes, []
+            try:
+                with self._lock:
+                    self._write_batch(batch)
+            finally:
+                with self._write_cond:
+                    self._written += len(batch)
+                    self._write_cond.notify_all()
+
+    def _write_batch(self, batch: List[Tuple[Callable, Tuple]]) -> None:
+        """同一事务内执行一批写入；出错时回滚并逐个重试，跳过仍失败的写入"""
+        try:
+            self._conn.execute("BEGIN")
+            for fn, args in batch:
+                fn(*args)
+            self._conn.execute("COMMIT")
+            return
+        except sqlite3.Error:
+            self._conn.execute("ROLLBACK")
+        for fn, args in batch:
+            try:
+                self._conn.execute("BEGIN")
+                fn(*args)
+                self._conn.execute("COMMIT")
+            except sqlite3.Error:
+                self._conn.execute("ROLLBACK")
+
+    def create_job(self, op: str, params: Dict, inputs: List[str], lane: str = LANE_BULK) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, op, params, status, created_at, total, lane) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (job_id, op, json.dumps(params, ensure_ascii=False), JOB_QUEUED, time.time(), len(inputs), lane),
+                )
+                self._conn.executemany(
+                    "INSERT INTO tasks (job_id, idx, input_path, status) VALUES (?, ?, ?, ?)",
+                    [(job_id, i, p, JOB_QUEUED) for i, p in enumerate(inputs, 1)],
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict]:
+        row = self._execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return self._job_row(row) if row else None
+
+    def list_jobs(self, limit: int = 50) -> List[Dict]:
+        rows = self._execute(
+            f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+        return [self._job_row(r) for r in rows]
+
+    @staticmethod
+    def _job_row(row) -> Dict:
+        job = dict(zip(_JOB_COLUMNS, row))
+        job["params"] = json.loads(job["params"] or "{}")
+        job["lane"] = job["lane"] or LANE_BULK
+        return job
+
+    def unfinished_jobs(self) -> List[Tuple[str, str]]:
+        """待续跑的任务（id, 通道）；用户暂停的任务需手动继续"""
+        rows = self._execute(
+            "SELECT id, lane FROM jobs WHERE status IN (?, ?) ORDER BY created_at", (JOB_QUEUED, JOB_RUNNING)
+        ).fetchall()
+        return [(r[0], r[1] or LANE_BULK) for r in rows]
+
+    def set_status(self, job_id: str, status: str) -> None:
+        self._submit(self._conn.execute, "UPDATE jobs SET status=? WHERE id=?", (status, job_id))
+
+    def mark_running(self, job_id: str) -> None:
+        self._submit(
+            self._conn.execute,
+            "UPDATE jobs SET status=?, started_at=COALESCE(started_at, ?) WHERE id=?",
+            (JOB_RUNNING, time.time(), job_id),
+        )
+
+    def count_by_state(self) -> List[Tuple[str, str, int]]:
+        """未结束任务按（操作, 状态）计数"""
+        rows = self._execute(
+            "SELECT op, status, COUNT(*) FROM jobs WHERE status IN (?, ?, ?) GROUP BY op, status",
+            (JOB_QUEUED, JOB_RUNNING, JOB_PAUSED),
+        ).fetchall()
+        return [(r[0], r[1], int(r[2])) for r in rows]
+
+    def mark_finished(self, job_id: str, status: str, error: str = "") -> None:
+        with self._write_cond:
+            self._seq.pop(job_id, None)
+        self._submit(
+            self._conn.execute,
+            "UPDATE jobs SET status=?, finished_at=?, error=? WHERE id=?",
+            (status, time.time(), error, job_id),
+        )
+
+    def pending_tasks(self, job_id: str) -> List[Tuple[int, str]]:
+        rows = self._execute(
+            "SELECT idx, input_path FROM tasks WHERE job_id=? AND status!=? ORDER BY idx", (job_id, JOB_DONE)
+        ).fetchall()
+        return [(r[0], r[1]) for r in rows]
+
+    def record_task(self, job_id: str, idx: int, ok: bool, action: str, error: str) -> int:
+        """记录子任务结果（由写线程写入），返回其完成序号"""
+        with self._write_cond:
+            known = job_id in self._seq
+        if not known:
+            # 每个任务首次记录时从库中读取已有序号（续跑的任务接着编号）
+            last = self.last_seq(job_id)
+            with self._write_cond:
+                self._seq.setdefault(job_id, last)
+        with self._write_cond:
+            self._seq[job_id] += 1
+            seq = self._seq[job_id]
+        self._submit(self._write_task, job_id, idx, ok, action, error, time.time(), seq)
+        return seq
+
+    def _write_task(self, job_id: str, idx: int, ok: bool, action: str, error: str, finished_at: float, seq: int):
+        prev = self._conn.execute("SELECT status, ok FROM tasks WHERE job_id=? AND idx=?", (job_id, idx)).fetchone()
+        # 续跑时同一子任务可能重复记录，先扣除旧结果再计数
+        ok_delta, fail_delta = (1, 0) if ok else (0, 1)
+        if prev and prev[0] == JOB_DONE:
+            ok_delta -= 1 if prev[1] else 0
+            fail_delta -= 0 if prev[1] else 1
+        self._conn.execute(
+            "UPDATE jobs SET ok_count=ok_count+?, fail_count=fail_count+?, last_seq=MAX(last_seq, ?) WHERE id=?",
+            (ok_delta, fail_delta, seq, job_id),
+        )
+        self._conn.execute(
+            "UPDATE tasks SET status=?, ok=?, action=?, error=?, finished_at=?, seq=? WHERE job_id=? AND idx=?",
+            (JOB_DONE, int(ok), action, error, finished_at, seq, job_id, idx),
+        )
+
+    def last_seq(self, job_id: str) -> int:
+        row = self._execute("SELECT last_seq FROM jobs WHERE id=?", (job_id,)).fetchone()
+        return (row[0] or 0) if row else 0
+
+    def iter_task_results(
+        self, job_id: str, after_seq: int = 0, until_seq: Optional[int] = None, page_size: int = 500
+    ) -> Iterator[Dict]:
+        """
+        按完成顺序分页产出已完成子任务的结果记录（seq, idx, path, ok, action, error），
+        每次只取一页，内存占用与任务规模无关
+        """
+        while True:
+            sql = (
+                "SELECT seq, idx, input_path, ok, action, error FROM tasks "
+                "WHERE job_id=? AND status=? AND seq>?"
+            )
+            args: Tuple = (job_id, JOB_DONE, after_seq)
+            if until_seq is not None:
+                sql += " AND seq<=?"
+                args += (until_seq,)
+            rows = self._execute(sql + " ORDER BY seq LIMIT ?", args + (page_size,)).fetchall()
+            for seq, idx, path, ok, action, error in rows:
+                yield result_record(seq, idx, path, bool(ok), action or "", error or "")
+            if len(rows) < page_size:
+                return
+            after_seq = rows[-1][0]
+
+
+def result_record(seq: int, idx: int, path: str, ok: bool, action: str, error: str) -> Dict:
+    return {"seq": seq, "idx": idx, "path": path, "ok": ok, "action": action, "error": error}
+
+
+class JobContext:
+    """传给执行函数的上下文：待处理子任务、事件推送与结果记录"""
+
+    def __init__(self, queue: "JobQueue", job: Dict, tasks: List[Tuple[int, str]], control: ProcessControl):
+        self._queue = queue
+        self.control = control
+        self.job = job
+        self.job_id = job["id"]
+        self.params = job["params"]
+        self.total = job["total"]
+        self.tasks = tasks
+        self._paths = dict(tasks)
+        self._last_progress: Optional[float] = None
+        # 并行执行时按已完成数与进行中子任务的进度汇总总进度；续跑的任务从已完成数开始
+        self._done = self.total - len(tasks)
+        self._inflight: Dict[int, float] = {}
+        self._finished: Set[int] = set()
+        # plan() 逐批提供：已探测子任务的媒体时长（总进度按时长加权）、输入尺寸与按吞吐模型预测的编码秒数；
+        # 尚未探测的子任务按已探测的平均时长计
+        self._target: Optional[Tuple[int, int]] = None
+        self._media: Dict[int, Tuple[float, Optional[Tuple[int, int]]]] = {}
+        self._media_sum = 0.0
+        self._finished_media = 0.0
+        self._finished_unknown = 0
+        self._predicted: Dict[int, float] = {}
+        # 已完成子任务的预测与实际编码秒数，用于校正剩余时间
+        self._predicted_done = 0.0
+        self._actual_done = 0.0
+        self._processed: Set[int] = set()
+        # 估算剩余时间所用的并发数，每次重新估算时读取（自适应控制器会调整）
+        self._concurrency: Callable[[], int] = lambda: 1
+        self._finished_event = asyncio.Event()
+        self._eta: Optional[float] = None
+        self._eta_at = 0.0
+        # 任务结束时执行的清理（取消后台协程、释放资源）
+        self._cleanups: List[Callable[[], None]] = []
+
+    async def checkpoint(self) -> None:
+        """子任务之间调用：任务被暂停或抢占时在此等待恢复"""
+        await self.control.wait_runnable()
+
+    def emit(self, event_type: str, **data) -> None:
+        self._queue.publish(self.job_id, {"type": event_type, **data})
+
+    def log(self, msg: str) -> None:
+        self.emit("log", msg=msg)
+
+    def progress(self, value: float) -> None:
+        value = round(value, 1)
+        # ffmpeg 每行输出都会回调，取整后未变化的进度不再推送
+        if value == self._last_progress:
+            return
+        self._last_progress = value
+        eta = self._eta_sec()
+        if eta is None:
+            self.emit("progress", value=value)
+        else:
+            self.emit("progress", value=value, eta_sec=eta)
+
+    def file_progress(self, idx: int, pct: float) -> None:
+        """子任务进度回调：按全部子任务汇总为总进度"""
+        self._inflight[idx] = pct
+        self._emit_overall()
+
+    def plan(self, infos: Dict[int, Optional[Dict]], target: Optional[Tuple[int, int]] = None) -> None:
+        """
+        提供部分或全部子任务的探测信息（时长、宽高；合并为各段时长之和）与目标尺寸（与输入同尺寸时为 None）：
+        总进度改按媒体时长加权，并按吞吐模型预测剩余时间。可分批多次调用，每次只处理新增的子任务
+        """
+        self._target = target
+        model = self._queue.throughput
+        for idx, info in infos.items():
+            if idx in self._media or idx not in self._paths or not info or info.get("duration", 0) <= 0:
+                continue
+            size = (info["width"], info["height"]) if info.get("width") else None
+            self._media[idx] = (info["duration"], size)
+            self._media_sum += info["duration"]
+            if idx in self._finished:
+                self._finished_media += info["duration"]
+                self._finished_unknown -= 1
+            if model is not None:
+                self._predicted[idx] = model.predict(self.job["op"], size, target, info["duration"])
+
+    @property
+    def finished_count(self) -> int:
+        """本次运行中已完成的子任务数"""
+        return len(self._finished)
+
+    async def wait_finished(self, n: int) -> None:
+        """等待本次运行中已完成的子任务数达到 n（或全部完成）"""
+        n = min(n, len(self.tasks))
+        while len(self._finished) < n:
+            self._finished_event.clear()
+            await self._finished_event.wait()
+
+    def background(self, coro: Awaitable) -> "asyncio.Future":
+        """与子任务同时运行的辅助协程（如边编码边探测），任务结束时取消"""
+        fut = asyncio.ensure_future(coro)
+        self._cleanups.append(fut.cancel)
+        return fut
+
+    def on_close(self, fn: Callable[[], None]) -> None:
+        """登记任务结束时的清理函数"""
+        self._cleanups.append(fn)
+
+    def close(self) -> None:
+        while self._cleanups:
+            try:
+                self._cleanups.pop()()
+            except Exception:
+                pass
+
+    def _emit_overall(self) -> None:
+        if not self.total:
+            return
+        if not self._media:
+            self.progress((self._done * 100 + sum(self._inflight.values())) / self.total)
+            return
+        # 续跑前已完成与尚未探测的子任务时长未知，按平均时长计
+        mean = self._media_sum / len(self._media)
+        prior = (self._done - len(self._finished)) * mean
+        total = prior + self._media_sum + (len(self.tasks) - len(self._media)) * mean
+        done = prior + self._finished_media + self._finished_unknown * mean
+        running = sum(
+            (self._media[i][0] if i in self._media else mean) * pct / 100 for i, pct in self._inflight.items()
+        )
+        value = min(100.0, (done + running) * 100 / total) if total > 0 else 0.0
+        # 分批探测到新的时长后权重会变化，估算值可能略降；总进度不回退
+        self.progress(max(value, self._last_progress or 0.0))
+
+    def _eta_sec(self) -> Optional[float]:
+        """
+        剩余时间：未完成子任务的预测编码秒数（扣除已完成的百分比）按当前并发数模拟完工时间，
+        并按已完成子任务的实际 / 预测耗时之比校正；每秒最多重新计算一次（大批次时不随每个结果重算）
+        """
+        if not self._predicted:
+            return None
+        if len(self._finished) >= len(self.tasks):
+            return 0.0
+        now = time.monotonic()
+        if self._eta is not None and now - self._eta_at < 1.0:
+            return self._eta
+        scale = 1.0
+        if self._predicted_done > 0:
+            scale = min(5.0, max(0.2, self._actual_done / self._predicted_done))
+        remaining = [
+            sec * scale * (1 - self._inflight.get(idx, 0) / 100)
+            for idx, sec in self._predicted.items() if idx not in self._finished
+        ]
+        unknown = [idx for idx, _ in self.tasks if idx not in self._media and idx not in self._finished]
+        if unknown:
+            # 尚未探测的文件按平均时长与吞吐模型估算
+            mean = self._media_sum / len(self._media)
+            sec = self._queue.throughput.predict(self.job["op"], None, self._target, mean) * scale
+            remaining.extend(sec * (1 - self._inflight.get(idx, 0) / 100) for idx in unknown)
+        self._eta = round(simulate(sorted(remaining, reverse=True), max(1, self._concurrency()))[0], 1)
+        self._eta_at = now
+        return self._eta
+
+    def _observe(self, idx: int, encode_sec: float) -> None:
+        """子任务实际编码完成后：记入吞吐模型，并累计预测 / 实际耗时用于校正剩余时间"""
+        if idx not in self._processed or encode_sec <= 0 or idx not in self._media:
+            return
+        if idx in self._predicted:
+            self._predicted_done += self._predicted[idx]
+            self._actual_done += encode_sec
+        model = self._queue.throughput
+        if model is not None:
+            media_sec, size = self._media[idx]
+            model.observe(self.job["op"], size, self._target, media_sec, encode_sec)
+
+    async def run_tasks(
+        self,
+        fn: Callable[[int, str], Awaitable[None]],
+        concurrency: int = 1,
+        defer: Iterable[str] = (),
+        costs: Optional[Dict[int, float]] = None,
+        order: str = ORDER_FIFO,
+        live_concurrency: Optional[Callable[[], int]] = None,
+    ) -> None:
+        """
+        并行执行子任务 fn(idx, path)，同时进行的不超过 concurrency 个；每个子任务启动前检查暂停。
+        defer 中的输入放到其余子任务全部完成后执行（重复文件需复用先完成的输出）；
+        提供 costs（子任务编号 -> 估算代价）时按 order（fifo / lpt / spt）派发。
+        live_concurrency 返回实际同时编码的文件数（默认为 concurrency），剩余时间按它模拟。
+        多个子任务时结束后推送 schedule 事件：实际完工时间及按输入顺序派发的模拟完工时间
+        """
+        defer = set(defer)
+
+        def split(tasks):
+            return [t for t in tasks if t[1] not in defer] + [t for t in tasks if t[1] in defer]
+
+        fifo = split(self.tasks)
+        dispatched = split(order_tasks(self.tasks, costs, order)) if costs else fifo
+        n_first = sum(1 for t in fifo if t[1] not in defer)
+        spans: Dict[int, List[Tuple[float, float]]] = {}
+        started = time.monotonic()
+        limit = max(1, concurrency)
+        self._concurrency = (lambda: min(limit, live_concurrency())) if live_concurrency else (lambda: limit)
+        for group in (dispatched[:n_first], dispatched[n_first:]):
+            await self._run_group(group, fn, max(1, concurrency), spans)
+        if len(self.tasks) > 1:
+            report = schedule_report(
+                order if costs else ORDER_FIFO, [i for i, _ in dispatched], [i for i, _ in fifo],
+                spans, time.monotonic() - started,
+            )
+            self.emit("schedule", **report)
+            self.log(
+                f"调度 {report['order'].upper()}：实际完工 {report['makespan_sec']} 秒；按实测耗时模拟，"
+                f"当前顺序 {report['simulated_makespan_sec']} 秒，按输入顺序 {report['naive_makespan_sec']} 秒"
+            )
+
+    async def _run_group(self, group, fn, concurrency: int, spans: Dict[int, List[Tuple[float, float]]]) -> None:
+        sem = asyncio.Semaphore(concurrency)
+        pending: Set[asyncio.Future] = set()
+
+        async def timed(idx, path):
+            # 每个子任务在独立的上下文副本中运行，编码时段只记到本子任务
+            spans[idx] = []
+            encode_spans.set(spans[idx])
+            tracing.set_lane(idx, f"[{idx}] {os.path.basename(path)}")
+            with tracing.span("file", "task", idx=idx):
+                await fn(idx, path)
+            self._observe(idx, sum(e - s for s, e in spans[idx]))
+
+        try:
+            for idx, path in group:
+                await sem.acquire()
+                await self.checkpoint()
+                fut = asyncio.ensure_future(timed(idx, path))
+                pending.add(fut)
+                fut.add_done_callback(lambda f: (sem.release(), pending.discard(f)))
+            if pending:
+                await asyncio.gather(*pending)
+        finally:
+            for fut in pending:
+                fut.cancel()
+
+    def record(self, idx: int, ok: bool, action: str, error: str = "") -> None:
+        """记录子任务结果并推送 result 事件"""
+        error = error or ""
+        seq = self._queue.store.record_task(self.job_id, idx, ok, action, error)
+        self._inflight.pop(idx, None)
+        self._done += 1
+        self._finished.add(idx)
+        if idx in self._media:
+            self._finished_media += self._media[idx][0]
+        else:
+            self._finished_unknown += 1
+        if ok and action == "processed":
+            self._processed.add(idx)
+        self._finished_event.set()
+        op = self.job["op"]
+        metrics.TASKS.inc(op=op, action=action, ok=str(bool(ok)).lower())
+        if not ok:
+            metrics.FAILURES.inc(op=op, reason=metrics.failure_reason(action, error))
+        self._emit_overall()
+        self.emit("result", **result_record(seq, idx, self._paths.get(idx, ""), ok, action, error))
+
+
+# 执行函数：async runner(context)，逐个子任务调用 context.record 记录结果
+JobRunner = Callable[[JobContext], Awaitable[None]]
+
+
+class JobQueue:
+    """
+    基于 asyncio 的任务队列：交互/批量两条通道各有固定数量的工作协程，通道内按提交顺序执行；
+    事件订阅者为有上限的 SubscriberQueue，任务与订阅者共用同一事件循环，不创建线程
+    """
+
+    def __init__(
+        self,
+        store: JobStore,
+        max_workers: int = 2,
+        interactive_workers: int = 1,
+        trace_dir: Optional[str] = None,
+        trace_all: bool = False,
+        throughput: Optional[ThroughputModel] = None,
+        subscriber_buffer: int = SUBSCRIBER_BUFFER,
+    ):
+        self.store = store
+        # 每个订阅者最多积压的日志与结果条数，超出时改发 lagged 事件
+        self.subscriber_buffer = subscriber_buffer
+        # 吞吐模型：按时长加权的总进度与剩余时间估算，任务结束后保存本次的实测吞吐
+        self.throughput = throughput
+        # 时间线追踪：参数 trace 为真（或 trace_all）的任务结束后在 trace_dir 保存 Chrome trace JSON
+        self.trace_dir = trace_dir
+        self.trace_all = trace_all
+        self.max_workers = max(1, max_workers)
+        self.interactive_workers = max(1, interactive_workers)
+        self._runners: Dict[str, JobRunner] = {}
+        self._pending: Dict[str, "asyncio.Queue[str]"] = {}
+        self._workers: List[asyncio.Task] = []
+        # 运行中任务的进程控制（job_id -> ProcessControl）
+        self._controls: Dict[str, ProcessControl] = {}
+        self._interactive_running = 0
+        self._subscribers: Dict[str, List[SubscriberQueue]] = {}
+        # 订阅全部任务的队列（多路复用连接），收到的事件带 job_id
+        self._global_subscribers: List[SubscriberQueue] = []
+
+    def register(self, op: str, runner: JobRunner) -> None:
+        self._runners[op] = runner
+
+    def trace_path(self, job_id: str) -> Optional[str]:
+        if not self.trace_dir:
+            return None
+        return os.path.join(self.trace_dir, f"{job_id}.json")
+
+    def start(self) -> None:
+        """在事件循环内启动工作协程，并把上次未完成的任务重新入队（已完成的子任务不再执行）"""
+        if self._workers:
+            return
+        self._pending = {lane: asyncio.Queue() for lane in LANES}
+        for job_id, lane in self.store.unfinished_jobs():
+            self._pending[lane if lane in LANES else LANE_BULK].put_nowait(job_id)
+        counts = {LANE_INTERACTIVE: self.interactive_workers, LANE_BULK: self.max_workers}
+        for lane, n in counts.items():
+            for i in range(n):
+                self._workers.append(asyncio.create_task(self._worker(lane), name=f"job-worker-{lane}-{i}"))
+
+    async def stop(self) -> None:
+        """取消工作协程；执行中的任务保持 running 状态（用户暂停的保持 paused），下次启动时续跑"""
+        # 先恢复被暂停或抢占挂起的 ffmpeg，取消时被终止的子进程不会停留在挂起状态；取消前不会再让出事件循环
+        for control in self._controls.values():
+            control.resume_all()
+        for t in self._workers:
+            t.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await asyncio.to_thread(self.store.flush)
+
+    def submit(self, op: str, params: Dict, inputs: List[str], lane: str = LANE_BULK) -> str:
+        if op not in self._runners:
+            raise ValueError(f"未知操作类型: {op}")
+        if lane not in LANES:
+            raise ValueError(f"未知优先级通道: {lane}")
+        if not self._pending:
+            raise RuntimeError("任务队列未启动")
+        job_id = self.store.create_job(op, params, inputs, lane)
+        self._pending[lane].put_nowait(job_id)
+        self.publish(job_id, self.status_event(self.store.get_job(job_id)))
+        return job_id
+
+    def queued_count(self) -> int:
+        return sum(q.qsize() for q in self._pending.values())
+
+    # ---------- 暂停 / 继续 ----------
+    def pause(self, job_id: str) -> bool:
+        """暂停整批任务：运行中的挂起子进程并停在当前文件，排队中的出队时跳过；已结束的返回 False"""
+        job = self.store.get_job(job_id)
+        if not job or job["status"] in TERMINAL_STATES:
+            return False
+        control = self._controls.get(job_id)
+        if control is not None:
+            control.pause(PAUSE_USER)
+        self.store.set_status(job_id, JOB_PAUSED)
+        self.publish(job_id, self.status_event(self.store.get_job(job_id)))
+        return True
+
+    def resume(self, job_id: str) -> bool:
+        """继续被用户暂停的任务；不在运行中的（如重启前暂停的）重新入队"""
+        job = self.store.get_job(job_id)
+        if not job or job["status"] != JOB_PAUSED:
+            return False
+        control = self._controls.get(job_id)
+        if control is not None:
+            self.store.set_status(job_id, JOB_RUNNING)
+            control.resume(PAUSE_USER)
+        else:
+            self.store.set_status(job_id, JOB_QUEUED)
+            self._pending[job["lane"]].put_nowait(job_id)
+        self.publish(job_id, self.status_event(self.store.get_job(job_id)))
+        return True
+
+    def _preempt_bulk(self) -> None:
+        for control in self._controls.values():
+            if not control.interactive:
+                control.pause(PAUSE_PREEMPT)
+
+    def _release_bulk(self) -> None:
+        for control in self._controls.values():
+            if not control.interactive:
+                control.resume(PAUSE_PREEMPT)
+
+    # ---------- 事件订阅 ----------
+    def subscribe(self, job_id: str) -> SubscriberQueue:
+        """订阅任务事件；任务已结束时立即收到 done 事件"""
+        q = SubscriberQueue(self.subscriber_buffer)
+        job = self.store.get_job(job_id)
+        if job and job["status"] in TERMINAL_STATES:
+            q.put_nowait(self.done_event(job))
+        else:
+            self._subscribers.setdefault(job_id, []).append(q)
+        return q
+
+    def subscribe_all(self) -> SubscriberQueue:
+        """订阅所有任务的事件（每个事件带 job_id）"""
+        q = SubscriberQueue(self.subscriber_buffer)
+        self._global_subscribers.append(q)
+        return q
+
+    def unsubscribe_all(self, q: SubscriberQueue) -> None:
+        if q in self._global_subscribers:
+            self._global_subscribers.remove(q)
+
+    def snapshot_event(self, job_id: str) -> Optional[Dict]:
+        """任务当前状态：已结束时为 done 事件，否则为 job 状态事件；任务不存在时返回 None"""
+        job = self.store.get_job(job_id)
+        if not job:
+            return None
+        return self.done_event(job) if job["status"] in TERMINAL_STATES else self.status_event(job)
+
+    def unsubscribe(self, job_id: str, q: SubscriberQueue) -> None:
+        subs = self._subscribers.get(job_id)
+        if subs and q in subs:
+            subs.remove(q)
+            if not subs:
+                del self._subscribers[job_id]
+
+    def publish(self, job_id: str, event: Dict) -> None:
+        if event.get("type") == "done":
+            subs = self._subscribers.pop(job_id, ())
+        else:
+            subs = self._subscribers.get(job_id, ())
+        for q in subs:
+            q.put_nowait(event)
+        if self._global_subscribers:
+            tagged = event if "job_id" in event else {**event, "job_id": job_id}
+            for q in self._global_subscribers:
+                q.put_nowait(tagged)
+
+    async def wait(self, job_id: str) -> Dict:
+        """等待任务结束，返回 done 事件"""
+        q = self.subscribe(job_id)
+        try:
+            while True:
+                ev = await q.get()
+                if ev.get("type") == "done":
+                    return ev
+        finally:
+            self.unsubscribe(job_id, q)
+
+    def status_event(self, job: Dict) -> Dict:
+        ev = {
+            "type": "job",
+            "job_id": job["id"],
+            "op": job["op"],
+            "lane": job["lane"],
+            "status": job["status"],
+            "total": job["total"],
+            "ok_count": job["ok_count"],
+            "fail_count": job["fail_count"],
+        }
+        control = self._controls.get(job["id"])
+        if control is not None and PAUSE_PREEMPT in control.reasons:
+            ev["preempted"] = True
+        return ev
+
+    def done_event(self, job: Dict) -> Dict:
+        """完成事件只含计数；逐文件结果已通过 result 事件推送，或按 iter_task_results 分页读取"""
+        ev = {
+            "type": "done",
+            "job_id": job["id"],
+            "ok": job["status"] == JOB_DONE and job["fail_count"] == 0,
+            "ok_count": job["ok_count"],
+            "fail_count": job["fail_count"],
+        }
+        if job.get("error"):
+            ev["error"] = job["error"]
+        return ev
+
+    # ---------- 执行 ----------
+    async def _worker(self, lane: str) -> None:
+        queue = self._pending[lane]
+        while True:
+            job_id = await queue.get()
+            await self._run_job(job_id)
+
+    async def _run_job(self, job_id: str) -> None:
+        job = self.store.get_job(job_id)
+        # 重复入队、已结束或出队前被暂停的任务跳过；暂停的任务继续时会重新入队
+        if not job or job_id in self._controls or job["status"] in TERMINAL_STATES + (JOB_PAUSED,):
+            return
+        runner = self._runners.get(job["op"])
+        interactive = job["lane"] == LANE_INTERACTIVE
+        control = ProcessControl(interactive=interactive)
+        self._controls[job_id] = control
+        if interactive:
+            self._interactive_running += 1
+            self._preempt_bulk()
+        elif self._interactive_running:
+            control.pause(PAUSE_PREEMPT)
+        token = current_control.set(control)
+        trace = None
+        if self.trace_dir and (self.trace_all or job["params"].get("trace")):
+            trace = tracing.Trace(job_id, f"{job['op']} {job_id[:8]}", origin_wall=job["created_at"])
+            trace_token = tracing.activate(trace)
+        if job.get("started_at") is None:
+            metrics.QUEUE_WAIT.observe(max(0.0, time.time() - job["created_at"]), op=job["op"], lane=job["lane"])
+            if trace is not None:
+                trace.add_wall("queue_wait", "queue", job["created_at"], time.time())
+        self.store.mark_running(job_id)
+        self.publish(job_id, self.status_event(self.store.get_job(job_id)))
+        ctx = JobContext(self, job, self.store.pending_tasks(job_id), control)
+        status, error = JOB_DONE, ""
+        try:
+            if runner is None:
+                status, error = JOB_FAILED, f"未知操作类型: {job['op']}"
+            else:
+                try:
+                    await runner(ctx)
+                except Exception as e:
+                    status, error = JOB_FAILED, str(e)
+                    ctx.log(f"错误: {e}")
+        finally:
+            ctx.close()
+            if trace is not None:
+                tracing.deactivate(trace_token)
+                try:
+                    await asyncio.to_thread(trace.save, self.trace_path(job_id))
+                except OSError:
+                    pass
+            if self.throughput is not None:
+                try:
+                    await asyncio.to_thread(self.throughput.save)
+                except OSError:
+                    pass
+            current_control.reset(token)
+            del self._controls[job_id]
+            if interactive:
+                self._interactive_running -= 1
+                if not self._interactive_running:
+                    self._release_bulk()
+        self.store.mark_finished(job_id, status, error)
+        self.publish(job_id, self.done_event(self.store.get_job(job_id)))
@@ -0,0 +1,236 @@
+"""
+内存准入控制模块
+按探测到的分辨率、像素格式与滤镜图形态估算每个 ffmpeg 编码的峰值内存，并用实测峰值 RSS 校准；
+只有估算总量不超过内存预算时才放行，较小的编码可以填补剩余空间
+"""
+import asyncio
+import json
+import os
+import sys
+from typing import Dict, Iterable, List, Optional, Tuple
+
+MB = 1024 * 1024
+
+# 每像素字节数；未列出的格式按 yuv420p 估算
+BYTES_PER_PIXEL = {
+    "yuv420p": 1.5, "yuvj420p": 1.5, "nv12": 1.5, "nv21": 1.5,
+    "yuv422p": 2.0, "yuvj422p": 2.0, "yuyv422": 2.0, "uyvy422": 2.0,
+    "yuv444p": 3.0, "yuvj444p": 3.0, "rgb24": 3.0, "bgr24": 3.0,
+    "rgba": 4.0, "bgra": 4.0, "argb": 4.0, "abgr": 4.0,
+    "yuv420p10le": 3.0, "p010le": 3.0, "yuv422p10le": 4.0, "yuv444p10le": 6.0,
+}
+DEFAULT_BPP = 1.5
+# 每路输入的解码缓存帧数（含帧线程）与滤镜链缓存帧数；多输入滤镜图（如 concat）每路输入都会持有解码帧
+DECODE_FRAMES = 8
+FILTER_FRAMES = 4
+# 编码端缓存帧数（libx264 fast 预设的前瞻帧与线程帧）
+ENCODE_FRAMES = 40
+# 进程基础开销（代码、编解码器上下文、音频等）
+BASE_BYTES = 64 * MB
+# 实测/估算比值的平滑系数与取值范围
+CALIBRATION_ALPHA = 0.3
+RATIO_RANGE = (0.25, 4.0)
+# 未能获取物理内存时的默认预算，以及默认预算占物理内存的比例
+FALLBACK_BUDGET = 4096 * MB
+BUDGET_SHARE = 0.7
+
+
+def frame_bytes(width: int, height: int, pix_fmt: str = "yuv420p") -> int:
+    return int(max(width, 1) * max(height, 1) * BYTES_PER_PIXEL.get(pix_fmt or "", DEFAULT_BPP))
+
+
+def estimate_encode_memory(
+    inputs: Iterable[Optional[Dict]], output_size: Tuple[int, int], output_pix_fmt: str = "yuv420p"
+) -> int:
+    """
+    估算一次编码的峰值内存（字节）。inputs 为各输入的探测结果（width/height/pix_fmt），
+    探测失败（None）的输入按输出尺寸估算
+    """
+    total = BASE_BYTES
+    for info in inputs:
+        if info and info.get("width", 0) > 0 and info.get("height", 0) > 0:
+            w, h, fmt = info["width"], info["height"], info.get("pix_fmt", "")
+        else:
+            w, h, fmt = output_size[0], output_size[1], output_pix_fmt
+        total += frame_bytes(w, h, fmt) * (DECODE_FRAMES + FILTER_FRAMES)
+    total += frame_bytes(output_size[0], output_size[1], output_pix_fmt) * (ENCODE_FRAMES + FILTER_FRAMES)
+    return total
+
+
+def total_memory() -> Optional[int]:
+    """物理内存总量（字节），无法获取时返回 None"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+
+            class MemoryStatusEx(ctypes.Structure):
+                _fields_ = [
+                    ("dwLength", ctypes.c_ulong), ("dwMemoryLoad", ctypes.c_ulong),
+                    ("ullTotalPhys", ctypes.c_ulonglong), ("ullAvailPhys", ctypes.c_ulonglong),
+                    ("ullTotalPageFile", ctypes.c_ulonglong), ("ullAvailPageFile", ctypes.c_ulonglong),
+                    ("ullTotalVirtual", ctypes.c_ulonglong), ("ullAvailVirtual", ctypes.c_ulonglong),
+                    ("ullAvailExtendedVirtual", ctypes.c_ulonglong),
+                ]
+
+            stat = MemoryStatusEx()
+            stat.dwLength = ctypes.sizeof(stat)
+            if not ctypes.windll.kernel32.GlobalMemoryStatusEx(ctypes.byref(stat)):
+                return None
+            return int(stat.ullTotalPhys)
+        with open("/proc/meminfo", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("MemTotal:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+def default_budget() -> int:
+    mem = total_memory()
+    return int(mem * BUDGET_SHARE) if mem else FALLBACK_BUDGET
+
+
+def peak_rss(pid: int) -> Optional[int]:
+    """进程迄今的峰值常驻内存（字节）：Linux 读 VmHWM，Windows 取 PeakWorkingSetSize"""
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [
+                    ("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                    ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                    ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                    ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                    ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t),
+                ]
+
+            process_query_limited_information = 0x1000
+            kernel32 = ctypes.windll.kernel32
+            handle = kernel32.OpenProcess(process_query_limited_information, False, pid)
+            if not handle:
+                return None
+            try:
+                counters = ProcessMemoryCounters()
+                counters.cb = ctypes.sizeof(counters)
+                if not kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+                    return None
+                return int(counters.PeakWorkingSetSize)
+            finally:
+                kernel32.CloseHandle(handle)
+        with open(f"/proc/{pid}/status", "r", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, AttributeError):
+        pass
+    return None
+
+
+class Reservation:
+    """一次放行占用的内存额度"""
+
+    def __init__(self, kind: str, raw: int, nbytes: int, interactive: bool):
+        self.kind = kind
+        self.raw = raw
+        self.bytes = nbytes
+        self.interactive = interactive
+
+
+class MemoryAdmission:
+    """
+    编码内存准入：估算值按类型（normalize/watermark/merge）乘以校准比值后计入预算。
+    等待者中放得下的即放行（不按先后阻塞），因此小编码可以利用大编码放不下的剩余空间；
+    没有任何占用时总会放行一个，避免单个编码超出预算时永久等待。
+    交互任务运行时批量任务只是被挂起、仍占内存，因此没有其他交互编码时交互编码直接放行
+    """
+
+    def __init__(self, budget_bytes: Optional[int] = None, calibration_path: Optional[str] = None):
+        self.budget = budget_bytes or default_budget()
+        self.calibration_path = calibration_path
+        self.reserved = 0
+        self._active: List[Reservation] = []
+        self._cond: Optional[asyncio.Condition] = None
+        # 类型 -> 实测/估算比值
+        self._ratio: Dict[str, float] = self._load_calibration()
+
+    def _load_calibration(self) -> Dict[str, float]:
+        if not self.calibration_path or not os.path.exists(self.calibration_path):
+            return {}
+        try:
+            with open(self.calibration_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return {str(k): float(v) for k, v in data.items()}
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _save_calibration(self, ratio: Dict[str, float]) -> None:
+        if not self.calibration_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.calibration_path) or ".", exist_ok=True)
+            tmp = self.calibration_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(ratio, f)
+            os.replace(tmp, self.calibration_path)
+        except OSError:
+            pass
+
+    def _condition(self) -> asyncio.Condition:
+        # Condition 须在事件循环内创建
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    def estimate(self, kind: str, raw: int) -> int:
+        """校准后的估算值"""
+        return int(raw * self._ratio.get(kind, 1.0))
+
+    def _admissible(self, nbytes: int, interactive: bool) -> bool:
+        if not self._active or self.reserved + nbytes <= self.budget:
+            return True
+        return interactive and not any(r.interactive for r in self._active)
+
+    async def reserve(self, kind: str, raw: int, interactive: bool = False) -> Reservation:
+        """等待内存额度，返回占用凭据"""
+        res = Reservation(kind, raw, self.estimate(kind, raw), interactive)
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: self._admissible(res.bytes, interactive))
+            self.reserved += res.bytes
+            self._active.append(res)
+        return res
+
+    async def release(self, res: Reservation, measured_peak: Optional[int] = None) -> None:
+        """释放额度；提供实测峰值 RSS 时据此校准该类型的估算（额度先释放，再保存校准值的副本）"""
+        snapshot = None
+        try:
+            if measured_peak and res.raw > 0:
+                ratio = measured_peak / res.raw
+                old = self._ratio.get(res.kind)
+                ratio = ratio if old is None else (1 - CALIBRATION_ALPHA) * old + CALIBRATION_ALPHA * ratio
+                self._ratio[res.kind] = max(RATIO_RANGE[0], min(RATIO_RANGE[1], ratio))
+                snapshot = dict(self._ratio)
+        finally:
+            # 同步归还额度，等待锁时被取消也不会丢失
+            if res in self._active:
+                self._active.remove(res)
+                self.reserved -= res.bytes
+            cond = self._condition()
+            async with cond:
+                cond.notify_all()
+        if snapshot is not None:
+            await asyncio.to_thread(self._save_calibration, snapshot)
+
+    def report(self) -> Dict:
+        return {
+            "budget_mb": round(self.budget / MB, 1),
+            "reserved_mb": round(self.reserved / MB, 1),
+            "active": [
+                {"kind": r.kind, "estimate_mb": round(r.bytes / MB, 1), "interactive": r.interactive}
+                for r in self._active
+            ],
+            "calibration": {k: round(v, 3) for k, v in self._ratio.items()},
+        }
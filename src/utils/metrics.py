@@ -0,0 +1,232 @@
+"""
+运行指标模块
+计数器、仪表与直方图，按 Prometheus 文本格式（0.0.4）输出，供 /api/metrics 抓取；
+不依赖 prometheus_client。指标在事件循环与线程池中都会更新，每个指标自带锁
+"""
+import math
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 直方图默认分桶（秒）
+ENCODE_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)
+
+LabelKey = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def replace(self, values: Iterable[Tuple[Dict[str, str], float]]) -> None:
+        """整体替换全部标签组合的值（抓取时重新计算的仪表用）"""
+        new = {self._key(labels): v for labels, v in values}
+        with self._lock:
+            self._values = new
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = ENCODE_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # 标签 -> [各桶计数（非累计）, 总和, 次数]
+        self._values: Dict[LabelKey, List] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, [list(v[0]), v[1], v[2]]) for k, v in self._values.items())
+        lines = []
+        for key, (counts, total, n) in items:
+            cum = 0
+            for bound, c in zip(self.buckets, counts):
+                cum += c
+                le = f'le="{_fmt(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cum}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_fmt(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {n}")
+        return lines
+
+
+class RateWindow:
+    """最近 window_sec 秒内的累计量 / 秒（如每墙钟秒处理的媒体秒数）"""
+
+    def __init__(self, window_sec: float = 60.0):
+        self.window_sec = window_sec
+        self._events: Deque[Tuple[float, float]] = deque()
+        self._lock = threading.Lock()
+
+    def add(self, amount: float, now: Optional[float] = None) -> None:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._events.append((now, amount))
+            self._trim(now)
+
+    def _trim(self, now: float) -> None:
+        while self._events and now - self._events[0][0] > self.window_sec:
+            self._events.popleft()
+
+    def rate(self, now: Optional[float] = None) -> float:
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self._trim(now)
+            return sum(a for _, a in self._events) / self.window_sec
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self._metrics:
+            lines.extend(m.header())
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+JOBS = REGISTRY.register(Gauge(
+    "channel_video_jobs", "当前排队/运行/暂停的任务数", ("op", "state"),
+))
+QUEUE_WAIT = REGISTRY.register(Histogram(
+    "channel_video_job_queue_wait_seconds", "任务从提交到开始执行的等待时间", ("op", "lane"), WAIT_BUCKETS,
+))
+TASKS = REGISTRY.register(Counter(
+    "channel_video_tasks_total", "已完成的子任务（文件）数", ("op", "action", "ok"),
+))
+FAILURES = REGISTRY.register(Counter(
+    "channel_video_task_failures_total", "失败的子任务数（按原因）", ("op", "reason"),
+))
+ENCODE_DURATION = REGISTRY.register(Histogram(
+    "channel_video_encode_duration_seconds", "单个文件编码耗时（不含排队）", ("op",), ENCODE_BUCKETS,
+))
+ENCODE_WAIT = REGISTRY.register(Histogram(
+    "channel_video_encode_wait_seconds", "编码等待内存额度与并发名额的时间", ("op",), WAIT_BUCKETS,
+))
+MEDIA_SECONDS = REGISTRY.register(Counter(
+    "channel_video_media_seconds_total", "已编码的媒体时长（秒，按 ffmpeg 进度累加）", ("op",),
+))
+MEDIA_RATE = REGISTRY.register(Gauge(
+    "channel_video_media_seconds_per_second", "最近 60 秒每墙钟秒编码的媒体秒数", (),
+))
+FFMPEG_RUNNING = REGISTRY.register(Gauge(
+    "channel_video_ffmpeg_running", "运行中的 ffmpeg 编码进程数", ("op",),
+))
+FFMPEG_FPS = REGISTRY.register(Gauge(
+    "channel_video_ffmpeg_fps", "运行中编码的实时帧率之和", ("op",),
+))
+FFMPEG_SPEED = REGISTRY.register(Gauge(
+    "channel_video_ffmpeg_speed", "运行中编码的实时速度倍率之和（1 = 实时）", ("op",),
+))
+PROBES = REGISTRY.register(Counter(
+    "channel_video_probes_total", "ffprobe 探测次数", ("result",),
+))
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "channel_video_cache_lookups_total", "结果缓存查询次数", ("result",),
+))
+
+media_rate = RateWindow(60.0)
+
+
+def failure_reason(action: str, error: str) -> str:
+    """把子任务失败归类为少量原因，避免把错误文本作为标签"""
+    error = error or ""
+    if action == "unsupported":
+        return "unsupported"
+    if "尺寸不一致" in error:
+        return "size_mismatch"
+    if "No such file" in error or "不存在" in error:
+        return "missing_input"
+    if action == "failed":
+        return "exception"
+    return "ffmpeg"
@@ -0,0 +1,69 @@
+"""
+预览图内存缓存
+按（视频, 时间点, 水印, 不透明度, 位置）缓存渲染结果，拖动不透明度滑块时重复请求可直接命中
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional, Tuple
+
+
+def quantize(timestamp: float, opacity: float) -> Tuple[float, float]:
+    """时间点取 0.1 秒、不透明度取 0.01；缓存键与实际渲染都用取整后的值，同一个键对应同一张图"""
+    return round(max(0.0, timestamp), 1), round(max(0.0, min(1.0, opacity)), 2)
+
+
+def file_identity(path: str) -> Tuple[str, int, int]:
+    """文件标识：绝对路径 + 大小 + 修改时间，文件被替换后缓存自动失效"""
+    st = os.stat(path)
+    return os.path.abspath(path), st.st_size, st.st_mtime_ns
+
+
+class PreviewCache:
+    """线程安全的 LRU 缓存，容量按总字节数限制"""
+
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._items: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(
+        video_path: str,
+        timestamp: float,
+        watermark_path: str,
+        opacity: float,
+        position: str,
+        *extra: Hashable,
+    ) -> Tuple:
+        """生成缓存键；timestamp 与 opacity 应先经 quantize 取整，并以同样的值渲染"""
+        return (
+            file_identity(video_path),
+            timestamp,
+            file_identity(watermark_path),
+            opacity,
+            position,
+            *extra,
+        )
+
+    def get(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key: Hashable, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._items[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self._size -= len(evicted)
+
@@ -0,0 +1,106 @@
+"""
+任务进程控制模块
+暂停/继续运行中任务的 ffmpeg 子进程：POSIX 使用 SIGSTOP/SIGCONT，Windows 使用 NtSuspendProcess/NtResumeProcess；
+暂停原因分为用户暂停与被高优先级任务抢占，全部解除后才继续执行
+"""
+import asyncio
+import os
+import signal
+import sys
+from contextvars import ContextVar
+from typing import Optional, Set
+
+# 暂停原因
+PAUSE_USER = "user"
+PAUSE_PREEMPT = "preempt"
+
+
+def _nt_suspend_resume(pid: int, func_name: str) -> bool:
+    import ctypes
+    process_suspend_resume = 0x0800
+    kernel32 = ctypes.windll.kernel32
+    handle = kernel32.OpenProcess(process_suspend_resume, False, pid)
+    if not handle:
+        return False
+    try:
+        return getattr(ctypes.windll.ntdll, func_name)(handle) == 0
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+def suspend_process(pid: int) -> bool:
+    """挂起进程（不终止），返回是否成功"""
+    try:
+        if sys.platform == "win32":
+            return _nt_suspend_resume(pid, "NtSuspendProcess")
+        os.kill(pid, signal.SIGSTOP)
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+def resume_process(pid: int) -> bool:
+    """恢复被挂起的进程，返回是否成功"""
+    try:
+        if sys.platform == "win32":
+            return _nt_suspend_resume(pid, "NtResumeProcess")
+        os.kill(pid, signal.SIGCONT)
+        return True
+    except (OSError, AttributeError):
+        return False
+
+
+class ProcessControl:
+    """单个任务的子进程登记与暂停状态；暂停期间不再启动新的子进程"""
+
+    def __init__(self, interactive: bool = False):
+        self.interactive = interactive
+        self._pids: Set[int] = set()
+        self._reasons: Set[str] = set()
+        self._runnable = asyncio.Event()
+        self._runnable.set()
+
+    @property
+    def paused(self) -> bool:
+        return bool(self._reasons)
+
+    @property
+    def reasons(self) -> Set[str]:
+        return set(self._reasons)
+
+    def attach(self, pid: int) -> None:
+        self._pids.add(pid)
+        if self._reasons:
+            suspend_process(pid)
+
+    def detach(self, pid: int) -> None:
+        self._pids.discard(pid)
+
+    def pause(self, reason: str) -> None:
+        first = not self._reasons
+        self._reasons.add(reason)
+        if first:
+            self._runnable.clear()
+            for pid in list(self._pids):
+                suspend_process(pid)
+
+    def resume(self, reason: str) -> None:
+        if reason not in self._reasons:
+            return
+        self._reasons.discard(reason)
+        if not self._reasons:
+            for pid in list(self._pids):
+                resume_process(pid)
+            self._runnable.set()
+
+    def resume_all(self) -> None:
+        """解除全部暂停原因并恢复子进程（任务队列停止时调用）"""
+        for reason in list(self._reasons):
+            self.resume(reason)
+
+    async def wait_runnable(self) -> None:
+        await self._runnable.wait()
+
+
+# 当前协程所属任务的进程控制；由任务队列在执行任务时设置，ffmpeg 执行器据此登记子进程
+current_control: ContextVar[Optional[ProcessControl]] = ContextVar("current_control", default=None)
@@ -0,0 +1,219 @@
+"""
+编码进程调度策略模块
+为 ffmpeg 编码子进程设置 nice 值、I/O 优先级，并可把每个编码固定到互不重叠的核心集合；
+可保留若干核心给 API 与界面进程，避免批处理时界面与接口卡顿。默认策略不做任何调整，API 服务启动时安装降低优先级的策略。
+设置均由父进程在子进程启动后立即按 pid 施加（不使用 preexec_fn：多线程进程中 fork 后执行 Python 代码可能死锁，
+且会使 subprocess 无法走 vfork / posix_spawn 快速路径）
+"""
+import os
+import platform
+import subprocess
+import sys
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+
+# I/O 调度类别（Linux ioprio）
+IONICE_NONE = "none"
+IONICE_BEST_EFFORT = "best-effort"
+IONICE_IDLE = "idle"
+_IOPRIO_CLASS = {IONICE_BEST_EFFORT: 2, IONICE_IDLE: 3}
+_IOPRIO_CLASS_SHIFT = 13
+_IOPRIO_WHO_PROCESS = 1
+# ioprio_set 系统调用号
+_SYS_IOPRIO_SET = {"x86_64": 251, "amd64": 251, "i386": 289, "i686": 289, "aarch64": 30, "arm64": 30, "armv7l": 314}
+
+# Windows 优先级类别与 I/O 优先级
+_BELOW_NORMAL_PRIORITY_CLASS = 0x00004000
+_IDLE_PRIORITY_CLASS = 0x00000040
+_PROCESS_SET_INFORMATION = 0x0200
+_PROCESS_IO_PRIORITY = 33
+_IO_PRIORITY_LOW = 1
+
+
+def available_cores() -> List[int]:
+    """当前进程可用的 CPU 核心编号"""
+    if hasattr(os, "sched_getaffinity"):
+        try:
+            return sorted(os.sched_getaffinity(0))
+        except OSError:
+            pass
+    return list(range(os.cpu_count() or 1))
+
+
+@lru_cache(maxsize=None)
+def _ioprio_setter() -> Optional[Callable[[int, int], int]]:
+    """解析 ioprio_set 系统调用（首次施加 I/O 优先级时才加载 ctypes），返回 (tid, ioprio) -> 返回值；不支持的平台返回 None"""
+    if not sys.platform.startswith("linux"):
+        return None
+    nr = _SYS_IOPRIO_SET.get(platform.machine().lower())
+    if nr is None:
+        return None
+    try:
+        import ctypes
+        syscall = ctypes.CDLL(None, use_errno=True).syscall
+    except (OSError, AttributeError):
+        return None
+    return lambda tid, ioprio: syscall(nr, _IOPRIO_WHO_PROCESS, tid, ioprio)
+
+
+def _thread_ids(pid: int) -> List[int]:
+    """
+    进程的全部线程（Linux）；nice、I/O 优先级与核心亲和性在 Linux 上按线程生效，
+    启动后才施加时要覆盖子进程已创建的线程，之后创建的线程会继承
+    """
+    try:
+        return [int(t) for t in os.listdir(f"/proc/{pid}/task")] or [pid]
+    except (OSError, ValueError):
+        return [pid]
+
+
+class SchedulingPolicy:
+    """
+    编码进程调度策略。nice 为 POSIX nice 增量（Windows 上 >= 15 对应 IDLE，> 0 对应 BELOW_NORMAL）；
+    ionice 为 none / best-effort / idle，ionice_level 为 best-effort 的 0~7 级；
+    reserved_cores 为保留给 API/界面的核心数，pin 为 True 时每个编码固定到互不重叠的核心
+    """
+
+    def __init__(
+        self,
+        nice: int = 10,
+        ionice: str = IONICE_BEST_EFFORT,
+        ionice_level: int = 7,
+        reserved_cores: int = 0,
+        pin: bool = False,
+    ):
+        self.nice = max(0, min(19, nice))
+        self.ionice = ionice if ionice in _IOPRIO_CLASS else IONICE_NONE
+        self.ionice_level = max(0, min(7, ionice_level))
+        cores = available_cores()
+        # 至少留一个核心给编码
+        self.reserved_cores = max(0, min(reserved_cores, len(cores) - 1))
+        self.reserved = cores[:self.reserved_cores]
+        self.worker_cores = cores[self.reserved_cores:]
+        self.pin = pin
+
+    @property
+    def restricts_cores(self) -> bool:
+        return bool(self.reserved) or self.pin
+
+    def _ioprio(self) -> int:
+        level = self.ionice_level if self.ionice == IONICE_BEST_EFFORT else 0
+        return (_IOPRIO_CLASS[self.ionice] << _IOPRIO_CLASS_SHIFT) | level
+
+    def spawn_kwargs(self, cores: Optional[List[int]] = None) -> Dict:
+        """
+        subprocess / asyncio 启动子进程的附加参数：Windows 通过 creationflags 设置优先级类别；
+        POSIX 为空，nice、I/O 优先级与核心亲和性都由 apply_after_spawn 设置
+        """
+        if sys.platform == "win32":
+            if self.nice >= 15:
+                return {"creationflags": _IDLE_PRIORITY_CLASS}
+            return {"creationflags": _BELOW_NORMAL_PRIORITY_CLASS} if self.nice > 0 else {}
+        return {}
+
+    def apply_after_spawn(self, pid: int, cores: Optional[List[int]] = None) -> None:
+        """启动后立即设置子进程的 nice、I/O 优先级与核心亲和性；进程已退出或无权限时忽略，不影响编码"""
+        if sys.platform == "win32":
+            self._apply_windows(pid, cores)
+            return
+        affinity = set(cores or self.worker_cores) if self.restricts_cores else None
+        ioprio_set = _ioprio_setter() if self.ionice != IONICE_NONE else None
+        if not self.nice and ioprio_set is None and affinity is None:
+            return
+        # 与 os.nice 相同按增量计算：子进程继承本进程的 nice 值
+        nice = None
+        if self.nice and hasattr(os, "setpriority"):
+            try:
+                nice = min(19, os.getpriority(os.PRIO_PROCESS, 0) + self.nice)
+            except OSError:
+                pass
+        ioprio = self._ioprio() if ioprio_set is not None else 0
+        for tid in _thread_ids(pid):
+            try:
+                if nice is not None:
+                    os.setpriority(os.PRIO_PROCESS, tid, nice)
+                if ioprio_set is not None:
+                    ioprio_set(tid, ioprio)
+                if affinity and hasattr(os, "sched_setaffinity"):
+                    os.sched_setaffinity(tid, affinity)
+            except OSError:
+                pass
+
+    def run(self, cmd: List[str], **kwargs) -> subprocess.CompletedProcess:
+        """按本策略运行命令并等待结束，参数与 subprocess.run 相同（不支持 input / timeout / check）"""
+        with subprocess.Popen(cmd, **{**kwargs, **self.spawn_kwargs()}) as proc:
+            self.apply_after_spawn(proc.pid)
+            try:
+                stdout, stderr = proc.communicate()
+            except BaseException:
+                proc.kill()
+                raise
+        return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+    def _apply_windows(self, pid: int, cores: Optional[List[int]]) -> None:
+        """Windows：设置核心亲和性与低 I/O 优先级（进程级设置，对其后创建的线程同样生效）"""
+        try:
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            handle = kernel32.OpenProcess(_PROCESS_SET_INFORMATION, False, pid)
+            if not handle:
+                return
+            try:
+                if self.restricts_cores:
+                    mask = 0
+                    for c in cores or self.worker_cores:
+                        mask |= 1 << c
+                    kernel32.SetProcessAffinityMask(handle, ctypes.c_size_t(mask))
+                if self.ionice != IONICE_NONE:
+                    value = ctypes.c_ulong(_IO_PRIORITY_LOW)
+                    ctypes.windll.ntdll.NtSetInformationProcess(
+                        handle, _PROCESS_IO_PRIORITY, ctypes.byref(value), ctypes.sizeof(value)
+                    )
+            finally:
+                kernel32.CloseHandle(handle)
+        except (OSError, AttributeError):
+            pass
+
+    def describe(self) -> Dict:
+        return {
+            "nice": self.nice,
+            "ionice": self.ionice,
+            "ionice_level": self.ionice_level,
+            "reserved_cores": self.reserved,
+            "worker_cores": self.worker_cores,
+            "pin": self.pin,
+        }
+
+
+class CorePool:
+    """把编码核心分配给同时运行的编码，各编码的核心集合互不重叠；不够分时与其他编码共用全部编码核心"""
+
+    def __init__(self, cores: List[int]):
+        self.cores = list(cores)
+        self._free: List[int] = list(cores)
+
+    def take(self, n: int) -> Optional[List[int]]:
+        """分配 n 个空闲核心（空闲不足时分配剩余的）；没有空闲核心时返回 None，调用方使用全部编码核心"""
+        if not self._free:
+            return None
+        taken, self._free = self._free[:max(1, n)], self._free[max(1, n):]
+        return taken
+
+    def give(self, cores: Optional[List[int]]) -> None:
+        if not cores:
+            return
+        self._free = sorted(set(self._free) | set(cores))
+
+
+# 默认不调整优先级（桌面界面与命令行）；API 服务启动时通过 set_policy 安装降低优先级的策略
+_policy = SchedulingPolicy(nice=0, ionice=IONICE_NONE)
+
+
+def get_policy() -> SchedulingPolicy:
+    """当前编码调度策略；默认不调整 nice 与 I/O 优先级，不保留核心、不固定核心"""
+    return _policy
+
+
+def set_policy(policy: SchedulingPolicy) -> None:
+    global _policy
+    _policy = policy
@@ -0,0 +1,151 @@
+"""
+全局内容寻址结果缓存
+缓存键 = 操作类型 + 各输入文件内容哈希 + 完整处理参数（含 ffmpeg 参数），
+命中时通过硬链接/写时复制/复制直接得到输出，无需再次调用 ffmpeg；超出容量按最近最少使用淘汰
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from . import metrics
+from .tracing import span
+from .file_dedup import full_digest, link_or_copy
+
+
+def cmd_signature(cmd: Sequence[str], paths: Sequence[str]) -> List[str]:
+    """ffmpeg 命令去掉可执行文件路径，并把输入/输出路径替换为占位符，作为缓存参数的一部分"""
+    placeholders = {p: f"{{path{i}}}" for i, p in enumerate(paths)}
+    return [placeholders.get(a, a) for a in list(cmd)[1:]]
+
+
+class ResultCache:
+    """按内容寻址的处理结果缓存（SQLite 索引 + 对象目录，容量上限 LRU 淘汰）"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: int = 50 * 1024 ** 3):
+        if cache_dir is None:
+            cache_dir = str(Path(__file__).parent.parent.parent / "cache" / "results")
+        self.cache_dir = Path(cache_dir)
+        self.objects_dir = self.cache_dir / "objects"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.db_path = str(self.cache_dir / "index.sqlite3")
+        # 单连接 + 锁，供多线程共享（与任务库相同）；timeout 用于与其他进程共用索引时等待写锁
+        self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._db() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "key TEXT PRIMARY KEY, ext TEXT, size INTEGER, last_access REAL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS hashes ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, digest TEXT)"
+            )
+
+    @contextmanager
+    def _db(self) -> Iterator[sqlite3.Connection]:
+        """加锁使用共享连接，结束时提交（出错时回滚）"""
+        with self._lock, self._conn:
+            yield self._conn
+
+    def _object_path(self, key: str, ext: str) -> Path:
+        return self.objects_dir / key[:2] / f"{key}{ext}"
+
+    def content_hash(self, path: str) -> str:
+        """输入文件内容哈希；按（路径, 大小, 修改时间）记忆，文件未变化时不重复读取"""
+        ap = os.path.abspath(path)
+        st = os.stat(ap)
+        with self._db() as conn:
+            row = conn.execute(
+                "SELECT digest FROM hashes WHERE path=? AND size=? AND mtime_ns=?",
+                (ap, st.st_size, st.st_mtime_ns),
+            ).fetchone()
+        if row:
+            return row[0]
+        digest = full_digest(ap)
+        with self._db() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO hashes (path, size, mtime_ns, digest) VALUES (?, ?, ?, ?)",
+                (ap, st.st_size, st.st_mtime_ns, digest),
+            )
+        return digest
+
+    def make_key(self, op: str, inputs: List[str], params: Dict) -> str:
+        with span("content_hash", inputs=len(inputs)):
+            payload = {
+                "op": op,
+                "inputs": [self.content_hash(p) for p in inputs],
+                "params": params,
+            }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def fetch(self, key: str, output_path: str) -> bool:
+        """命中时把缓存对象物化到 output_path 并返回 True"""
+        with span("cache_fetch") as sp:
+            hit = self._fetch(key, output_path)
+            sp.set(hit=hit)
+        metrics.CACHE_LOOKUPS.inc(result="hit" if hit else "miss")
+        return hit
+
+    def _fetch(self, key: str, output_path: str) -> bool:
+        with self._db() as conn:
+            row = conn.execute("SELECT ext FROM entries WHERE key=?", (key,)).fetchone()
+            if not row:
+                return False
+            obj = self._object_path(key, row[0])
+            if not obj.exists():
+                conn.execute("DELETE FROM entries WHERE key=?", (key,))
+                return False
+            conn.execute("UPDATE entries SET last_access=? WHERE key=?", (time.time(), key))
+        try:
+            link_or_copy(str(obj), output_path)
+        except OSError:
+            return False
+        return True
+
+    def store(self, key: str, output_path: str) -> None:
+        """把处理结果登记为缓存对象，随后按容量上限淘汰"""
+        with span("cache_store"):
+            self._store(key, output_path)
+
+    def _store(self, key: str, output_path: str) -> None:
+        try:
+            ext = Path(output_path).suffix
+            obj = self._object_path(key, ext)
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            size = os.path.getsize(output_path)
+            if size > self.max_bytes:
+                return
+            link_or_copy(output_path, str(obj))
+            with self._db() as conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, ext, size, last_access) VALUES (?, ?, ?, ?)",
+                    (key, ext, size, time.time()),
+                )
+            self.evict()
+        except OSError:
+            pass
+
+    def evict(self) -> None:
+        """总大小超过上限时，从最久未访问的条目开始删除"""
+        with self._db() as conn:
+            total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            rows = conn.execute("SELECT key, ext, size FROM entries ORDER BY last_access").fetchall()
+            for key, ext, size in rows:
+                if total <= self.max_bytes:
+                    break
+                try:
+                    self._object_path(key, ext).unlink()
+                except OSError:
+                    pass
+                conn.execute("DELETE FROM entries WHERE key=?", (key,))
+                total -= size
@@ -0,0 +1,157 @@
+"""
+吞吐量模型模块
+按（操作类型, 输入分辨率档位, 目标）记录本机历次编码的吞吐（媒体秒 / 编码秒，指数滑动平均），持久化到 cache 目录；
+用于按时长加权的总进度、运行中的剩余时间估算，以及提交前的批次耗时预估。
+没有对应档位的记录时，按操作类型（再退到全部操作）换算到 1080p 的吞吐乘以分辨率系数估算
+"""
+import json
+import os
+import socket
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .makespan import simulate
+
+# 没有任何历史记录时假定的 1080p 吞吐（媒体秒 / 编码秒）
+DEFAULT_RATE_1080P = 2.0
+# 指数滑动平均的新样本权重
+EWMA_ALPHA = 0.2
+# 短于该值的编码（启动开销占比过大）不计入模型
+MIN_OBSERVE_SEC = 0.5
+
+_REF_PIXELS = 1920 * 1080
+# 分辨率档位：像素数上限（含） -> 名称
+_BUCKETS = ((640 * 480, "sd"), (1280 * 720, "hd"), (1920 * 1080, "fhd"), (2560 * 1440, "qhd"))
+
+Size = Optional[Tuple[int, int]]
+
+
+def resolution_bucket(size: Size) -> str:
+    if not size or size[0] <= 0 or size[1] <= 0:
+        return "unknown"
+    pixels = size[0] * size[1]
+    for limit, name in _BUCKETS:
+        if pixels <= limit:
+            return name
+    return "uhd"
+
+
+def pixel_factor(src: Size, target: Size = None) -> float:
+    """输入与输出中较大一方相对 1080p 的像素比（与 makespan.estimate_cost 一致），未知时为 1"""
+    pixels = max(
+        src[0] * src[1] if src else 0,
+        target[0] * target[1] if target else 0,
+    )
+    return pixels / _REF_PIXELS if pixels > 0 else 1.0
+
+
+def target_key(target: Size) -> str:
+    """目标尺寸的档位；输出与输入同尺寸的操作（水印、合并）为 src"""
+    return resolution_bucket(target) if target else "src"
+
+
+class ThroughputModel:
+    """本机吞吐记录；observe 在事件循环中调用，save 可在线程中调用"""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.host = socket.gethostname()
+        self._lock = threading.Lock()
+        # 键 -> {"rate": 吞吐, "n": 样本数, "updated": 时间}；键为 op|src档位|目标档位，
+        # 以及换算到 1080p 的 op|*|* 与 *|*|*
+        self._entries: Dict[str, Dict] = {}
+        self._dirty = False
+        self._load()
+
+    def _load(self) -> None:
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # 缓存目录被其他机器共用时不沿用别处的记录
+        if data.get("host") == self.host:
+            self._entries = data.get("entries", {})
+
+    def save(self) -> None:
+        with self._lock:
+            if not self.path or not self._dirty:
+                return
+            data = {"host": self.host, "entries": dict(self._entries)}
+            self._dirty = False
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def _update(self, key: str, rate: float) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self._entries[key] = {"rate": rate, "n": 1, "updated": time.time()}
+            return
+        entry["rate"] = entry["rate"] * (1 - EWMA_ALPHA) + rate * EWMA_ALPHA
+        entry["n"] += 1
+        entry["updated"] = time.time()
+
+    def observe(self, op: str, src: Size, target: Size, media_sec: float, encode_sec: float) -> None:
+        """记录一次编码：媒体时长与实际编码时间（不含排队）"""
+        if media_sec <= 0 or encode_sec < MIN_OBSERVE_SEC:
+            return
+        rate = media_sec / encode_sec
+        normalized = rate * pixel_factor(src, target)
+        with self._lock:
+            self._update(f"{op}|{resolution_bucket(src)}|{target_key(target)}", rate)
+            self._update(f"{op}|*|*", normalized)
+            self._update("*|*|*", normalized)
+            self._dirty = True
+
+    def rate(self, op: str, src: Size, target: Size = None) -> Tuple[float, str]:
+        """预测吞吐（媒体秒 / 编码秒）及其来源：exact / op / global / default"""
+        with self._lock:
+            exact = self._entries.get(f"{op}|{resolution_bucket(src)}|{target_key(target)}")
+            by_op = self._entries.get(f"{op}|*|*")
+            overall = self._entries.get("*|*|*")
+        if exact:
+            return exact["rate"], "exact"
+        factor = pixel_factor(src, target)
+        if by_op:
+            return by_op["rate"] / factor, "op"
+        if overall:
+            return overall["rate"] / factor, "global"
+        return DEFAULT_RATE_1080P / factor, "default"
+
+    def predict(self, op: str, src: Size, target: Size, media_sec: float) -> float:
+        """预测单个文件的编码秒数"""
+        rate, _ = self.rate(op, src, target)
+        return media_sec / rate if rate > 0 else media_sec
+
+    def estimate(self, op: str, items: Iterable[Tuple[float, Size]], target: Size, parallelism: int) -> Dict:
+        """
+        预估一批文件（媒体时长, 输入尺寸）的耗时：串行编码总秒数，
+        以及按 parallelism 路并行、长任务优先派发时的完工时间
+        """
+        items = list(items)
+        predicted: List[float] = []
+        sources: Dict[str, int] = {}
+        for media_sec, src in items:
+            rate, source = self.rate(op, src, target)
+            sources[source] = sources.get(source, 0) + 1
+            predicted.append(media_sec / rate if rate > 0 else media_sec)
+        wall, _ = simulate(sorted(predicted, reverse=True), max(1, parallelism))
+        return {
+            "op": op,
+            "files": len(items),
+            "media_sec": round(sum(m for m, _ in items), 2),
+            "encode_sec": round(sum(predicted), 2),
+            "parallelism": max(1, parallelism),
+            "wall_sec": round(wall, 2),
+            "rate_sources": sources,
+        }
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {"host": self.host, "entries": {k: dict(v) for k, v in self._entries.items()}}
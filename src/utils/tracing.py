@@ -0,0 +1,153 @@
+"""
+任务时间线追踪模块
+在处理各阶段（排队、ffprobe、复制、缓存、ffmpeg 启动与编码等）外包 span，导出为 Chrome trace-event JSON，
+可在 chrome://tracing 或 Perfetto 中打开。追踪对象通过 ContextVar 传递，线程池中执行的函数同样记录；
+未启用追踪时 span() 返回共享的空上下文，开销仅为一次 ContextVar 读取
+"""
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar, Token
+from typing import Dict, List, Optional
+
+_trace: ContextVar[Optional["Trace"]] = ContextVar("trace", default=None)
+# 时间线上的行（Chrome trace 的 tid）：并行处理的每个文件一行，0 为任务本身
+_lane: ContextVar[int] = ContextVar("trace_lane", default=0)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, **args) -> None:
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("trace", "name", "cat", "args", "tid", "start")
+
+    def __init__(self, trace: "Trace", name: str, cat: str, args: Dict, tid: int):
+        self.trace = trace
+        self.name = name
+        self.cat = cat
+        self.args = args
+        self.tid = tid
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.args["error"] = exc_type.__name__
+        self.trace.add(self.name, self.cat, self.start, time.perf_counter(), self.tid, self.args)
+        return False
+
+    def set(self, **args) -> None:
+        """补充 span 参数（如结果、命中与否）"""
+        self.args.update(args)
+
+
+class Trace:
+    """单个任务的事件列表；时间戳以 origin_wall（默认创建时刻，通常取任务提交时间）为零点，单位微秒"""
+
+    def __init__(self, job_id: str, name: str = "", origin_wall: Optional[float] = None):
+        self.job_id = job_id
+        self.name = name or job_id
+        now_wall, now = time.time(), time.perf_counter()
+        self._origin_wall = now_wall if origin_wall is None else min(origin_wall, now_wall)
+        self._origin = now - (now_wall - self._origin_wall)
+        self._events: List[Dict] = []
+        self._lanes: Dict[int, str] = {0: "job"}
+        self._lock = threading.Lock()
+
+    def _us(self, t: float) -> float:
+        return round((t - self._origin) * 1e6, 1)
+
+    def add(self, name: str, cat: str, start: float, end: float, tid: int = 0, args: Optional[Dict] = None) -> None:
+        """记录完整事件（perf_counter 时间）"""
+        event = {
+            "name": name, "cat": cat, "ph": "X", "pid": 1, "tid": tid,
+            "ts": self._us(start), "dur": round(max(0.0, end - start) * 1e6, 1),
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            self._events.append(event)
+
+    def add_wall(self, name: str, cat: str, start_wall: float, end_wall: float, tid: int = 0) -> None:
+        """记录以 time.time() 表示的区间（如从提交到开始执行的排队时间）"""
+        offset = self._origin - self._origin_wall
+        self.add(name, cat, start_wall + offset, end_wall + offset, tid)
+
+    def name_lane(self, tid: int, label: str) -> None:
+        with self._lock:
+            self._lanes[tid] = label
+
+    def to_chrome(self) -> Dict:
+        with self._lock:
+            events = list(self._events)
+            lanes = dict(self._lanes)
+        meta = [{"name": "process_name", "ph": "M", "pid": 1, "tid": 0, "args": {"name": self.name}}]
+        meta += [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": label}}
+            for tid, label in sorted(lanes.items())
+        ]
+        return {
+            "traceEvents": meta + sorted(events, key=lambda e: e["ts"]),
+            "displayTimeUnit": "ms",
+            "otherData": {"job_id": self.job_id, "started_at": self._origin_wall},
+        }
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_chrome(), f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def span(name: str, cat: str = "phase", **args):
+    """with span("ffprobe", path=...): ... ；未启用追踪时不记录"""
+    trace = _trace.get()
+    if trace is None:
+        return _NOOP
+    return _Span(trace, name, cat, args, _lane.get())
+
+
+def record(name: str, start: float, end: float, cat: str = "phase", **args) -> None:
+    """记录无法用 with 包裹的区间（perf_counter 时间），如子进程从启动到输出第一行进度"""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add(name, cat, start, end, _lane.get(), args or None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def activate(trace: Trace) -> Token:
+    return _trace.set(trace)
+
+
+def deactivate(token: Token) -> None:
+    _trace.reset(token)
+
+
+def set_lane(tid: int, label: str) -> None:
+    """当前上下文（如并行处理的单个文件）记录到独立的一行"""
+    trace = _trace.get()
+    if trace is None:
+        return
+    _lane.set(tid)
+    trace.name_lane(tid, label)
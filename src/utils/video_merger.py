@@ -2,33 +2,49 @@
 视频合并核心处理模块
 支持将片头或片尾插入到主体视频中
 """
+import asyncio
 import json
 import os
 import subprocess
 from pathlib import Path
-from typing import Callable, Optional, List, Tuple
+from typing import Callable, Dict, Optional, List, Sequence, Tuple
+
+from .async_ffmpeg import AsyncFFmpegEngine
+from .batch_pool import run_pool
+from .encoder_profile import video_codec_args
+from .ffmpeg_locator import find_ffmpeg, find_ffprobe
+from .file_dedup import break_hardlink
+from .memory_admission import estimate_encode_memory
+from .process_priority import get_policy
+from .tracing import span
+from .result_cache import ResultCache, cmd_signature
+from .video_scanner import output_relpath
+
+# 支持的视频扩展名（小写）
+SUPPORTED_FORMATS = {".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv", ".webm"}
 
 
 class VideoMerger:
     """视频合并处理器"""
 
-    def __init__(self, ffmpeg_path: str = None):
+    def __init__(self, ffmpeg_path: str = None, result_cache: Optional[ResultCache] = None):
         if ffmpeg_path is None:
-            project_root = Path(__file__).parent.parent.parent
-            ffmpeg_path = str(project_root / "tools" / "ffmpeg" / "ffmpeg.exe")
+            ffmpeg_path = find_ffmpeg()
         self.ffmpeg_path = ffmpeg_path
-        self.supported_formats = {".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv", ".webm"}
+        self.result_cache = result_cache
+        self.supported_formats = set(SUPPORTED_FORMATS)
 
     def is_supported_format(self, filepath: str) -> bool:
         return Path(filepath).suffix.lower() in self.supported_formats
 
     def _get_video_size(self, video_path: str) -> Tuple[int, int]:
-        ffprobe_path = str(Path(self.ffmpeg_path).parent / "ffprobe.exe")
+        ffprobe_path = find_ffprobe(self.ffmpeg_path)
         if not os.path.exists(ffprobe_path):
             return 1920, 1080
         try:
             cmd = [ffprobe_path, "-v", "quiet", "-print_format", "json", "-show_streams", video_path]
-            out = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8")
+            with span("ffprobe", path=os.path.basename(video_path)):
+                out = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8")
             if out.returncode != 0 or not out.stdout:
                 return 1920, 1080
             data = json.loads(out.stdout)
@@ -41,6 +57,50 @@ class VideoMerger:
         except Exception:
             return 1920, 1080
 
+    def build_command(
+        self, video_list: List[str], output_path: str, target_w: int, target_h: int
+    ) -> List[str]:
+        input_args = []
+        filter_parts = []
+        for idx, video in enumerate(video_list):
+            input_args.extend(["-i", video])
+            filter_parts.append(
+                f"[{idx}:v]scale={target_w}:{target_h}:force_original_aspect_ratio=decrease,"
+                f"pad={target_w}:{target_h}:(ow-iw)/2:(oh-ih)/2:black,setsar=1,fps=30,"
+                f"format=yuv420p[v{idx}]"
+            )
+            filter_parts.append(f"[{idx}:a]aformat=sample_rates=44100:channel_layouts=stereo[a{idx}]")
+        v_in = "".join([f"[v{i}]" for i in range(len(video_list))])
+        a_in = "".join([f"[a{i}]" for i in range(len(video_list))])
+        n = len(video_list)
+        filter_complex = ";".join(filter_parts) + f";{v_in}concat=n={n}:v=1[outv];{a_in}concat=n={n}:v=0:a=1[outa]"
+        return [
+            self.ffmpeg_path, *input_args, "-filter_complex", filter_complex,
+            "-map", "[outv]", "-map", "[outa]", *video_codec_args(),
+            "-c:a", "aac", "-b:a", "128k", "-pix_fmt", "yuv420p", "-y", output_path,
+        ]
+
+    def _cache_key(
+        self, cmd: List[str], main_video: str, insert_video: str,
+        video_list: List[str], output_path: str, insert_position: str,
+    ) -> Optional[str]:
+        if self.result_cache is None:
+            return None
+        return self.result_cache.make_key(
+            "merge", [main_video, insert_video],
+            {
+                "insert_position": insert_position,
+                "cmd": cmd_signature(cmd, [*video_list, output_path]),
+            },
+        )
+
+    @staticmethod
+    def _size_mismatch(target: Tuple[int, int], insert: Tuple[int, int]) -> str:
+        return (
+            f"插入视频与主体视频尺寸不一致，请先调整尺寸后再合并。"
+            f"主体：{target[0]}x{target[1]}，插入：{insert[0]}x{insert[1]}。"
+        )
+
     def merge_videos(
         self,
         main_video: str,
@@ -48,52 +108,90 @@ class VideoMerger:
         output_path: str,
         insert_position: str = "head",
         progress_callback: Optional[Callable[[float], None]] = None,
-    ) -> Tuple[bool, str]:
+    ) -> Tuple[bool, str, str]:
+        """合并单个视频，返回（成功, 操作类型, 错误信息）；操作类型为 cached / processed / failed"""
         try:
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             video_list = [insert_video, main_video] if insert_position == "head" else [main_video, insert_video]
             target_w, target_h = self._get_video_size(main_video)
             insert_w, insert_h = self._get_video_size(insert_video)
             if (target_w, target_h) != (insert_w, insert_h):
-                return False, (
-                    f"插入视频与主体视频尺寸不一致，请先调整尺寸后再合并。"
-                    f"主体：{target_w}x{target_h}，插入：{insert_w}x{insert_h}。"
-                )
-            input_args = []
-            filter_parts = []
-            for idx, video in enumerate(video_list):
-                input_args.extend(["-i", video])
-                filter_parts.append(
-                    f"[{idx}:v]scale={target_w}:{target_h}:force_original_aspect_ratio=decrease,"
-                    f"pad={target_w}:{target_h}:(ow-iw)/2:(oh-ih)/2:black,setsar=1,fps=30,"
-                    f"format=yuv420p[v{idx}]"
-                )
-                filter_parts.append(f"[{idx}:a]aformat=sample_rates=44100:channel_layouts=stereo[a{idx}]")
-            v_in = "".join([f"[v{i}]" for i in range(len(video_list))])
-            a_in = "".join([f"[a{i}]" for i in range(len(video_list))])
-            n = len(video_list)
-            filter_complex = ";".join(filter_parts) + f";{v_in}concat=n={n}:v=1[outv];{a_in}concat=n={n}:v=0:a=1[outa]"
-            cmd = [
-                self.ffmpeg_path, *input_args, "-filter_complex", filter_complex,
-                "-map", "[outv]", "-map", "[outa]", "-c:v", "libx264", "-preset", "fast",
-                "-c:a", "aac", "-b:a", "128k", "-pix_fmt", "yuv420p", "-y", output_path,
-            ]
+                return False, "failed", self._size_mismatch((target_w, target_h), (insert_w, insert_h))
+            cmd = self.build_command(video_list, output_path, target_w, target_h)
+            cache_key = self._cache_key(cmd, main_video, insert_video, video_list, output_path, insert_position)
+            if cache_key and self.result_cache.fetch(cache_key, output_path):
+                if progress_callback:
+                    progress_callback(100)
+                return True, "cached", ""
+            break_hardlink(output_path)
             if progress_callback:
                 progress_callback(0)
-            process = subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                universal_newlines=True, encoding="utf-8", errors="ignore",
-            )
-            err_out = []
-            for line in process.stderr:
-                err_out.append(line)
-            process.wait()
+            policy = get_policy()
+            with span("ffmpeg_encode"):
+                process = subprocess.Popen(
+                    cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    universal_newlines=True, encoding="utf-8", errors="ignore", **policy.spawn_kwargs(),
+                )
+                policy.apply_after_spawn(process.pid)
+                err_out = []
+                for line in process.stderr:
+                    err_out.append(line)
+                process.wait()
             ok = process.returncode == 0
+            if ok and cache_key:
+                self.result_cache.store(cache_key, output_path)
             if ok and progress_callback:
                 progress_callback(100)
-            return (True, "") if ok else (False, "".join(err_out[-20:]).strip())
+            return ok, "processed", "" if ok else "".join(err_out[-20:]).strip()
         except Exception as e:
-            return False, str(e)
+            return False, "failed", str(e)
+
+    async def merge_videos_async(
+        self,
+        engine: AsyncFFmpegEngine,
+        main_video: str,
+        insert_video: str,
+        output_path: str,
+        insert_position: str = "head",
+        progress_callback: Optional[Callable[[float], None]] = None,
+    ) -> Tuple[bool, str, str]:
+        """merge_videos 的异步版本；进度按两段视频时长之和换算"""
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            video_list = [insert_video, main_video] if insert_position == "head" else [main_video, insert_video]
+            ffprobe_path = find_ffprobe(self.ffmpeg_path)
+            main_info, insert_info = await asyncio.gather(
+                engine.probe(ffprobe_path, main_video), engine.probe(ffprobe_path, insert_video)
+            )
+
+            def size_of(info):
+                if info and info["width"] > 0 and info["height"] > 0:
+                    return info["width"], info["height"]
+                return 1920, 1080
+
+            target, insert = size_of(main_info), size_of(insert_info)
+            if target != insert:
+                return False, "failed", self._size_mismatch(target, insert)
+            cmd = self.build_command(video_list, output_path, *target)
+            cache_key = None
+            if self.result_cache is not None:
+                cache_key = await asyncio.to_thread(
+                    self._cache_key, cmd, main_video, insert_video, video_list, output_path, insert_position
+                )
+                if await asyncio.to_thread(self.result_cache.fetch, cache_key, output_path):
+                    if progress_callback:
+                        progress_callback(100)
+                    return True, "cached", ""
+            break_hardlink(output_path)
+            duration = sum(info.get("duration", 0) for info in (main_info, insert_info) if info)
+            # concat 滤镜图同时打开两路输入，两路的解码帧都计入估算
+            memory = ("merge", estimate_encode_memory([main_info, insert_info], target))
+            ok, err = await engine.run(cmd, duration, progress_callback, err_tail=20, memory=memory)
+            if ok and cache_key:
+                await asyncio.to_thread(self.result_cache.store, cache_key, output_path)
+            return ok, "processed", err
+        except Exception as e:
+            return False, "failed", str(e)
 
     def batch_merge(
         self,
@@ -101,24 +199,40 @@ class VideoMerger:
         insert_video: str,
         output_dir: str,
         insert_position: str = "head",
-        progress_callback: Optional[Callable[[int, int, str, float, str], None]] = None,
-    ) -> dict:
+        progress_callback: Optional[Callable[[int, int, str, float, str, str], None]] = None,
+        max_workers: int = 1,
+        keep_names: bool = False,
+        input_roots: Sequence[str] = (),
+    ) -> Dict[str, Tuple[bool, str, str]]:
+        """
+        批量合并；输出默认按序号命名（01_merged.mp4），keep_names 为 True 时沿用主体视频文件名
+        （位于 input_roots 目录下的保留相对子目录）。
+        max_workers > 1 时多个文件并行合并，progress_callback 会在多个线程中调用
+        """
         results = {}
         total = len(main_videos)
         num_digits = max(2, len(str(total)))
-        for idx, main_video in enumerate(main_videos, 1):
+
+        def process(idx, main_video):
             ext = Path(main_video).suffix or ".mp4"
-            output_path = os.path.join(output_dir, f"{idx:0{num_digits}d}_merged{ext}")
             filename = Path(main_video).stem
+            if keep_names:
+                rel = output_relpath(main_video, input_roots)
+                out_name = rel if Path(rel).suffix else f"{rel}{ext}"
+            else:
+                out_name = f"{idx:0{num_digits}d}_merged{ext}"
+            output_path = os.path.join(output_dir, out_name)
 
             def file_progress(percent):
                 if progress_callback:
-                    progress_callback(idx, total, filename, percent, "")
+                    progress_callback(idx, total, filename, percent, "", "")
 
-            ok, err = self.merge_videos(
+            ok, action, err = self.merge_videos(
                 main_video, insert_video, output_path, insert_position, file_progress
             )
             if progress_callback:
-                progress_callback(idx, total, filename, 100, err if not ok else "")
-            results[main_video] = (ok, err)
-        return results
+                progress_callback(idx, total, filename, 100, action, err)
+            results[main_video] = (ok, action, err)
+
+        run_pool(list(enumerate(main_videos, 1)), process, max_workers)
+        return {v: results[v] for v in main_videos}
@@ -1,29 +1,45 @@
 """
 视频规范化核心处理模块
 """
+import asyncio
 import os
 import json
 import shutil
 import subprocess
+import sys
 from pathlib import Path
-from typing import Callable, Optional, Dict, List, Tuple
+from typing import Callable, Optional, Dict, List, Sequence, Tuple
+
+from .async_ffmpeg import AsyncFFmpegEngine
+from .batch_pool import run_pool
+from .encoder_profile import video_codec_args
+from .ffmpeg_locator import find_ffmpeg, find_ffprobe
+from .file_dedup import BatchDeduplicator, break_hardlink
+from .memory_admission import estimate_encode_memory
+from .process_priority import get_policy
+from .tracing import span
+from .result_cache import ResultCache, cmd_signature
+from .video_scanner import output_relpath
+
+# 支持的视频扩展名（小写）
+SUPPORTED_FORMATS = {".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv", ".webm"}
 
 
 class VideoNormalizer:
     """视频规范化处理器"""
 
-    def __init__(self, ffmpeg_path: str = None, ffprobe_path: str = None):
+    def __init__(self, ffmpeg_path: str = None, ffprobe_path: str = None, result_cache: Optional[ResultCache] = None):
         if ffmpeg_path is None:
-            project_root = Path(__file__).parent.parent.parent
-            ffmpeg_path = str(project_root / "tools" / "ffmpeg" / "ffmpeg.exe")
+            ffmpeg_path = find_ffmpeg()
         if ffprobe_path is None:
-            ffprobe_path = str(Path(ffmpeg_path).parent / "ffprobe.exe")
+            ffprobe_path = find_ffprobe(ffmpeg_path)
         self.ffmpeg_path = ffmpeg_path
         self.ffprobe_path = ffprobe_path
+        self.result_cache = result_cache
         self.has_ffprobe = os.path.exists(self.ffprobe_path)
         if not self.has_ffprobe:
-            print("警告: 未找到 ffprobe，将无法显示详细进度信息")
-        self.supported_formats = {".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv", ".webm"}
+            print("警告: 未找到 ffprobe，将无法显示详细进度信息", file=sys.stderr)
+        self.supported_formats = set(SUPPORTED_FORMATS)
 
     def get_video_info(self, video_path: str) -> Optional[Dict]:
         """获取视频信息（宽高、时长）"""
@@ -31,7 +47,8 @@ class VideoNormalizer:
             return None
         try:
             cmd = [self.ffprobe_path, "-v", "quiet", "-print_format", "json", "-show_streams", video_path]
-            result = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8")
+            with span("ffprobe", path=os.path.basename(video_path)):
+                result = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8")
             if result.returncode == 0:
                 data = json.loads(result.stdout)
                 video_stream = next((s for s in data["streams"] if s["codec_type"] == "video"), None)
@@ -42,7 +59,7 @@ class VideoNormalizer:
                         "duration": float(video_stream.get("duration", 0)),
                     }
         except Exception as e:
-            print(f"获取视频信息失败: {e}")
+            print(f"获取视频信息失败: {e}", file=sys.stderr)
         return None
 
     def check_video_size(self, video_path: str, target_width: int, target_height: int) -> bool:
@@ -65,10 +82,12 @@ class VideoNormalizer:
         self, cmd: List[str], duration: float, progress_callback: Callable[[float], None]
     ) -> Tuple[bool, str]:
         progress_callback(0)
+        policy = get_policy()
         process = subprocess.Popen(
             cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-            universal_newlines=True, encoding="utf-8", errors="ignore"
+            universal_newlines=True, encoding="utf-8", errors="ignore", **policy.spawn_kwargs()
         )
+        policy.apply_after_spawn(process.pid)
         error_lines = []
         for line in process.stderr:
             error_lines.append(line)
@@ -84,6 +103,30 @@ class VideoNormalizer:
     def _build_filter(self, target_width: int, target_height: int, pad_color: str) -> str:
         return f"scale={target_width}:{target_height}:force_original_aspect_ratio=decrease,pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2:{pad_color}"
 
+    def build_command(
+        self, input_path: str, output_path: str, target_width: int, target_height: int, pad_color: str
+    ) -> List[str]:
+        filt = self._build_filter(target_width, target_height, pad_color)
+        return [
+            self.ffmpeg_path, "-noautorotate", "-i", input_path,
+            "-vf", filt, "-pix_fmt", "yuv420p", *video_codec_args(),
+            "-vsync", "cfr", "-r", "30", "-c:a", "aac", "-b:a", "128k", "-y", output_path,
+        ]
+
+    def _cache_key(
+        self, cmd: List[str], input_path: str, output_path: str,
+        target_width: int, target_height: int, pad_color: str,
+    ) -> Optional[str]:
+        if self.result_cache is None:
+            return None
+        return self.result_cache.make_key(
+            "normalize", [input_path],
+            {
+                "width": target_width, "height": target_height, "pad_color": pad_color,
+                "cmd": cmd_signature(cmd, [input_path, output_path]),
+            },
+        )
+
     def normalize_video(
         self,
         input_path: str,
@@ -97,28 +140,80 @@ class VideoNormalizer:
         try:
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             if self.check_video_size(input_path, target_width, target_height):
-                shutil.copy2(input_path, output_path)
+                break_hardlink(output_path)
+                with span("copy"):
+                    shutil.copy2(input_path, output_path)
                 if progress_callback:
                     progress_callback(100)
                 return True, "copied", ""
-            filt = self._build_filter(target_width, target_height, pad_color)
-            cmd = [
-                self.ffmpeg_path, "-noautorotate", "-i", input_path,
-                "-vf", filt, "-pix_fmt", "yuv420p", "-c:v", "libx264", "-preset", "fast",
-                "-vsync", "cfr", "-r", "30", "-c:a", "aac", "-b:a", "128k", "-y", output_path,
-            ]
+            cmd = self.build_command(input_path, output_path, target_width, target_height, pad_color)
+            cache_key = self._cache_key(cmd, input_path, output_path, target_width, target_height, pad_color)
+            if cache_key and self.result_cache.fetch(cache_key, output_path):
+                if progress_callback:
+                    progress_callback(100)
+                return True, "cached", ""
+            break_hardlink(output_path)
+            ok, err = None, ""
             if progress_callback and self.has_ffprobe:
                 info = self.get_video_info(input_path)
                 if info and info.get("duration", 0) > 0:
-                    ok, err = self._run_with_progress(cmd, info["duration"], progress_callback)
-                    return ok, "processed", err
-            if progress_callback:
-                progress_callback(0)
-            result = subprocess.run(cmd, capture_output=True, encoding="utf-8", errors="ignore")
-            ok = result.returncode == 0
-            if ok and progress_callback:
-                progress_callback(100)
-            err = "" if ok else (result.stderr or "ffmpeg返回非零")
+                    with span("ffmpeg_encode"):
+                        ok, err = self._run_with_progress(cmd, info["duration"], progress_callback)
+            if ok is None:
+                if progress_callback:
+                    progress_callback(0)
+                with span("ffmpeg_encode"):
+                    result = get_policy().run(
+                        cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, encoding="utf-8", errors="ignore"
+                    )
+                ok = result.returncode == 0
+                if ok and progress_callback:
+                    progress_callback(100)
+                err = "" if ok else (result.stderr or "ffmpeg返回非零")
+            if ok and cache_key:
+                self.result_cache.store(cache_key, output_path)
+            return ok, "processed", err
+        except Exception as e:
+            return False, "failed", str(e)
+
+    async def normalize_video_async(
+        self,
+        engine: AsyncFFmpegEngine,
+        input_path: str,
+        output_path: str,
+        target_width: int,
+        target_height: int,
+        pad_color: str = "black",
+        progress_callback: Optional[Callable[[float], None]] = None,
+    ) -> Tuple[bool, str, str]:
+        """normalize_video 的异步版本：ffprobe / ffmpeg 由 engine 在事件循环中执行"""
+        try:
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+            info = await engine.probe(self.ffprobe_path, input_path)
+            if info and info["width"] == target_width and info["height"] == target_height:
+                await asyncio.to_thread(break_hardlink, output_path)
+                with span("copy"):
+                    await asyncio.to_thread(shutil.copy2, input_path, output_path)
+                if progress_callback:
+                    progress_callback(100)
+                return True, "copied", ""
+            cmd = self.build_command(input_path, output_path, target_width, target_height, pad_color)
+            cache_key = None
+            if self.result_cache is not None:
+                # 内容哈希与缓存物化涉及磁盘读写，放到默认线程池执行
+                cache_key = await asyncio.to_thread(
+                    self._cache_key, cmd, input_path, output_path, target_width, target_height, pad_color
+                )
+                if await asyncio.to_thread(self.result_cache.fetch, cache_key, output_path):
+                    if progress_callback:
+                        progress_callback(100)
+                    return True, "cached", ""
+            break_hardlink(output_path)
+            duration = info.get("duration", 0) if info else 0
+            memory = ("normalize", estimate_encode_memory([info], (target_width, target_height)))
+            ok, err = await engine.run(cmd, duration, progress_callback, memory=memory)
+            if ok and cache_key:
+                await asyncio.to_thread(self.result_cache.store, cache_key, output_path)
             return ok, "processed", err
         except Exception as e:
             return False, "failed", str(e)
@@ -131,13 +226,27 @@ class VideoNormalizer:
         target_height: int,
         pad_color: str = "black",
         progress_callback: Optional[Callable[[int, int, str, float, str, str], None]] = None,
+        dedupe: bool = True,
+        max_workers: int = 1,
+        input_roots: Sequence[str] = (),
     ) -> Dict[str, Tuple[bool, str, str]]:
-        """批量规范化视频"""
+        """
+        批量规范化视频；dedupe 为 True 时内容相同的输入只转换一次，重复项操作类型为 duplicate。
+        max_workers > 1 时多个文件并行转换，progress_callback 会在多个线程中调用。
+        位于 input_roots（目录）下的输入在 output_dir 中保留相对子目录，其余只取文件名
+        """
         results = {}
         total = len(input_paths)
-        for idx, inp in enumerate(input_paths, 1):
+        dedup = BatchDeduplicator(input_paths, enabled=dedupe)
+
+        def process(idx, inp):
             name = os.path.basename(inp)
-            out_path = os.path.join(output_dir, name)
+            out_path = os.path.join(output_dir, output_relpath(inp, input_roots))
+            if dedup.reuse(inp, out_path):
+                if progress_callback:
+                    progress_callback(idx, total, name, 100, "duplicate", "")
+                results[inp] = (True, "duplicate", "")
+                return
 
             def file_progress(pct, i=idx, n=total, fn=name):
                 if progress_callback:
@@ -148,8 +257,12 @@ class VideoNormalizer:
             )
             if progress_callback:
                 progress_callback(idx, total, name, 100, action, err)
+            if ok:
+                dedup.record(inp, out_path)
             results[inp] = (ok, action, err)
-        return results
+
+        run_pool(list(enumerate(input_paths, 1)), process, max_workers, dedup.duplicates)
+        return {inp: results[inp] for inp in input_paths}
 
     def is_supported_format(self, filepath: str) -> bool:
         return Path(filepath).suffix.lower() in self.supported_formats
@@ -0,0 +1,123 @@
+"""
+视频文件扫描模块
+基于 os.scandir 递归遍历目录，按扩展名与可选 glob 过滤，逐个产出文件信息，
+大目录树无需等待全部遍历完成即可开始处理
+"""
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from fnmatch import fnmatch
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Set
+
+
+def iter_video_files(
+    roots: Iterable[str],
+    exts: Set[str],
+    recursive: bool = True,
+    pattern: str = "",
+) -> Iterator[Dict]:
+    """
+    遍历 roots（目录或文件）下扩展名在 exts 中的文件，产出 {"path", "size", "mtime"}。
+    pattern 为可选 glob，匹配相对于所在根目录的路径（统一使用 / 分隔）；
+    不跟随目录符号链接，避免循环；同一目录内按文件名排序，结果可复现。
+    """
+    seen = set()
+    for root in roots:
+        if os.path.isfile(root):
+            if os.path.splitext(root)[1].lower() in exts and root not in seen:
+                seen.add(root)
+                st = os.stat(root)
+                yield {"path": root, "size": st.st_size, "mtime": st.st_mtime}
+            continue
+        stack = [root]
+        while stack:
+            current = stack.pop()
+            try:
+                with os.scandir(current) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+            except OSError:
+                continue
+            subdirs = []
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            subdirs.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                    if os.path.splitext(entry.name)[1].lower() not in exts:
+                        continue
+                    if pattern:
+                        rel = os.path.relpath(entry.path, root).replace(os.sep, "/")
+                        if not fnmatch(rel, pattern) and not fnmatch(entry.name, pattern):
+                            continue
+                    if entry.path in seen:
+                        continue
+                    seen.add(entry.path)
+                    st = entry.stat()
+                    yield {"path": entry.path, "size": st.st_size, "mtime": st.st_mtime}
+                except OSError:
+                    continue
+            # 逆序入栈，使子目录按名称顺序出栈
+            stack.extend(reversed(subdirs))
+
+
+def iter_probed(
+    entries: Iterable[Dict],
+    probe: Callable[[str], Optional[Dict]],
+    max_workers: int = 8,
+) -> Iterator[Dict]:
+    """对扫描结果并发探测（宽高、时长等）后按完成顺序产出，同时在途的探测数有上限"""
+    max_in_flight = max_workers * 4
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="probe") as executor:
+        in_flight = {}
+        for entry in entries:
+            in_flight[executor.submit(probe, entry["path"])] = entry
+            if len(in_flight) >= max_in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield _merge_probe(in_flight.pop(fut), fut)
+        for fut in list(in_flight):
+            yield _merge_probe(in_flight.pop(fut), fut)
+
+
+def _merge_probe(entry: Dict, fut) -> Dict:
+    try:
+        info = fut.result()
+    except Exception:
+        info = None
+    if info:
+        entry = {**entry, **info}
+    return entry
+
+
+def expand_input_spec(roots: List[str], exts: Set[str], recursive: bool = True, pattern: str = "") -> List[str]:
+    """把扫描规格展开为路径列表，供批处理接口代替完整路径列表使用"""
+    return [e["path"] for e in iter_video_files(roots, exts, recursive=recursive, pattern=pattern)]
+
+
+def output_relpath(path: str, roots: Sequence[str] = ()) -> str:
+    """
+    输出文件相对输出目录的路径：位于某个目录根下的文件保留相对该根（有嵌套时取最外层）的子目录结构，
+    其余文件只取文件名。roots 只应包含目录
+    """
+    best = None
+    for root in roots:
+        try:
+            rel = os.path.relpath(path, root)
+        except ValueError:
+            # Windows 下不在同一盘符
+            continue
+        if rel == os.curdir or rel == os.pardir or rel.startswith(os.pardir + os.sep):
+            continue
+        if best is None or rel.count(os.sep) > best.count(os.sep):
+            best = rel
+    return best or os.path.basename(path)
+
+
+def output_collisions(paths: Iterable[str], roots: Sequence[str] = ()) -> Dict[str, List[str]]:
+    """按 output_relpath 分组，返回对应多个输入的输出路径（按系统规则忽略大小写，Windows 下不区分）"""
+    groups: Dict[str, List[str]] = {}
+    for p in paths:
+        groups.setdefault(os.path.normcase(output_relpath(p, roots)), []).append(p)
+    return {rel: ps for rel, ps in groups.items() if len(ps) > 1}
@@ -0,0 +1,126 @@
+"""
+视频缩略图模块
+按关键帧快速定位截取一帧生成小尺寸 JPEG，磁盘缓存按文件标识（路径、大小、修改时间）命名，
+重复导入同一批视频时无需再次解码
+"""
+import hashlib
+import os
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from .ffmpeg_locator import find_ffmpeg
+
+
+class VideoThumbnailer:
+    """视频缩略图生成器（有界线程池 + 磁盘缓存）"""
+
+    def __init__(
+        self,
+        ffmpeg_path: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        width: int = 160,
+        max_workers: int = 4,
+    ):
+        project_root = Path(__file__).parent.parent.parent
+        if ffmpeg_path is None:
+            ffmpeg_path = find_ffmpeg()
+        if cache_dir is None:
+            cache_dir = str(project_root / "cache" / "thumbnails")
+        self.ffmpeg_path = ffmpeg_path
+        self.cache_dir = Path(cache_dir)
+        self.width = width
+        self.max_workers = max(1, max_workers)
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="thumbnail"
+                )
+            return self._executor
+
+    def cache_key(self, video_path: str) -> str:
+        """缓存键：文件标识 + 缩略图宽度的 SHA1"""
+        st = os.stat(video_path)
+        ident = f"{os.path.abspath(video_path)}|{st.st_size}|{st.st_mtime_ns}|{self.width}"
+        return hashlib.sha1(ident.encode("utf-8")).hexdigest()
+
+    def cache_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.jpg"
+
+    def _extract(self, video_path: str, out_path: Path, timestamp: float) -> Tuple[bool, str]:
+        tmp_path = out_path.with_name(f"{out_path.stem}.{os.getpid()}.{threading.get_ident()}.tmp.jpg")
+        cmd = [
+            self.ffmpeg_path, "-hide_banner", "-loglevel", "error",
+            "-noaccurate_seek", "-skip_frame", "nokey",
+            "-ss", f"{timestamp:.3f}", "-i", video_path,
+            "-frames:v", "1", "-vf", f"scale={self.width}:-2",
+            "-c:v", "mjpeg", "-q:v", "5", "-f", "image2", "-update", "1",
+            "-y", str(tmp_path),
+        ]
+        try:
+            result = subprocess.run(cmd, capture_output=True, timeout=30)
+            if result.returncode != 0 or not tmp_path.exists() or tmp_path.stat().st_size == 0:
+                err = result.stderr.decode("utf-8", errors="ignore").strip()
+                return False, err or "ffmpeg 未输出缩略图"
+            os.replace(tmp_path, out_path)
+            return True, ""
+        except subprocess.TimeoutExpired:
+            return False, "生成缩略图超时"
+        finally:
+            if tmp_path.exists():
+                try:
+                    tmp_path.unlink()
+                except OSError:
+                    pass
+
+    def get_thumbnail(self, video_path: str, timestamp: float = 1.0) -> Tuple[bool, str, str]:
+        """生成或读取缓存的缩略图，返回（成功, 缓存键, 错误信息）"""
+        try:
+            key = self.cache_key(video_path)
+            out_path = self.cache_path(key)
+            if out_path.exists():
+                return True, key, ""
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            ok, err = self._extract(video_path, out_path, timestamp)
+            if not ok and timestamp > 0:
+                # 短于 timestamp 的片段定位后无帧可取，回退到首个关键帧
+                ok, err = self._extract(video_path, out_path, 0.0)
+            return ok, key if ok else "", err
+        except Exception as e:
+            return False, "", str(e)
+
+    def iter_thumbnails(
+        self, video_paths: List[str], timestamp: float = 1.0
+    ) -> Iterator[Tuple[str, bool, str, str]]:
+        """
+        批量生成缩略图，按完成顺序逐个产出（路径, 成功, 缓存键, 错误信息）。
+        已缓存的直接产出；其余提交到共享线程池，迭代提前结束时取消未开始的任务。
+        """
+        pending = []
+        for path in video_paths:
+            try:
+                key = self.cache_key(path)
+            except OSError as e:
+                yield path, False, "", str(e)
+                continue
+            if self.cache_path(key).exists():
+                yield path, True, key, ""
+            else:
+                pending.append(path)
+        if not pending:
+            return
+        executor = self._get_executor()
+        futures = {executor.submit(self.get_thumbnail, p, timestamp): p for p in pending}
+        try:
+            for fut in as_completed(futures):
+                ok, key, err = fut.result()
+                yield futures[fut], ok, key, err
+        finally:
+            for fut in futures:
+                fut.cancel()
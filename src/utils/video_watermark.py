@@ -2,10 +2,26 @@
 视频水印核心处理模块
 支持静态图片与动态图片（如 GIF）作为水印，可设置不透明度与九宫格位置
 """
+import asyncio
 import os
 import subprocess
 from pathlib import Path
-from typing import Callable, Optional, List, Tuple
+from typing import Callable, Dict, Optional, List, Sequence, Tuple
+
+from .async_ffmpeg import AsyncFFmpegEngine
+from .batch_pool import run_pool
+from .encoder_profile import video_codec_args
+from .ffmpeg_locator import find_ffmpeg, find_ffprobe
+from .file_dedup import BatchDeduplicator, break_hardlink
+from .memory_admission import estimate_encode_memory
+from .process_priority import get_policy
+from .tracing import span
+from .result_cache import ResultCache, cmd_signature
+from .video_scanner import output_relpath
+
+# 支持的视频与水印图片扩展名（小写）
+VIDEO_EXTS = {".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv", ".webm"}
+IMAGE_EXTS = {".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp"}
 
 POSITION_OVERLAY = {
     "top_left": "10:10",
@@ -23,13 +39,13 @@ POSITION_OVERLAY = {
 class VideoWatermark:
     """视频水印处理器"""
 
-    def __init__(self, ffmpeg_path: Optional[str] = None):
+    def __init__(self, ffmpeg_path: Optional[str] = None, result_cache: Optional[ResultCache] = None):
         if ffmpeg_path is None:
-            project_root = Path(__file__).parent.parent.parent
-            ffmpeg_path = str(project_root / "tools" / "ffmpeg" / "ffmpeg.exe")
+            ffmpeg_path = find_ffmpeg()
         self.ffmpeg_path = ffmpeg_path
-        self.video_exts = {".mp4", ".avi", ".mov", ".mkv", ".flv", ".wmv", ".webm"}
-        self.image_exts = {".png", ".jpg", ".jpeg", ".bmp", ".gif", ".webp"}
+        self.result_cache = result_cache
+        self.video_exts = set(VIDEO_EXTS)
+        self.image_exts = set(IMAGE_EXTS)
 
     def is_supported_video(self, filepath: str) -> bool:
         return Path(filepath).suffix.lower() in self.video_exts
@@ -40,6 +56,42 @@ class VideoWatermark:
     def _is_animated_image(self, filepath: str) -> bool:
         return Path(filepath).suffix.lower() == ".gif"
 
+    def _build_overlay_filter(self, opacity: float, position: str) -> str:
+        pos_expr = POSITION_OVERLAY.get(position, POSITION_OVERLAY["center"])
+        opacity = max(0.0, min(1.0, opacity))
+        return (
+            f"[1:v]format=rgba,colorchannelmixer=aa={opacity:.4f}[wm];"
+            f"[0:v][wm]overlay={pos_expr}"
+        )
+
+    def build_command(
+        self, input_path: str, output_path: str, watermark_path: str, opacity: float, position: str
+    ) -> List[str]:
+        wm_input = ["-i", watermark_path]
+        if self._is_animated_image(watermark_path):
+            wm_input = ["-stream_loop", "-1", "-i", watermark_path]
+        filter_complex = self._build_overlay_filter(opacity, position) + "[outv]"
+        return [
+            self.ffmpeg_path, "-i", input_path, *wm_input,
+            "-filter_complex", filter_complex, "-map", "[outv]", "-map", "0:a?",
+            *video_codec_args(), "-pix_fmt", "yuv420p", "-c:a", "copy",
+            "-y", output_path,
+        ]
+
+    def _cache_key(
+        self, cmd: List[str], input_path: str, output_path: str,
+        watermark_path: str, opacity: float, position: str,
+    ) -> Optional[str]:
+        if self.result_cache is None:
+            return None
+        return self.result_cache.make_key(
+            "watermark", [input_path, watermark_path],
+            {
+                "opacity": round(max(0.0, min(1.0, opacity)), 4), "position": position,
+                "cmd": cmd_signature(cmd, [input_path, watermark_path, output_path]),
+            },
+        )
+
     def apply_watermark(
         self,
         input_path: str,
@@ -48,40 +100,117 @@ class VideoWatermark:
         opacity: float = 1.0,
         position: str = "center",
         progress_callback: Optional[Callable[[float], None]] = None,
-    ) -> Tuple[bool, str]:
+    ) -> Tuple[bool, str, str]:
+        """添加水印，返回（成功, 操作类型, 错误信息）；操作类型为 cached / processed / failed"""
         try:
             os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
-            pos_expr = POSITION_OVERLAY.get(position, POSITION_OVERLAY["center"])
-            opacity = max(0.0, min(1.0, opacity))
-            wm_input = ["-i", watermark_path]
-            if self._is_animated_image(watermark_path):
-                wm_input = ["-stream_loop", "-1", "-i", watermark_path]
-            filter_complex = (
-                f"[1:v]format=rgba,colorchannelmixer=aa={opacity:.4f}[wm];"
-                f"[0:v][wm]overlay={pos_expr}[outv]"
-            )
-            cmd = [
-                self.ffmpeg_path, "-i", input_path, *wm_input,
-                "-filter_complex", filter_complex, "-map", "[outv]", "-map", "0:a?",
-                "-c:v", "libx264", "-preset", "fast", "-pix_fmt", "yuv420p", "-c:a", "copy",
-                "-y", output_path,
-            ]
+            cmd = self.build_command(input_path, output_path, watermark_path, opacity, position)
+            cache_key = self._cache_key(cmd, input_path, output_path, watermark_path, opacity, position)
+            if cache_key and self.result_cache.fetch(cache_key, output_path):
+                if progress_callback:
+                    progress_callback(100)
+                return True, "cached", ""
+            break_hardlink(output_path)
             if progress_callback:
                 progress_callback(0)
-            process = subprocess.Popen(
-                cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                universal_newlines=True, encoding="utf-8", errors="ignore",
-            )
-            err_lines = []
-            for line in process.stderr:
-                err_lines.append(line)
-            process.wait()
+            policy = get_policy()
+            with span("ffmpeg_encode"):
+                process = subprocess.Popen(
+                    cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                    universal_newlines=True, encoding="utf-8", errors="ignore", **policy.spawn_kwargs(),
+                )
+                policy.apply_after_spawn(process.pid)
+                err_lines = []
+                for line in process.stderr:
+                    err_lines.append(line)
+                process.wait()
             ok = process.returncode == 0
+            if ok and cache_key:
+                self.result_cache.store(cache_key, output_path)
             if ok and progress_callback:
                 progress_callback(100)
-            return ok, "".join(err_lines[-15:]).strip() if not ok else ""
+            return ok, "processed", "".join(err_lines[-15:]).strip() if not ok else ""
+        except Exception as e:
+            return False, "failed", str(e)
+
+    async def apply_watermark_async(
+        self,
+        engine: AsyncFFmpegEngine,
+        input_path: str,
+        output_path: str,
+        watermark_path: str,
+        opacity: float = 1.0,
+        position: str = "center",
+        progress_callback: Optional[Callable[[float], None]] = None,
+    ) -> Tuple[bool, str, str]:
+        """apply_watermark 的异步版本；可获取时长时按 ffmpeg 输出上报真实进度"""
+        try:
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            cmd = self.build_command(input_path, output_path, watermark_path, opacity, position)
+            cache_key = None
+            if self.result_cache is not None:
+                cache_key = await asyncio.to_thread(
+                    self._cache_key, cmd, input_path, output_path, watermark_path, opacity, position
+                )
+                if await asyncio.to_thread(self.result_cache.fetch, cache_key, output_path):
+                    if progress_callback:
+                        progress_callback(100)
+                    return True, "cached", ""
+            break_hardlink(output_path)
+            # 探测结果同时用于进度换算与内存估算（输出尺寸与输入相同）
+            ffprobe_path = find_ffprobe(self.ffmpeg_path)
+            info = await engine.probe(ffprobe_path, input_path)
+            duration = info.get("duration", 0) if info else 0
+            size = (info["width"], info["height"]) if info and info["width"] > 0 else (1920, 1080)
+            memory = ("watermark", estimate_encode_memory([info], size))
+            ok, err = await engine.run(cmd, duration, progress_callback, memory=memory)
+            if ok and cache_key:
+                await asyncio.to_thread(self.result_cache.store, cache_key, output_path)
+            return ok, "processed", err
         except Exception as e:
-            return False, str(e)
+            return False, "failed", str(e)
+
+    def render_preview(
+        self,
+        input_path: str,
+        watermark_path: str,
+        opacity: float = 1.0,
+        position: str = "center",
+        timestamp: float = 0.0,
+        image_format: str = "jpg",
+        max_width: int = 640,
+    ) -> Tuple[bool, bytes, str]:
+        """
+        生成单帧水印预览图，返回（成功, 图片字节, 错误信息）。
+        在 timestamp 处按关键帧快速定位（不做精确解码），只解码一帧并叠加水印；
+        max_width > 0 时按宽度缩小输出，减少编码与传输耗时。
+        """
+        try:
+            filter_complex = self._build_overlay_filter(opacity, position)
+            if max_width > 0:
+                filter_complex += f",scale='min(iw,{int(max_width)})':-2"
+            filter_complex += "[outv]"
+            if image_format == "png":
+                codec_args = ["-c:v", "png"]
+            else:
+                codec_args = ["-c:v", "mjpeg", "-q:v", "3"]
+            cmd = [
+                self.ffmpeg_path, "-hide_banner", "-loglevel", "error",
+                "-noaccurate_seek", "-skip_frame", "nokey",
+                "-ss", f"{max(0.0, timestamp):.3f}", "-i", input_path,
+                "-i", watermark_path,
+                "-filter_complex", filter_complex, "-map", "[outv]",
+                "-frames:v", "1", *codec_args, "-f", "image2pipe", "pipe:1",
+            ]
+            result = subprocess.run(cmd, capture_output=True, timeout=15)
+            if result.returncode != 0 or not result.stdout:
+                err = result.stderr.decode("utf-8", errors="ignore").strip()
+                return False, b"", err or "ffmpeg 未输出预览帧"
+            return True, result.stdout, ""
+        except subprocess.TimeoutExpired:
+            return False, b"", "生成预览超时"
+        except Exception as e:
+            return False, b"", str(e)
 
     def batch_apply(
         self,
@@ -90,23 +219,42 @@ class VideoWatermark:
         watermark_path: str,
         opacity: float = 1.0,
         position: str = "center",
-        progress_callback: Optional[Callable[[int, int, str, float, str], None]] = None,
-    ) -> dict:
+        progress_callback: Optional[Callable[[int, int, str, float, str, str], None]] = None,
+        dedupe: bool = True,
+        max_workers: int = 1,
+        input_roots: Sequence[str] = (),
+    ) -> Dict[str, Tuple[bool, str, str]]:
+        """
+        批量添加水印，结果与 batch_normalize 相同为（成功, 操作类型, 错误信息），重复项操作类型为 duplicate。
+        max_workers > 1 时多个文件并行处理，progress_callback 会在多个线程中调用。
+        位于 input_roots（目录）下的输入在 output_dir 中保留相对子目录，其余只取文件名
+        """
         results = {}
         total = len(input_paths)
-        for idx, inp in enumerate(input_paths, 1):
+        dedup = BatchDeduplicator(input_paths, enabled=dedupe)
+
+        def process(idx, inp):
             name = Path(inp).stem
-            ext = Path(inp).suffix or ".mp4"
-            out_path = os.path.join(output_dir, f"{name}{ext}")
+            rel = output_relpath(inp, input_roots)
+            out_path = os.path.join(output_dir, rel if Path(rel).suffix else f"{rel}.mp4")
+            if dedup.reuse(inp, out_path):
+                if progress_callback:
+                    progress_callback(idx, total, name, 100.0, "duplicate", "")
+                results[inp] = (True, "duplicate", "")
+                return
 
             def file_progress(pct, i=idx, n=total, fn=name):
                 if progress_callback:
-                    progress_callback(i, n, fn, pct, "")
+                    progress_callback(i, n, fn, pct, "", "")
 
-            ok, err = self.apply_watermark(
+            ok, action, err = self.apply_watermark(
                 inp, out_path, watermark_path, opacity, position, file_progress
             )
             if progress_callback:
-                progress_callback(idx, total, name, 100.0, err if not ok else "")
-            results[inp] = (ok, err)
-        return results
+                progress_callback(idx, total, name, 100.0, action, err)
+            if ok:
+                dedup.record(inp, out_path)
+            results[inp] = (ok, action, err)
+
+        run_pool(list(enumerate(input_paths, 1)), process, max_workers, dedup.duplicates)
+        return {inp: results[inp] for inp in input_paths}